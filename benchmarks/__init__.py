@@ -0,0 +1 @@
+__all__ = ['bench_rc', 'bench_telemetry', 'bench_frame', 'bench_import', 'bench_metrics']
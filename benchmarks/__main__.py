@@ -0,0 +1,88 @@
+"""Run the benchmark suite
+
+    python -m benchmarks [--duration 2] [--output bench.json] [name ...]
+    python -m benchmarks --compare before.json after.json
+
+Results are written as JSON together with the commit they ran on, so two
+runs can be compared to spot regressions.
+"""
+
+# coding=utf-8
+
+import argparse
+import importlib
+import json
+import platform
+import subprocess
+import sys
+import time
+
+from benchmarks import __all__ as BENCHMARKS
+
+
+def commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(results, prefix=''):
+    """Flatten nested results into dotted keys
+    Arguments:
+        results: dict
+        prefix: string
+    Return:
+        dict
+    """
+    flat = {}
+    for key, value in results.items():
+        name = prefix + key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def compare(before_path, after_path):
+    """Print every metric of two result files side by side"""
+    with open(before_path) as f:
+        before = flatten(json.load(f)['results'])
+    with open(after_path) as f:
+        after = flatten(json.load(f)['results'])
+    for name in sorted(set(before) & set(after)):
+        change = (after[name] - before[name]) / before[name] * 100.0 if before[name] else 0.0
+        print('{name:<50} {before:>12.4f} {after:>12.4f} {change:>+8.1f}%'.format(
+            name=name, before=before[name], after=after[name], change=change))
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    parser.add_argument('names', nargs='*', help='benchmarks to run, all by default')
+    parser.add_argument('--duration', type=float, default=2.0, help='seconds per benchmark')
+    parser.add_argument('--output', default='bench.json', help='result file')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='compare two result files')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = {}
+    for name in args.names or BENCHMARKS:
+        name = name if name.startswith('bench_') else 'bench_' + name
+        module = importlib.import_module('benchmarks.' + name)
+        print('Running ' + name, file=sys.stderr)
+        results[name[len('bench_'):]] = module.run(args.duration)
+
+    report = {'commit': commit(), 'time': time.time(), 'python': platform.python_version(),
+              'platform': platform.platform(), 'duration': args.duration, 'results': results}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
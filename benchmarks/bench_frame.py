@@ -0,0 +1,65 @@
+"""Frame path benchmark
+
+Frames per second and per-stage cost of the controller display conversion,
+the original copy-heavy path against FramePresenter, on a headless display.
+"""
+
+# coding=utf-8
+
+import os
+import time
+from benchmarks.common import summarize, skipped
+
+FRAME_SIZE = (960, 720)
+
+
+def run(duration=2.0):
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    try:
+        import numpy as np
+        import pygame
+        import cv2
+        from lib.controller.presenter import FramePresenter
+    except ImportError as e:
+        return skipped(str(e))
+
+    width, height = FRAME_SIZE
+    pygame.init()
+    screen = pygame.display.set_mode(FRAME_SIZE)
+    frame = np.random.RandomState(0).randint(0, 255, (height, width, 3), dtype=np.uint8)
+
+    # Original controller path, one stage at a time
+    stages = {'convert': [], 'rotate': [], 'surface': [], 'blit': []}
+    frames = 0
+    deadline = time.perf_counter() + duration / 2
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        converted = time.perf_counter()
+        rgb = np.flipud(np.rot90(rgb))
+        rotated = time.perf_counter()
+        surface = pygame.surfarray.make_surface(rgb)
+        surfaced = time.perf_counter()
+        screen.blit(surface, (0, 0))
+        pygame.display.update()
+        blitted = time.perf_counter()
+        stages['convert'].append(converted - start)
+        stages['rotate'].append(rotated - converted)
+        stages['surface'].append(surfaced - rotated)
+        stages['blit'].append(blitted - surfaced)
+        frames += 1
+    legacy = {stage: summarize(samples) for stage, samples in stages.items()}
+    legacy['fps'] = frames / (duration / 2)
+
+    presenter = FramePresenter(screen)
+    samples = []
+    deadline = time.perf_counter() + duration / 2
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        presenter.present(frame)
+        samples.append(time.perf_counter() - start)
+    current = {'present': summarize(samples), 'stages': presenter.timings,
+               'fps': len(samples) / (duration / 2)}
+
+    pygame.quit()
+    return {'legacy': legacy, 'presenter': current}
@@ -0,0 +1,67 @@
+"""Import benchmark
+
+Start-up cost of the drone library entry points, every import measured in a
+fresh interpreter, together with the heavy third party modules each of them
+pulls in.
+"""
+
+# coding=utf-8
+
+import json
+import os
+import subprocess
+import sys
+import time
+from benchmarks.common import summarize
+
+MODULES = ('lib.drone', 'lib.drone.ryze_tello', 'lib.drone.simulated', 'lib.drone.replay',
+           'lib.controller.pipeline', 'lib.controller.presenter')
+HEAVY = ('djitellopy', 'cv2', 'numpy', 'pygame', 'asyncio')
+MIN_RUNS = 3
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, [name for name in {heavy!r} if name in sys.modules]]))
+'''
+
+
+def probe(module):
+    """Import a module in a fresh interpreter
+    Arguments:
+        module: dotted name, None for the empty interpreter
+    Return:
+        (seconds, list of heavy modules loaded), None if the import failed
+    """
+    code = PROBE.format(statement='import ' + module if module else 'pass', heavy=HEAVY)
+    env = dict(os.environ, SDL_VIDEODRIVER='dummy', PYGAME_HIDE_SUPPORT_PROMPT='1')
+    try:
+        output = subprocess.check_output([sys.executable, '-c', code], stderr=subprocess.DEVNULL, env=env,
+                                         cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    except subprocess.CalledProcessError:
+        return None
+    elapsed, heavy = json.loads(output.decode().strip().splitlines()[-1])
+    return elapsed, heavy
+
+
+def run(duration=2.0):
+    results = {}
+    budget = duration / len(MODULES)
+    for module in MODULES:
+        samples, heavy = [], []
+        deadline = time.perf_counter() + budget
+        while len(samples) < MIN_RUNS or time.perf_counter() < deadline:
+            result = probe(module)
+            if result is None:
+                break
+            samples.append(result[0])
+            heavy = result[1]
+        if not samples:
+            results[module] = {'skipped': 'import failed'}
+            continue
+        results[module] = summarize(samples)
+        results[module]['heavy'] = heavy
+        results[module]['heavy_count'] = len(heavy)
+    return results
@@ -0,0 +1,48 @@
+"""Metrics benchmark
+
+Cost of a histogram observation and of the instrumented hot paths with
+metrics off and on, against the simulated drone.
+"""
+
+# coding=utf-8
+
+import time
+from benchmarks.common import summarize
+from lib.drone.metrics import Histogram
+from lib.drone.simulated import launch
+
+
+def measure(function, duration):
+    """Time repeated calls
+    Arguments:
+        function: callable without arguments
+        duration: seconds
+    Return:
+        list of seconds
+    """
+    samples = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def run(duration=2.0):
+    histogram = Histogram()
+    results = {'observe': summarize(measure(lambda: histogram.observe(0.0042), duration / 5))}
+
+    drone, server = launch(video=False)
+    try:
+        drone.hello()
+        drone.stop_telemetry()  # Measure on this thread only
+        for state in ('off', 'on'):
+            if state == 'on':
+                drone.enable_metrics()
+            results['can_we_fly_' + state] = summarize(measure(lambda: drone.can_we_fly, duration / 5))
+            results['update_telemetry_' + state] = summarize(measure(drone.update_telemetry, duration / 5))
+        return results
+    finally:
+        drone.bye()
+        server.stop()
@@ -0,0 +1,61 @@
+"""RC command benchmark
+
+Dispatch cost of rc_command, the jitter of a fixed-rate send loop and of
+the drone RC scheduler against the simulated drone.
+"""
+
+# coding=utf-8
+
+import time
+from benchmarks.common import summarize
+from lib.drone.simulated import launch
+
+RC_RATE = 50  # Target rc packets per second for the jitter run
+
+
+def run(duration=2.0):
+    drone, server = launch(video=False)
+    try:
+        drone.hello()
+
+        # Back to back dispatch, cost of a single call
+        costs = []
+        deadline = time.perf_counter() + duration / 2
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            drone.rc_command(0, 0, 0, 0)
+            costs.append(time.perf_counter() - start)
+
+        # Fixed rate loop, deviation of every period from the target
+        interval = 1.0 / RC_RATE
+        periods = []
+        last = time.perf_counter()
+        next_send = last + interval
+        deadline = last + duration / 2
+        while next_send < deadline:
+            time.sleep(max(0.0, next_send - time.perf_counter()))
+            drone.rc_command(0, 0, 0, 0)
+            now = time.perf_counter()
+            periods.append(abs((now - last) - interval))
+            last = now
+            next_send += interval
+
+        # RC scheduler fed far faster than it sends
+        drone.start_rc(RC_RATE)
+        deadline = time.perf_counter() + duration / 2
+        value = 0
+        while time.perf_counter() < deadline:
+            value = (value + 1) % 20
+            drone.set_rc(0, 0, value, 0)
+            time.sleep(0.001)
+        scheduler = drone.rc_scheduler.stats
+        drone.stop_rc()
+
+        return {'dispatch': summarize(costs),
+                'dispatch_rate': len(costs) / (duration / 2),
+                'jitter': summarize(periods),
+                'scheduler': scheduler,
+                'target_rate': RC_RATE}
+    finally:
+        drone.bye()
+        server.stop()
@@ -0,0 +1,38 @@
+"""Telemetry benchmark
+
+Latency of update_telemetry and the overhead of the can_we_fly pre-flight
+check against the simulated drone.
+"""
+
+# coding=utf-8
+
+import time
+from benchmarks.common import summarize
+from lib.drone.simulated import launch
+
+
+def run(duration=2.0):
+    drone, server = launch(video=False)
+    try:
+        drone.hello()
+        drone.stop_telemetry()  # Measure refreshes on this thread only
+
+        refreshes = []
+        deadline = time.perf_counter() + duration / 2
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            drone.update_telemetry()
+            refreshes.append(time.perf_counter() - start)
+
+        checks = []
+        deadline = time.perf_counter() + duration / 2
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            drone.can_we_fly
+            checks.append(time.perf_counter() - start)
+
+        return {'update_telemetry': summarize(refreshes),
+                'can_we_fly': summarize(checks)}
+    finally:
+        drone.bye()
+        server.stop()
@@ -0,0 +1,40 @@
+"""Benchmark helpers
+
+Sample statistics shared by every benchmark, all times in milliseconds.
+"""
+
+# coding=utf-8
+
+import math
+
+
+def summarize(samples):
+    """Summary statistics of timing samples
+    Arguments:
+        samples: list of seconds
+    Return:
+        dict in milliseconds
+    """
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+    count = len(ordered)
+    mean = sum(ordered) / count
+    variance = sum((s - mean) ** 2 for s in ordered) / count
+
+    def percentile(p):
+        return ordered[min(count - 1, int(math.ceil(p * count)) - 1)] * 1000.0
+
+    return {'count': count, 'mean': mean * 1000.0, 'stdev': math.sqrt(variance) * 1000.0,
+            'min': ordered[0] * 1000.0, 'p50': percentile(0.50), 'p95': percentile(0.95),
+            'p99': percentile(0.99), 'max': ordered[-1] * 1000.0}
+
+
+def skipped(reason):
+    """Result of a benchmark that could not run here
+    Arguments:
+        reason: string
+    Return:
+        dict
+    """
+    return {'skipped': reason}
@@ -1,7 +1,8 @@
-from lib.drone.ryze_tello import Drone
+from lib.drone import get_backend
 import sys
 
-# Get drone information
+# Get drone information, only the Tello backend gets imported
+Drone = get_backend('tello')
 drone = Drone()
 drone.hello()
 drone.info()
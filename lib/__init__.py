@@ -1 +1 @@
-__all__ = ['drone', 'controller']
+__all__ = ['drone', 'controller', 'vision']
@@ -0,0 +1 @@
+__all__ = ['presenter', 'pipeline', 'gesture', 'follow', 'input', 'headless']
@@ -0,0 +1,278 @@
+"""Object follow autopilot library
+
+Keeps a detected object centred and at a set size in the frame by driving
+yaw, throttle and pitch with three PID loops. Detection runs on the video
+path at whatever rate the frame scheduler affords, the control loop runs on
+its own thread at a fixed rate and fills the gaps between detections with
+the target position predicted from its recent motion, so late or skipped
+detections never stall the controller. Loop timing is measured to prove it.
+"""
+
+# coding=utf-8
+
+from collections import deque
+import threading
+import time
+from lib.vision.processor import FrameProcessor
+
+
+class PID(object):
+    """Proportional-integral-derivative controller"""
+
+    def __init__(self, kp, ki=0.0, kd=0.0, limit=100.0, integral_limit=None):
+        """
+        Arguments:
+            kp: proportional gain
+            ki: integral gain
+            kd: derivative gain
+            limit: output clamped to -limit~limit
+            integral_limit: integral term clamped to -integral_limit~integral_limit, defaults to limit
+        """
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.limit = limit
+        self.integral_limit = limit if integral_limit is None else integral_limit
+        self.reset()
+
+    def reset(self):
+        """Forget the integral and the previous error"""
+        self.integral = 0.0
+        self.previous = None
+
+    def update(self, error, dt):
+        """Controller output for an error
+        Arguments:
+            error: setpoint minus measurement
+            dt: seconds since the previous update
+        Return:
+            float
+        """
+        derivative = 0.0
+        if dt > 0:
+            if self.ki:
+                # Clamp the integral term itself so it cannot wind up while the output saturates
+                bound = self.integral_limit / self.ki
+                self.integral = min(bound, max(-bound, self.integral + error * dt))
+            if self.previous is not None:
+                derivative = (error - self.previous) / dt
+        self.previous = error
+        output = self.kp * error + self.ki * self.integral + self.kd * derivative
+        return min(self.limit, max(-self.limit, output))
+
+
+def largest(result):
+    """Default target picker, the biggest box of a detection result
+    Arguments:
+        result: list of boxes (x, y, width, height) or of objects with a box attribute
+    Return:
+        box or None
+    """
+    boxes = [getattr(item, 'box', item) for item in result or ()]
+    return max(boxes, key=lambda box: box[2] * box[3], default=None)
+
+
+class FollowController(FrameProcessor):
+    # +--------------------------------------------------------------+
+    # DEFAULT OBJECT VARIABLES
+    # +--------------------------------------------------------------+
+    NAME = 'follow'
+    RATE = 20  # Control loop ticks per second, matches the RC scheduler
+    TARGET_HEIGHT = 0.35  # Wanted target height as a fraction of the frame height
+    PREDICT_MAX = 0.5  # Seconds a detection is extrapolated at most
+    LOST_TIMEOUT = 1.0  # Seconds without detection before hovering
+    VELOCITY_SMOOTHING = 0.5  # Weight of the newest sample in the target velocity
+    TIMING_WINDOW = 256
+
+    # Gains of every axis, errors are normalised to -1~1 and outputs are RC velocities
+    YAW = (60.0, 0.0, 8.0)
+    THROTTLE = (50.0, 5.0, 5.0)
+    PITCH = (80.0, 5.0, 10.0)
+
+    def __init__(self, drone, detector, select=None, rate=None):
+        """
+        Arguments:
+            drone: AbstractDroneBase to fly
+            detector: FrameProcessor finding the target, run on the video path through this processor
+            select: callable picking the target box out of the detector result, defaults to the largest
+            rate: control ticks per second, defaults to RATE
+        """
+        self.drone = drone
+        self.detector = detector
+        self.select = select or largest
+        self.interval = 1.0 / (rate or self.RATE)
+        self.SCALE = detector.SCALE
+        self.yaw = PID(*self.YAW)
+        self.throttle = PID(*self.THROTTLE)
+        self.pitch = PID(*self.PITCH)
+        self.engaged = False
+        self.ticks = 0
+        self.late_ticks = 0  # Ticks starting more than one interval late
+        self.predicted_ticks = 0  # Ticks steered on a predicted position
+        self.hover_ticks = 0  # Ticks without a usable detection
+        self.detections = 0
+        self.__lock = threading.Lock()
+        self.__steering = threading.Lock()  # Held by a control step, disengage waits for it
+        self.__observation = None  # (timestamp, x, y, height) normalised
+        self.__velocity = (0.0, 0.0, 0.0)
+        self.__jitter = deque(maxlen=self.TIMING_WINDOW)
+        self.__compute = deque(maxlen=self.TIMING_WINDOW)
+        self.__age = deque(maxlen=self.TIMING_WINDOW)
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    # +--------------------------------------------------------------+
+    # Vision side
+    # +--------------------------------------------------------------+
+    def setup(self):
+        self.detector.setup()
+        self.__stop.clear()
+        self.__thread = threading.Thread(target=self.__run, name='follow', daemon=True)
+        self.__thread.start()
+
+    def teardown(self):
+        self.disengage()
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join(1.0)
+        self.detector.teardown()
+
+    def process(self, frame, context):
+        result = self.detector.process(frame, context)
+        box = self.select(result)
+        if box is not None:
+            height, width = frame.shape[:2]
+            self.observe(box, (width, height), context.timestamp)
+        return result
+
+    def annotate(self, canvas, result):
+        self.detector.annotate(canvas, result)
+
+    def observe(self, box, frame_size, timestamp=None):
+        """Feed a target detection
+        Arguments:
+            box: (x, y, width, height) in pixels of a frame of frame_size
+            frame_size: (width, height)
+            timestamp: monotonic capture time of the frame, defaults to now
+        """
+        timestamp = timestamp or time.monotonic()
+        width, height = frame_size
+        x = (box[0] + box[2] / 2.0) / width * 2.0 - 1.0
+        y = (box[1] + box[3] / 2.0) / height * 2.0 - 1.0
+        size = box[3] / float(height)
+        with self.__lock:
+            previous = self.__observation
+            if previous is not None and timestamp <= previous[0]:
+                return  # Older than what we already have
+            if previous is not None and timestamp - previous[0] < self.LOST_TIMEOUT:
+                dt = timestamp - previous[0]
+                sample = ((x - previous[1]) / dt, (y - previous[2]) / dt, (size - previous[3]) / dt)
+                self.__velocity = tuple(v + (s - v) * self.VELOCITY_SMOOTHING
+                                        for v, s in zip(self.__velocity, sample))
+            else:
+                self.__velocity = (0.0, 0.0, 0.0)
+            self.__observation = (timestamp, x, y, size)
+            self.detections += 1
+
+    def predict(self, now=None):
+        """Target position extrapolated to a point in time
+        Arguments:
+            now: monotonic time, defaults to now
+        Return:
+            (x, y, height, age) normalised, None without a recent detection
+        """
+        now = now or time.monotonic()
+        with self.__lock:
+            observation, velocity = self.__observation, self.__velocity
+        if observation is None:
+            return None
+        age = now - observation[0]
+        if age > self.LOST_TIMEOUT:
+            return None
+        ahead = min(age, self.PREDICT_MAX)
+        return (observation[1] + velocity[0] * ahead, observation[2] + velocity[1] * ahead,
+                observation[3] + velocity[2] * ahead, age)
+
+    # +--------------------------------------------------------------+
+    # Control loop
+    # +--------------------------------------------------------------+
+    def engage(self):
+        """Start steering the drone"""
+        with self.__steering:
+            for pid in (self.yaw, self.throttle, self.pitch):
+                pid.reset()
+            self.engaged = True
+
+    def disengage(self):
+        """Stop steering and leave the drone hovering, no control step runs after it"""
+        with self.__steering:
+            if self.engaged:
+                self.engaged = False
+                self.drone.set_rc(0, 0, 0, 0)
+
+    def __run(self):
+        deadline = time.monotonic()
+        last = deadline
+        while not self.__stop.is_set():
+            deadline += self.interval
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                self.__stop.wait(delay)
+            if self.__stop.is_set():
+                break
+            now = time.monotonic()
+            lateness = now - deadline
+            self.__jitter.append(abs(lateness))
+            if lateness > self.interval:
+                self.late_ticks += 1
+                deadline = now  # Fell behind, do not burst to catch up
+            dt, last = now - last, now
+            with self.__steering:
+                if self.engaged:
+                    self.__tick(now, dt)
+                    self.__compute.append(time.monotonic() - now)
+
+    def __tick(self, now, dt):
+        """One control step
+        Arguments:
+            now: monotonic time of the tick
+            dt: seconds since the previous tick
+        """
+        self.ticks += 1
+        target = self.predict(now)
+        if target is None:
+            self.hover_ticks += 1
+            for pid in (self.yaw, self.throttle, self.pitch):
+                pid.reset()
+            self.drone.set_rc(0, 0, 0, 0)
+            return
+
+        x, y, size, age = target
+        self.__age.append(age)
+        if age > self.interval:
+            self.predicted_ticks += 1
+        yaw = self.yaw.update(x, dt)
+        throttle = self.throttle.update(-y, dt)  # Image y grows downwards
+        pitch = self.pitch.update(self.TARGET_HEIGHT - size, dt)
+        self.drone.set_rc(0, int(round(pitch)), int(round(throttle)), int(round(yaw)))
+
+    @property
+    def stats(self):
+        """Control loop timing, times in milliseconds
+        Return:
+            dict
+        """
+        def summary(samples, prefix):
+            samples = sorted(samples)
+            if not samples:
+                return {prefix + '_avg': 0.0, prefix + '_p95': 0.0, prefix + '_max': 0.0}
+            return {prefix + '_avg': sum(samples) / len(samples) * 1000.0,
+                    prefix + '_p95': samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000.0,
+                    prefix + '_max': samples[-1] * 1000.0}
+
+        stats = {'ticks': self.ticks, 'late_ticks': self.late_ticks, 'predicted_ticks': self.predicted_ticks,
+                 'hover_ticks': self.hover_ticks, 'detections': self.detections}
+        stats.update(summary(self.__jitter, 'jitter'))
+        stats.update(summary(self.__compute, 'compute'))
+        stats.update(summary(self.__age, 'detection_age'))
+        return stats
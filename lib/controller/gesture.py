@@ -0,0 +1,356 @@
+"""Hand gesture control library
+
+Turns a hand in front of the drone camera into drone commands. The hand
+detector only runs to acquire the hand, after that its landmarks follow the
+hand from frame to frame with pyramidal Lucas-Kanade optical flow on the
+shared downscaled grayscale frame, a couple of milliseconds instead of a
+full detection. Gestures are recognised from which fingers are extended,
+must hold for a few frames before being acted upon and need a clearly
+weaker score to be released, so a shaky hand does not make the drone
+twitch. Pointing moves the drone through the RC scheduler, thumb up and
+fist take off and land without blocking the video path.
+"""
+
+# coding=utf-8
+
+from collections import namedtuple, deque
+import math
+import time
+from lib.vision.processor import FrameProcessor
+
+GestureState = namedtuple('GestureState', ['gesture', 'score', 'action', 'landmarks', 'tracked', 'latency'])
+
+# Hand landmark indices, same layout as MediaPipe Hands
+WRIST = 0
+THUMB = (2, 3, 4)  # mcp, ip, tip
+FINGERS = ((5, 6, 8), (9, 10, 12), (13, 14, 16), (17, 18, 20))  # index, middle, ring, pinky: mcp, pip, tip
+
+
+class MediaPipeHands(object):
+    """Hand detector backed by MediaPipe, optional dependency"""
+
+    def __init__(self, min_confidence=0.5):
+        """
+        Arguments:
+            min_confidence: detection confidence 0-1
+        """
+        import mediapipe
+
+        self.__hands = mediapipe.solutions.hands.Hands(static_image_mode=True, max_num_hands=1,
+                                                       min_detection_confidence=min_confidence)
+
+    def __call__(self, frame):
+        """Find a hand
+        Arguments:
+            frame: numpy array in BGR
+        Return:
+            numpy array (21, 2) of landmarks in frame pixels, None without a hand
+        """
+        import cv2
+        import numpy as np
+
+        found = self.__hands.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        if not found.multi_hand_landmarks:
+            return None
+        height, width = frame.shape[:2]
+        return np.array([(point.x * width, point.y * height) for point in found.multi_hand_landmarks[0].landmark],
+                        dtype=np.float32)
+
+
+def extended(landmarks):
+    """How much every finger is extended
+    Arguments:
+        landmarks: numpy array (21, 2)
+    Return:
+        tuple of 5 floats 0-1, thumb first
+    """
+    def distance(a, b):
+        return math.hypot(landmarks[a][0] - landmarks[b][0], landmarks[a][1] - landmarks[b][1])
+
+    def ratio(value):
+        # A straight finger tip is clearly further out than its middle joint
+        return min(1.0, max(0.0, (value - 1.0) / 0.3))
+
+    # The thumb folds across the palm, towards the pinky base
+    _, ip, tip = THUMB
+    values = [ratio(distance(tip, 17) / max(distance(ip, 17), 1e-6))]
+    for _, pip, tip in FINGERS:
+        values.append(ratio(distance(tip, WRIST) / max(distance(pip, WRIST), 1e-6)))
+    return tuple(values)
+
+
+class GestureEngine(FrameProcessor):
+    # +--------------------------------------------------------------+
+    # DEFAULT OBJECT VARIABLES
+    # +--------------------------------------------------------------+
+    NAME = 'gesture'
+    TRACK_SCALE = 0.5  # Resize factor of the grayscale frame used for optical flow
+    MIN_TRACKED = 0.6  # Fraction of landmarks that must follow the hand, below the hand is re-acquired
+    MAX_FB_ERROR = 1.0  # Forward-backward optical flow error in pixels for a landmark to count
+    DEBOUNCE = 3  # Frames a new gesture must win before it is acted upon
+    ENTER = 0.8  # Score a gesture needs to be recognised
+    EXIT = 0.5  # Score under which the current gesture is released
+    MOVE_ENTER = 0.35  # Pointing strength that starts a move, in hand sizes
+    MOVE_EXIT = 0.2  # Pointing strength under which the move stops
+    SPEED = 40  # RC velocity at full pointing strength
+    LOST_TIMEOUT = 0.3  # Seconds without a hand before the drone is told to hover
+    LATENCY_BUDGET = 0.150  # Seconds from frame capture to command
+    LATENCY_WINDOW = 256
+
+    # Extended fingers (thumb, index, middle, ring, pinky) of every gesture
+    GESTURES = {
+        'open': (1, 1, 1, 1, 1),
+        'fist': (0, 0, 0, 0, 0),
+        'thumb_up': (1, 0, 0, 0, 0),
+        'point': (0, 1, 0, 0, 0),
+        'victory': (0, 1, 1, 0, 0),
+    }
+
+    # Gesture and the action it triggers, ('rc', roll, pitch, throttle, yaw) or a drone method run once
+    ACTIONS = {
+        'open': ('rc', 0, 0, 0, 0),
+        'fist': ('land',),
+        'thumb_up': ('takeoff',),
+        'point': ('move',),
+        'victory': ('rc', 0, 40, 0, 0),
+    }
+
+    def __init__(self, drone, detector=None):
+        """
+        Arguments:
+            drone: AbstractDroneBase receiving the commands
+            detector: callable taking a BGR frame and returning (21, 2) landmarks or None,
+                defaults to MediaPipeHands
+        """
+        self.drone = drone
+        self.detector = detector
+        self.enabled = True
+        self.detections = 0
+        self.tracked = 0
+        self.commands = 0
+        self.over_budget = 0
+        self.__landmarks = None
+        self.__previous = None  # Grayscale frame the landmarks were found on
+        self.__gesture = None
+        self.__candidate = None
+        self.__candidate_frames = 0
+        self.__fired = None  # One-shot gesture already acted upon
+        self.__moving = False
+        self.__last_rc = None
+        self.__last_seen = None
+        self.__latency = deque(maxlen=self.LATENCY_WINDOW)
+
+    def setup(self):
+        if self.detector is None:
+            self.detector = MediaPipeHands()
+
+    # +--------------------------------------------------------------+
+    # Hand tracking
+    # +--------------------------------------------------------------+
+    def __follow(self, gray):
+        """Move the landmarks with optical flow
+        Arguments:
+            gray: grayscale frame at TRACK_SCALE
+        Return:
+            boolean, False when the hand got away
+        """
+        import cv2
+        import numpy as np
+
+        start = (self.__landmarks * self.TRACK_SCALE).reshape(-1, 1, 2).astype(np.float32)
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(self.__previous, gray, start, None,
+                                                    winSize=(15, 15), maxLevel=2)
+        back, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self.__previous, moved, None,
+                                                        winSize=(15, 15), maxLevel=2)
+        error = np.linalg.norm((start - back).reshape(-1, 2), axis=1)
+        good = (status.ravel() == 1) & (back_status.ravel() == 1) & (error < self.MAX_FB_ERROR)
+        if good.mean() < self.MIN_TRACKED:
+            return False
+
+        # Landmarks that were not followed move with the rest of the hand
+        shift = np.median((moved - start).reshape(-1, 2)[good], axis=0)
+        points = (start.reshape(-1, 2) + shift)
+        points[good] = moved.reshape(-1, 2)[good]
+        self.__landmarks = points / self.TRACK_SCALE
+        return True
+
+    def __locate(self, frame, context):
+        """Follow the hand, or find it again
+        Arguments:
+            frame: numpy array in BGR
+            context: FrameContext
+        Return:
+            boolean, True if the landmarks come from tracking
+        """
+        gray = context.gray(self.TRACK_SCALE)
+        tracked = self.__landmarks is not None and self.__previous is not None and self.__follow(gray)
+        if tracked:
+            self.tracked += 1
+        else:
+            self.__landmarks = self.detector(frame)
+            self.detections += 1
+        self.__previous = gray if self.__landmarks is not None else None
+        return tracked
+
+    # +--------------------------------------------------------------+
+    # Gesture recognition
+    # +--------------------------------------------------------------+
+    def scores(self, landmarks):
+        """How well a hand pose matches every gesture
+        Arguments:
+            landmarks: numpy array (21, 2)
+        Return:
+            dict of gesture name and score 0-1
+        """
+        fingers = extended(landmarks)
+        return {name: sum(1.0 - abs(value - wanted) for value, wanted in zip(fingers, template)) / len(template)
+                for name, template in self.GESTURES.items()}
+
+    def classify(self, landmarks):
+        """Closest gesture to a hand pose
+        Arguments:
+            landmarks: numpy array (21, 2)
+        Return:
+            (gesture name, score 0-1)
+        """
+        scores = self.scores(landmarks)
+        best = max(scores, key=scores.get)
+        return best, scores[best]
+
+    def __debounce(self, scores):
+        """Apply hysteresis and debouncing to the gesture scores
+        Arguments:
+            scores: dict of gesture name and score
+        Return:
+            name of the gesture in effect, None for no gesture
+        """
+        best = max(scores, key=scores.get)
+        if best != self.__gesture and scores[best] >= self.ENTER:
+            # A new gesture must win several frames in a row
+            if best == self.__candidate:
+                self.__candidate_frames += 1
+            else:
+                self.__candidate, self.__candidate_frames = best, 1
+            if self.__candidate_frames >= self.DEBOUNCE:
+                self.__gesture = best
+                self.__candidate, self.__candidate_frames = None, 0
+        else:
+            self.__candidate, self.__candidate_frames = None, 0
+
+        # The current gesture holds until its pose is clearly gone
+        if self.__gesture is not None and scores[self.__gesture] < self.EXIT:
+            self.__gesture = None
+        return self.__gesture
+
+    def __pointing(self):
+        """RC velocities from the index finger direction, with a hysteresis dead zone
+        Return:
+            (roll, throttle)
+        """
+        landmarks = self.__landmarks
+        size = max(math.hypot(landmarks[9][0] - landmarks[WRIST][0], landmarks[9][1] - landmarks[WRIST][1]), 1e-6)
+        dx = (landmarks[8][0] - landmarks[5][0]) / size
+        dy = (landmarks[8][1] - landmarks[5][1]) / size
+        strength = math.hypot(dx, dy)
+        self.__moving = strength >= (self.MOVE_EXIT if self.__moving else self.MOVE_ENTER)
+        if not self.__moving:
+            return 0, 0
+        scale = self.SPEED / max(strength, 1.0)
+        # Image y grows downwards, pointing up climbs
+        return int(round(dx * scale)), int(round(-dy * scale))
+
+    # +--------------------------------------------------------------+
+    # Commands
+    # +--------------------------------------------------------------+
+    def __act(self, gesture):
+        """Send the command of the gesture in effect
+        Arguments:
+            gesture: gesture name or None
+        Return:
+            action tuple sent, None if nothing was sent
+        """
+        action = self.ACTIONS.get(gesture)
+        if action is not None and action[0] == 'move':
+            roll, throttle = self.__pointing()
+            return self.__rc(roll, 0, throttle, 0)
+        self.__moving = False
+        if action is not None and action[0] == 'rc':
+            return self.__rc(*action[1:])
+        # The RC scheduler repeats the last sticks, a released rc or move gesture must hover
+        hover = self.__rc(0, 0, 0, 0) if self.__last_rc is not None else None
+        if action is None:
+            return hover
+        if self.__fired == gesture:
+            return hover  # One-shot gestures fire once per appearance
+        self.__fired = gesture
+        self.commands += 1
+        getattr(self.drone, action[0] + '_async')()
+        return action
+
+    def __rc(self, roll, pitch, throttle, yaw):
+        command = (roll, pitch, throttle, yaw)
+        if command == self.__last_rc:
+            return None
+        self.__last_rc = command
+        self.commands += 1
+        self.drone.set_rc(*command)
+        return ('rc',) + command
+
+    def process(self, frame, context):
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        captured = context.timestamp or now
+        tracked = self.__locate(frame, context)
+
+        if self.__landmarks is None:
+            gesture, score = None, 0.0
+            self.__gesture, self.__candidate, self.__fired = None, None, None
+            if self.__last_seen is not None and now - self.__last_seen > self.LOST_TIMEOUT:
+                self.__last_seen = None
+                action = self.__rc(0, 0, 0, 0)  # Hand gone, hover
+            else:
+                action = None
+        else:
+            self.__last_seen = now
+            scores = self.scores(self.__landmarks)
+            gesture = self.__debounce(scores)
+            score = scores[gesture] if gesture is not None else 0.0
+            if gesture != self.__fired:
+                self.__fired = None  # Another pose in between re-arms one-shot gestures
+            action = self.__act(gesture)
+
+        latency = None
+        if action is not None:
+            latency = time.monotonic() - captured
+            self.__latency.append(latency)
+            if latency > self.LATENCY_BUDGET:
+                self.over_budget += 1
+        return GestureState(gesture, score, action, self.__landmarks, tracked, latency)
+
+    def annotate(self, canvas, result):
+        import cv2
+
+        if result.landmarks is None:
+            return
+        color = (0, 255, 0) if result.tracked else (255, 255, 0)
+        for x, y in result.landmarks:
+            cv2.circle(canvas, (int(x), int(y)), 3, color, -1)
+        if result.gesture is not None:
+            x, y = result.landmarks[WRIST]
+            cv2.putText(canvas, result.gesture, (int(x), int(y) + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+
+    @property
+    def stats(self):
+        """Detector use and capture to command latency in milliseconds
+        Return:
+            dict
+        """
+        samples = sorted(self.__latency)
+        stats = {'detections': self.detections, 'tracked': self.tracked, 'commands': self.commands,
+                 'over_budget': self.over_budget, 'latency_avg': 0.0, 'latency_p95': 0.0, 'latency_max': 0.0}
+        if samples:
+            stats['latency_avg'] = sum(samples) / len(samples) * 1000.0
+            stats['latency_p95'] = samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000.0
+            stats['latency_max'] = samples[-1] * 1000.0
+        return stats
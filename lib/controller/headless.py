@@ -0,0 +1,182 @@
+"""Headless controller library
+
+Flies a drone without a display, for autonomous flights and ground station
+servers. RC dispatch, telemetry and the frame processors keep running on
+the drone threads while nothing is drawn, converted or blitted. A preview
+can be encoded at a low rate, written to disk or sent to a local UDP port,
+so a single machine can run many sessions side by side.
+"""
+
+# coding=utf-8
+
+import os
+import socket
+import threading
+import time
+from lib.controller.pipeline import FramePipeline, release
+
+
+class HeadlessSession(object):
+    # +--------------------------------------------------------------+
+    # DEFAULT OBJECT VARIABLES
+    # +--------------------------------------------------------------+
+    IDLE_TIMEOUT = 0.5  # Seconds between battery and video checks
+    PREVIEW_RATE = 2.0  # Preview frames per second
+    PREVIEW_SCALE = 0.5  # Preview size as a fraction of the video
+    PREVIEW_QUALITY = 70  # JPEG quality of the preview
+    DATAGRAM_MAX = 65507  # Largest UDP payload, bigger previews are skipped
+
+    def __init__(self, drone, preview=None, preview_rate=None, preview_scale=None):
+        """
+        Arguments:
+            drone: AbstractDroneBase to fly, hello() is called by start()
+            preview: None for no preview, a file path rewritten with the newest JPEG,
+                or a (host, port) tuple receiving every JPEG as one UDP datagram
+            preview_rate: preview frames per second, defaults to PREVIEW_RATE
+            preview_scale: preview size as a fraction of the video, defaults to PREVIEW_SCALE
+        """
+        self.drone = drone
+        self.preview = preview
+        self.preview_interval = 1.0 / (preview_rate or self.PREVIEW_RATE)
+        self.preview_scale = preview_scale or self.PREVIEW_SCALE
+        self.pipeline = None
+        self.previews = 0
+        self.preview_skips = 0  # Previews too large for a datagram or failing to write
+        self.__preview_time = 0.0
+        self.__socket = None
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def start(self):
+        """Connect, start RC, video and the processing pipeline"""
+        self.__stop.clear()
+        self.drone.hello()
+        # RC commands go out at the drone RC_RATE from their own thread
+        self.drone.start_rc()
+        self.drone.start_video_streaming()
+
+        self.pipeline = FramePipeline(self.drone.get_video_frames(), process=self.process_frame,
+                                      metrics=self.drone.metrics, log=self.drone.log)
+        self.pipeline.start()
+        if self.preview is not None:
+            if isinstance(self.preview, tuple):
+                self.__socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.__thread = threading.Thread(target=self.__run_preview, name='headless-preview', daemon=True)
+            self.__thread.start()
+
+    def run(self, duration=None):
+        """Fly until stopped, the battery runs low or the video ends, then release the drone
+        Arguments:
+            duration: seconds to run at most, None runs until stopped
+        """
+        if self.pipeline is None:
+            self.start()
+        deadline = None if duration is None else time.monotonic() + duration
+        try:
+            while not self.__stop.wait(self.IDLE_TIMEOUT):
+                if self.drone.is_low_battery is True or self.pipeline.stopped:
+                    break
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+        finally:
+            self.close()
+
+    def stop(self):
+        """Make run() return, safe from any thread"""
+        self.__stop.set()
+
+    def close(self):
+        """Stop the pipeline and the preview, release the drone"""
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join(1.0)
+            self.__thread = None
+        if self.pipeline is not None:
+            self.pipeline.stop()
+        if self.__socket is not None:
+            self.__socket.close()
+            self.__socket = None
+        self.drone.bye()
+
+    def process_frame(self, packet):
+        """Run the drone frame processors, called from the pipeline processing thread
+        Arguments:
+            packet: FramePacket
+        """
+        results = self.drone.process_frame(packet.frame, packet.seq, packet.captured_at)
+        # Processed is as far as a headless frame goes, it sets the pipeline latency
+        self.pipeline.rendered(packet)
+        return results
+
+    # +--------------------------------------------------------------+
+    # Preview
+    # +--------------------------------------------------------------+
+    def __run_preview(self):
+        deadline = time.monotonic()
+        while not self.__stop.is_set():
+            deadline += self.preview_interval
+            delay = deadline - time.monotonic()
+            if delay > 0 and self.__stop.wait(delay):
+                break
+            packet = self.pipeline.get_frame(timeout=self.preview_interval)
+            if packet is None:
+                continue
+            start = time.perf_counter()
+            try:
+                self.__publish(self.encode(packet.frame, self.pipeline.results))
+                self.previews += 1
+            except (OSError, ValueError) as e:
+                self.preview_skips += 1
+                self.drone.log('Preview skipped: ' + str(e))
+            finally:
+                release(packet)
+            self.__preview_time += time.perf_counter() - start
+
+    def encode(self, frame, context=None):
+        """Annotated, downscaled JPEG of a frame
+        Arguments:
+            frame: numpy array in BGR
+            context: FrameContext of the frame processors, drawn on the preview
+        Return:
+            bytes
+        """
+        import cv2
+
+        canvas = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        self.drone.frame_scheduler.annotate(canvas, context)
+        height, width = canvas.shape[:2]
+        size = (max(1, int(width * self.preview_scale)), max(1, int(height * self.preview_scale)))
+        canvas = cv2.cvtColor(cv2.resize(canvas, size, interpolation=cv2.INTER_AREA), cv2.COLOR_RGB2BGR)
+        ok, data = cv2.imencode('.jpg', canvas, [cv2.IMWRITE_JPEG_QUALITY, self.PREVIEW_QUALITY])
+        if not ok:
+            raise ValueError('JPEG encoding failed')
+        return data.tobytes()
+
+    def __publish(self, data):
+        """Hand a preview to its destination
+        Arguments:
+            data: JPEG bytes
+        """
+        if self.__socket is not None:
+            if len(data) > self.DATAGRAM_MAX:
+                raise ValueError('Preview of {n} bytes does not fit a datagram'.format(n=len(data)))
+            self.__socket.sendto(data, self.preview)
+        else:
+            # Readers never see a half written file
+            temporary = self.preview + '.tmp'
+            with open(temporary, 'wb') as f:
+                f.write(data)
+            os.replace(temporary, self.preview)
+
+    @property
+    def stats(self):
+        """Pipeline, frame processor and preview figures, times in milliseconds
+        Return:
+            dict
+        """
+        stats = {'previews': self.previews, 'preview_skips': self.preview_skips,
+                 'preview_avg': self.__preview_time / self.previews * 1000.0 if self.previews else 0.0,
+                 'processors': self.drone.frame_scheduler.stats}
+        if self.pipeline is not None:
+            stats.update(self.pipeline.stats)
+        return stats
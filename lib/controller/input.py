@@ -0,0 +1,217 @@
+"""Controller input library
+
+Turns keyboard, joystick and gamepad events into the four RC channels and
+controller actions. The key, axis and button tables of the selected stick
+mode are built once, every event is a single dictionary lookup, and the
+mode can be switched in flight. The controller sleeps in pygame.event.wait
+until input arrives or the frame pipeline posts FRAME_READY, instead of
+polling the event queue at the display rate.
+"""
+
+# coding=utf-8
+
+import threading
+import pygame
+
+# Posted by notify_frame() when the pipeline has a new frame to render
+FRAME_READY = pygame.event.custom_type()
+
+
+class StickInput(object):
+    # +--------------------------------------------------------------+
+    # DEFAULT OBJECT VARIABLES
+    # +--------------------------------------------------------------+
+    SPEED = 60  # RC velocity of a held key and of a joystick at full tilt
+    MODE = 2  # Standard default on most drones
+    DEADZONE = 0.1  # Joystick tilt ignored around the centre
+
+    # RC channels in the order of set_rc
+    ROLL, PITCH, THROTTLE, YAW = range(4)
+
+    # Channels of the (vertical, horizontal) axes of the left and right stick per mode
+    STICK_MODES = {
+        1: ((PITCH, YAW), (THROTTLE, ROLL)),
+        2: ((THROTTLE, YAW), (PITCH, ROLL)),
+        3: ((PITCH, ROLL), (THROTTLE, YAW)),
+        4: ((THROTTLE, ROLL), (PITCH, YAW)),
+    }
+
+    # Keys of the (up, down, left, right) directions of the left and right stick
+    STICK_KEYS = ((pygame.K_w, pygame.K_s, pygame.K_a, pygame.K_d),
+                  (pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT))
+
+    # Joystick (horizontal, vertical) axes of the left and right stick, common gamepad layout
+    JOYSTICK_AXES = ((0, 1), (3, 4))
+
+    # Key and joystick button actions, fired on release
+    ACTION_KEYS = {
+        pygame.K_q: 'quit',
+        pygame.K_t: 'takeoff',
+        pygame.K_l: 'land',
+        pygame.K_g: 'gesture',
+        pygame.K_1: 'mode1',
+        pygame.K_2: 'mode2',
+        pygame.K_3: 'mode3',
+        pygame.K_4: 'mode4',
+    }
+    ACTION_BUTTONS = {
+        0: 'takeoff',
+        1: 'land',
+        3: 'gesture',
+        7: 'quit',
+    }
+
+    def __init__(self, actions=None, mode=None, speed=None):
+        """
+        Arguments:
+            actions: dict of action name and callable, mode1~mode4 switch the stick mode by default
+            mode: stick mode 1~4, defaults to MODE
+            speed: RC velocity at full input, defaults to SPEED
+        """
+        self.speed = speed or self.SPEED
+        self.actions = {'mode{n}'.format(n=n): (lambda n=n: self.set_mode(n)) for n in self.STICK_MODES}
+        self.actions.update(actions or {})
+        self.mode = None
+        self.joysticks = {}  # Opened joysticks by instance id
+        self.__keys = {}  # key: (channel, direction)
+        self.__axes = {}  # joystick axis: (channel, direction)
+        self.__held = {}  # Pressed stick keys and their (channel, direction)
+        self.__keyboard = [0, 0, 0, 0]
+        self.__joystick = [0, 0, 0, 0]
+        self.__frame_posted = threading.Event()
+        self.__handlers = {
+            pygame.KEYDOWN: self.__key_down,
+            pygame.KEYUP: self.__key_up,
+            pygame.JOYAXISMOTION: self.__axis_motion,
+            pygame.JOYBUTTONUP: self.__button_up,
+            pygame.JOYDEVICEADDED: self.__device_added,
+            pygame.JOYDEVICEREMOVED: self.__device_removed,
+        }
+        self.set_mode(mode or self.MODE)
+
+    def set_mode(self, mode):
+        """Switch the stick mode, the sticks are centred
+        Arguments:
+            mode: 1~4
+        """
+        keys, axes = {}, {}
+        for stick, (vertical, horizontal) in enumerate(self.STICK_MODES[mode]):
+            up, down, left, right = self.STICK_KEYS[stick]
+            keys.update({up: (vertical, 1), down: (vertical, -1), left: (horizontal, -1), right: (horizontal, 1)})
+            x, y = self.JOYSTICK_AXES[stick]
+            axes.update({x: (horizontal, 1), y: (vertical, -1)})  # Joystick y grows downwards
+        self.__keys, self.__axes = keys, axes
+        self.__held.clear()
+        self.__keyboard = [0, 0, 0, 0]
+        self.__joystick = [0, 0, 0, 0]
+        self.mode = mode
+
+    # +--------------------------------------------------------------+
+    # Events
+    # +--------------------------------------------------------------+
+    def wait(self, timeout=None):
+        """Sleep until input or a frame arrives, then handle every pending event
+        Arguments:
+            timeout: seconds to sleep at most, None waits forever
+        Return:
+            (sticks changed or action fired, frame ready) booleans
+        """
+        first = pygame.event.wait(0 if timeout is None else max(1, int(timeout * 1000)))
+        changed = ready = False
+        for event in [first] + pygame.event.get():
+            if event.type == FRAME_READY:
+                self.__frame_posted.clear()
+                ready = True
+            else:
+                changed = self.handle(event) or changed
+        return changed, ready
+
+    def handle(self, event):
+        """Apply a pygame event
+        Arguments:
+            event: pygame event
+        Return:
+            boolean, True if the sticks changed or an action fired, the RC command is due again
+        """
+        handler = self.__handlers.get(event.type)
+        return handler(event) if handler is not None else False
+
+    def notify_frame(self):
+        """Wake wait() up for a new frame, safe from any thread, posts once until handled"""
+        if not self.__frame_posted.is_set():
+            self.__frame_posted.set()
+            pygame.event.post(pygame.event.Event(FRAME_READY))
+
+    def __key_down(self, event):
+        binding = self.__keys.get(event.key)
+        if binding is None:
+            return False
+        self.__held[event.key] = binding
+        return self.__update_keyboard(binding[0])
+
+    def __key_up(self, event):
+        binding = self.__held.pop(event.key, None)
+        if binding is not None:
+            return self.__update_keyboard(binding[0])
+        return self.__fire(self.ACTION_KEYS.get(event.key))
+
+    def __update_keyboard(self, channel):
+        """Recompute a channel from the keys still held, opposite keys cancel out
+        Arguments:
+            channel: ROLL, PITCH, THROTTLE or YAW
+        Return:
+            boolean, True if the channel changed
+        """
+        direction = sum(d for c, d in self.__held.values() if c == channel)
+        value = self.speed * max(-1, min(1, direction))
+        changed = value != self.__keyboard[channel]
+        self.__keyboard[channel] = value
+        return changed
+
+    def __axis_motion(self, event):
+        binding = self.__axes.get(event.axis)
+        if binding is None:
+            return False
+        channel, direction = binding
+        tilt = event.value if abs(event.value) > self.DEADZONE else 0.0
+        value = int(round(tilt * direction * self.speed))
+        changed = value != self.__joystick[channel]
+        self.__joystick[channel] = value
+        return changed
+
+    def __button_up(self, event):
+        return self.__fire(self.ACTION_BUTTONS.get(event.button))
+
+    def __device_added(self, event):
+        joystick = pygame.joystick.Joystick(event.device_index)
+        self.joysticks[joystick.get_instance_id()] = joystick
+        return False
+
+    def __device_removed(self, event):
+        self.joysticks.pop(event.instance_id, None)
+        # A joystick pulled out mid-flight must not leave the drone moving
+        changed = any(self.__joystick)
+        self.__joystick = [0, 0, 0, 0]
+        return changed
+
+    def __fire(self, action):
+        """Run the callable of an action, a mode switch centres the sticks and
+        takeoff or land decide whether RC is sent at all
+        Arguments:
+            action: action name or None
+        Return:
+            boolean, True if an action ran
+        """
+        callback = self.actions.get(action)
+        if callback is None:
+            return False
+        callback()
+        return True
+
+    @property
+    def sticks(self):
+        """RC channels from the keyboard and the joysticks together
+        Return:
+            (left_right, forward_back, up_down, yaw) between -100~100
+        """
+        return tuple(max(-100, min(100, k + j)) for k, j in zip(self.__keyboard, self.__joystick))
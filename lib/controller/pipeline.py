@@ -0,0 +1,235 @@
+"""Frame pipeline library
+
+Splits the video path into capture, processing and render stages running
+at their own pace. Capture hands every frame to the processing and render
+stages through single-slot buffers where the newest frame always wins, so a
+slow stage drops stale frames instead of queueing them and never holds back
+the others. Render does not wait on processing, it draws the newest frame
+with the newest processing results available. Frames of a pooled reader are
+leased for each stage and go back to the pool once the stage is done or the
+frame is dropped, so the decoder never writes into a frame still in use.
+"""
+
+# coding=utf-8
+
+from collections import namedtuple, deque
+import threading
+import time
+
+# lease is the PooledFrame behind frame, None for readers without a frame pool
+FramePacket = namedtuple('FramePacket', ['seq', 'frame', 'captured_at', 'results', 'lease'], defaults=(None,))
+
+
+def release(packet):
+    """Give the frame of a packet back to its pool, calling it twice is harmless
+    Arguments:
+        packet: FramePacket
+    """
+    if packet.lease is not None:
+        packet.lease.release()
+
+
+class LatestFrameSlot(object):
+    """Single-slot buffer, putting a new item replaces the unread one"""
+
+    def __init__(self, name, on_drop=None):
+        """
+        Arguments:
+            name: string, stage name used in stats
+            on_drop: callable taking an item replaced before being read
+        """
+        self.name = name
+        self.on_drop = on_drop
+        self.puts = 0
+        self.drops = 0
+        self.__item = None
+        self.__closed = False
+        self.__cond = threading.Condition()
+
+    def put(self, item):
+        """Store item, dropping the previous one if it was never read
+        Arguments:
+            item: any
+        """
+        with self.__cond:
+            if self.__item is not None:
+                self.drops += 1
+                if self.on_drop is not None:
+                    self.on_drop(self.__item)
+            self.__item = item
+            self.puts += 1
+            self.__cond.notify()
+
+    def get(self, timeout=None):
+        """Take the newest item, waiting up to timeout for one
+        Arguments:
+            timeout: seconds, None waits forever
+        Return:
+            item or None on timeout/close
+        """
+        with self.__cond:
+            if self.__item is None and not self.__closed:
+                self.__cond.wait(timeout)
+            item, self.__item = self.__item, None
+            return item
+
+    def close(self):
+        """Wake up every waiting reader, an unread item is dropped"""
+        with self.__cond:
+            if self.__item is not None and self.on_drop is not None:
+                self.on_drop(self.__item)
+                self.__item = None
+            self.__closed = True
+            self.__cond.notify_all()
+
+    @property
+    def drop_rate(self):
+        """Fraction of items replaced before being read
+        Return:
+            float
+        """
+        return self.drops / self.puts if self.puts else 0.0
+
+
+class FramePipeline(object):
+    # +--------------------------------------------------------------+
+    # DEFAULT OBJECT VARIABLES
+    # +--------------------------------------------------------------+
+    CAPTURE_POLL = 0.002  # Seconds between checks for a new decoded frame, readers without acquire()
+    ACQUIRE_TIMEOUT = 0.1  # Seconds to wait for a pooled frame before checking for stop
+    LATENCY_WINDOW = 256  # Number of latency samples kept for stats
+
+    def __init__(self, frame_read, process=None, on_frame=None, metrics=None, log=None):
+        """
+        Arguments:
+            frame_read: video reader exposing .frame and .stopped, frames of a reader with
+                acquire(), e.g. VideoStream, are leased instead of read from .frame
+            process: callable taking a FramePacket, runs on the processing thread, its
+                return value is published as the latest results
+            on_frame: callable without arguments, called from the capture thread whenever
+                a new frame is ready to render, lets the render loop sleep instead of polling
+            metrics: Metrics receiving the capture to display latency of every frame
+            log: callable receiving error messages of the process callable
+        """
+        self.frame_read = frame_read
+        self.process = process
+        self.on_frame = on_frame
+        self.metrics = metrics
+        self.log = log
+        self.results = None  # Latest value returned by process
+        self.process_errors = 0
+        self.captured = LatestFrameSlot('process', on_drop=release)
+        self.display = LatestFrameSlot('render', on_drop=release)
+        self.__latency = deque(maxlen=self.LATENCY_WINDOW)
+        self.__stop = threading.Event()
+        self.__threads = []
+
+    def start(self):
+        """Start capture and processing threads, rendering stays with the caller"""
+        self.__stop.clear()
+        self.__threads = [threading.Thread(target=self.__capture, name='pipeline-capture', daemon=True),
+                          threading.Thread(target=self.__process, name='pipeline-process', daemon=True)]
+        for thread in self.__threads:
+            thread.start()
+
+    def stop(self):
+        """Stop all stages"""
+        self.__stop.set()
+        self.captured.close()
+        self.display.close()
+        for thread in self.__threads:
+            thread.join(1.0)
+        self.__threads = []
+
+    @property
+    def stopped(self):
+        """Check if the pipeline or its video source has stopped
+        Return:
+            boolean
+        """
+        return self.__stop.is_set() or self.frame_read.stopped
+
+    def __capture(self):
+        """Capture stage, publish every new decoded frame"""
+        acquire = getattr(self.frame_read, 'acquire', None)
+        last = None
+        after = 0
+        seq = 0
+        while not self.__stop.is_set():
+            if self.frame_read.stopped:
+                self.captured.close()
+                self.display.close()
+                break
+            if acquire is not None:
+                pooled = acquire(after=after, timeout=self.ACQUIRE_TIMEOUT)
+                if pooled is None:
+                    continue
+                after = pooled.seq
+                frame, lease = pooled.array, pooled
+            else:
+                frame, lease = self.frame_read.frame, None
+                # The reader replaces its frame object on every decode
+                if frame is None or frame is last:
+                    self.__stop.wait(self.CAPTURE_POLL)
+                    continue
+                last = frame
+            seq += 1
+            captured_at = time.monotonic()
+            if self.process is not None:
+                # Shared before render gets its lease, render may release it right away
+                self.captured.put(FramePacket(seq, frame, captured_at, {}, lease and lease.share()))
+            self.display.put(FramePacket(seq, frame, captured_at, {}, lease))
+            if self.on_frame is not None:
+                self.on_frame()
+
+    def __process(self):
+        """Processing stage, run the process callable on the newest frame"""
+        while not self.__stop.is_set():
+            packet = self.captured.get(timeout=0.1)
+            if packet is None:
+                continue
+            try:
+                self.results = self.process(packet)
+            except Exception as e:
+                # A failing frame must not end processing for the rest of the flight
+                self.process_errors += 1
+                if self.log is not None:
+                    self.log('Frame processing failed: ' + str(e))
+            finally:
+                release(packet)
+
+    def get_frame(self, timeout=None):
+        """Newest captured frame for the render stage, pair it with results
+        Arguments:
+            timeout: seconds to wait for one
+        Return:
+            FramePacket or None
+        """
+        return self.display.get(timeout)
+
+    def rendered(self, packet):
+        """Record that a frame reached the display, its frame goes back to the pool
+        Arguments:
+            packet: FramePacket
+        """
+        release(packet)
+        latency = time.monotonic() - packet.captured_at
+        self.__latency.append(latency)
+        if self.metrics is not None:
+            self.metrics.observe('drone_frame_stage_seconds', latency, 'latency')
+
+    @property
+    def stats(self):
+        """Capture-to-display latency in milliseconds, drop rate per stage and processing errors
+        Return:
+            dict
+        """
+        samples = sorted(self.__latency)
+        stats = {'latency_avg': 0.0, 'latency_p95': 0.0, 'latency_max': 0.0,
+                 'process_drop_rate': self.captured.drop_rate,
+                 'render_drop_rate': self.display.drop_rate, 'process_errors': self.process_errors}
+        if samples:
+            stats['latency_avg'] = sum(samples) / len(samples) * 1000.0
+            stats['latency_p95'] = samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000.0
+            stats['latency_max'] = samples[-1] * 1000.0
+        return stats
@@ -0,0 +1,106 @@
+"""Frame presenter library
+
+Puts drone video frames on a pygame display without per-frame allocation,
+the colour conversion is written straight into a buffer that a pygame
+surface shares memory with.
+"""
+
+# coding=utf-8
+
+import time
+import pygame
+
+
+class FramePresenter(object):
+    # +--------------------------------------------------------------+
+    # DEFAULT OBJECT VARIABLES
+    # +--------------------------------------------------------------+
+    TEXT_COLOR = (255, 0, 0)  # Overlay text colour, buffer is RGB
+    TEXT_FONT = 0  # cv2.FONT_HERSHEY_SIMPLEX, OpenCV is only imported once a frame shows up
+    TIMING_SMOOTHING = 0.1  # Weight of the newest sample in the moving average
+    STAGES = ('convert', 'overlay', 'blit', 'display')
+
+    def __init__(self, screen, metrics=None):
+        """
+        Arguments:
+            screen: pygame display surface
+            metrics: Metrics receiving the time of every stage
+        """
+        self.screen = screen
+        self.metrics = metrics
+        self.__buffer = None  # RGB target buffer, shared with __surface
+        self.__surface = None
+        self.__timings = dict.fromkeys(self.STAGES, 0.0)
+        self.frames = 0
+
+    def __allocate(self, height, width):
+        """(Re)allocate the RGB buffer and the surface viewing it
+        Arguments:
+            height: int
+            width: int
+        """
+        import numpy as np
+
+        self.__buffer = np.empty((height, width, 3), dtype=np.uint8)
+        # Surface reads the buffer memory directly, no copy on blit
+        self.__surface = pygame.image.frombuffer(self.__buffer, (width, height), 'RGB')
+
+    def present(self, frame, text=None, position=(0, 0), overlay=None):
+        """Convert a BGR frame into the display buffer and show it
+        Arguments:
+            frame: numpy array (height, width, 3) in BGR
+            text: string, optional overlay drawn at the bottom left
+            position: top left corner on screen
+            overlay: callable drawing on the RGB buffer before display
+        """
+        import cv2
+
+        height, width = frame.shape[:2]
+        if self.__buffer is None or self.__buffer.shape[:2] != (height, width):
+            self.__allocate(height, width)
+
+        start = time.perf_counter()
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self.__buffer)
+        converted = time.perf_counter()
+
+        if overlay is not None:
+            overlay(self.__buffer)
+        if text is not None:
+            cv2.putText(self.__buffer, text, (5, height - 5), self.TEXT_FONT, 1, self.TEXT_COLOR, 1)
+        overlaid = time.perf_counter()
+
+        # Only clear what the frame will not cover
+        if self.screen.get_size() != (width, height) or position != (0, 0):
+            self.screen.fill([0, 0, 0])
+        self.screen.blit(self.__surface, position)
+        blitted = time.perf_counter()
+
+        pygame.display.update()
+        displayed = time.perf_counter()
+
+        self.__track('convert', converted - start)
+        self.__track('overlay', overlaid - converted)
+        self.__track('blit', blitted - overlaid)
+        self.__track('display', displayed - blitted)
+        self.frames += 1
+
+    def __track(self, stage, seconds):
+        """Update the moving average of a stage
+        Arguments:
+            stage: string
+            seconds: float
+        """
+        if self.metrics is not None:
+            self.metrics.observe('drone_frame_stage_seconds', seconds, stage)
+        if self.frames == 0:
+            self.__timings[stage] = seconds
+        else:
+            self.__timings[stage] += (seconds - self.__timings[stage]) * self.TIMING_SMOOTHING
+
+    @property
+    def timings(self):
+        """Average cost of every stage in milliseconds
+        Return:
+            dict
+        """
+        return {stage: seconds * 1000.0 for stage, seconds in self.__timings.items()}
@@ -7,6 +7,14 @@ This class standardized the implementation of drone control
 
 from abc import ABC, abstractmethod
 import logging
+import time
+from lib.drone.telemetry import TelemetryPoller, TelemetryAlerts
+from lib.drone.state import DroneState
+from lib.drone.rc import RCScheduler
+from lib.drone.commands import CommandQueue
+from lib.drone.connection import ConnectionManager
+from lib.drone.metrics import Metrics, MetricsServer
+from lib.vision.processor import ProcessorScheduler
 
 
 class AbstractDroneBase(ABC):
@@ -18,6 +26,11 @@ class AbstractDroneBase(ABC):
     LOW_BATT_THRESHOLD = 10  # Lowest battery percent anything below it will not fly
     HIGH_TEMP_THRESHOLD = 80.0  # Highest temperature (HOT) anything above it will not fly, value in Celsius
     LOW_TEMP_THRESHOLD = 5.0  # Lowest temperature (COLD) anything below it will not fly, value in Celsius
+    TELEMETRY_RATE = 5  # Background telemetry refresh per second
+    FRAME_BUDGET = 1 / 30  # Seconds of vision processing allowed per video frame
+    RC_RATE = 20  # RC commands sent per second by the RC scheduler
+    RC_KEEPALIVE = 1.0  # Seconds after which an unchanged RC command is repeated
+    UNACKNOWLEDGED = ('kill', 'restart', 'rc_command')  # Commands the aircraft never answers
 
     # +--------------------------------------------------------------+
     # LOG MESSAGES
@@ -36,25 +49,40 @@ class AbstractDroneBase(ABC):
     __LOGGER = None  # Logger instance
 
     # +--------------------------------------------------------------+
-    # Private conditional flags
+    # Telemetry
     # +--------------------------------------------------------------+
-    __IS_CONNECTED = False
-    __IS_FLYING = False
-    __IS_LOWBAT = False
-    __IS_HOT = False
-    __IS_COLD = False
-    __IS_SAFE_TO_LAND = True
-    __NO_VIDEO_STREAM = False  # If set to True that means aircraft allows video stream
+    __TELEMETRY_POLLER = None  # Background refresh thread
+    __TELEMETRY_ALERTS = None  # Threshold checks, only while someone listens
 
     # +--------------------------------------------------------------+
-    # Telemetry
+    # RC control
+    # +--------------------------------------------------------------+
+    __RC_SCHEDULER = None  # Fixed rate RC sender
+    __RC_STICKS = None  # Last set_rc sticks, None once released
+    __COMMAND_QUEUE = None  # Runs non-blocking commands in order
+    __RECORDER = None  # Flight recorder, see attach_recorder
+    __CONNECTION = None  # Link watchdog, see start_connection_manager
+    __METRICS = None  # Hot path histograms, see enable_metrics
+    __METRICS_SERVER = None
+
+    # +--------------------------------------------------------------+
+    # Video processing
     # +--------------------------------------------------------------+
-    __TELEMETRY_BATTERY_PERC = 0
-    __TELEMETRY_AVERAGE_TEMP = 0
-    __TELEMETRY_HIGH_TEMP = 0
-    __TELEMETRY_LOW_TEMP = 0
-    __TELEMETRY_ALTITUDE = 0
-    __TELEMETRY_DRONE_FIRMWARE_VERSION = 0
+    __FRAME_SCHEDULER = None  # Runs registered frame processors
+    __FRAME_SERVER = None  # Local video fan-out, see start_frame_server
+
+    def __init__(self):
+        # Connection flags and telemetry, one record per drone instance
+        self.__STATE = DroneState()
+        self.__TELEMETRY_LISTENERS = []
+
+    @property
+    def state(self):
+        """Connection flags and telemetry record
+        Return:
+            DroneState
+        """
+        return self.__STATE
 
     def setup(self, name):
         """Pre-setup
@@ -62,12 +90,16 @@ class AbstractDroneBase(ABC):
             name: string
         """
         self.__NAME = name
+        if self.__METRICS is not None:
+            self.__METRICS.labels.setdefault('drone', name)
 
-        # Instantiate logger
-        handler = logging.StreamHandler()
-        handler.setFormatter(logging.Formatter('[%(levelname)s] %(filename)s - %(lineno)d - %(message)s'))
+        # Instantiate logger, drones of the same kind share it so the
+        # handler is only added once
         self.__LOGGER = logging.getLogger(name)
-        self.__LOGGER.addHandler(handler)
+        if not self.__LOGGER.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter('[%(levelname)s] %(filename)s - %(lineno)d - %(message)s'))
+            self.__LOGGER.addHandler(handler)
         self.__LOGGER.setLevel(logging.INFO)
 
     def log(self, message):
@@ -76,19 +108,15 @@ class AbstractDroneBase(ABC):
 
     def closing(self):
         """Reset all variables """
-        self.__IS_CONNECTED = False
-        self.__IS_FLYING = False
-        self.__IS_LOWBAT = False
-        self.__IS_HOT = False
-        self.__IS_COLD = False
-        self.__IS_SAFE_TO_LAND = True
-        self.__NO_VIDEO_STREAM = False
-        self.__TELEMETRY_BATTERY_PERC = 0
-        self.__TELEMETRY_AVERAGE_TEMP = 0
-        self.__TELEMETRY_HIGH_TEMP = 0
-        self.__TELEMETRY_LOW_TEMP = 0
-        self.__TELEMETRY_ALTITUDE = 0
-        self.__TELEMETRY_DRONE_FIRMWARE_VERSION = 0
+        self.stop_connection_manager()
+        self.stop_frame_server()
+        self.stop_metrics_server()
+        self.stop_telemetry()
+        self.stop_rc()
+        if self.__COMMAND_QUEUE is not None:
+            self.__COMMAND_QUEUE.stop()
+            self.__COMMAND_QUEUE = None
+        self.__STATE.reset()
 
     # +--------------------------------------------------------------+
     # Conditional Statements
@@ -100,6 +128,18 @@ class AbstractDroneBase(ABC):
         Return:
             boolean
         """
+        if self.__METRICS is None:
+            return self.__preflight()
+        start = time.perf_counter()
+        result = self.__preflight()
+        self.__METRICS.observe('drone_can_we_fly_seconds', time.perf_counter() - start)
+        return result
+
+    def __preflight(self):
+        """Checks behind can_we_fly
+        Return:
+            boolean
+        """
         if self.is_connected is not True:
             self.log(self.LOGM_NOT_CONNECTED)
             return False
@@ -127,29 +167,110 @@ class AbstractDroneBase(ABC):
         """
         # This method is optional but usefull when you want to have
         # safe landing features, thus preventing damage to the aircraft
-        return self.__IS_SAFE_TO_LAND
+        return self.__STATE.safe_to_land
 
     # +--------------------------------------------------------------+
     # Telemetry
     # +--------------------------------------------------------------+
-    def set_telemetry(self, telemetry, value):
-        """Set telemetry value
+    def set_telemetry(self, telemetry=None, value=None, **fields):
+        """Set one or many telemetry values in a single snapshot update,
+        unknown names are ignored
+            set_telemetry('battery', 87)
+            set_telemetry(battery=87, altitude=120)
         Parameters:
             telemetry: string
             value: any
+            fields: telemetry name and value pairs
         """
-        if telemetry == 'battery':
-            self.__TELEMETRY_BATTERY_PERC = value
-        if telemetry == 'altitude':
-            self.__TELEMETRY_ALTITUDE = value
-        if telemetry == 'average_temp':
-            self.__TELEMETRY_AVERAGE_TEMP = value
-        if telemetry == 'high_temp':
-            self.__TELEMETRY_HIGH_TEMP = value
-        if telemetry == 'low_temp':
-            self.__TELEMETRY_LOW_TEMP = value
-        if telemetry == 'drone_firmware_version':
-            self.__TELEMETRY_DRONE_FIRMWARE_VERSION = value
+        if telemetry is not None:
+            fields[telemetry] = value
+        self.__STATE.telemetry = self.__STATE.telemetry.merge(fields)
+
+    def publish_telemetry(self, **fields):
+        """Replace the telemetry snapshot in one step as a fresh reading,
+        fields not given keep their previous value
+        Parameters:
+            fields: telemetry name and value pairs, timestamp defaults to now,
+                backends pass the monotonic arrival time of the packet instead
+        """
+        fields.setdefault('timestamp', time.monotonic())
+        if self.__METRICS is not None and self.__STATE.telemetry.timestamp is not None:
+            self.__METRICS.observe('drone_telemetry_interval_seconds',
+                                   fields['timestamp'] - self.__STATE.telemetry.timestamp)
+        self.set_telemetry(**fields)
+        if self.__RECORDER is not None:
+            self.__RECORDER.record_telemetry(self.__STATE.telemetry)
+        if self.__TELEMETRY_ALERTS is not None:
+            snapshot = self.__STATE.telemetry
+            for alert, active in self.__TELEMETRY_ALERTS.check(snapshot):
+                for listener in self.__TELEMETRY_LISTENERS:
+                    listener(alert, active, snapshot)
+
+    def add_telemetry_listener(self, listener):
+        """Get told when a telemetry threshold is crossed, on the very update
+        crossing it: low_battery, over_heating and cold
+        Arguments:
+            listener: callable(alert, active, snapshot), runs on the thread publishing telemetry
+        """
+        if self.__TELEMETRY_ALERTS is None:
+            self.__TELEMETRY_ALERTS = TelemetryAlerts({
+                'low_battery': ('battery', '<', self.LOW_BATT_THRESHOLD),
+                'over_heating': ('high_temp', '>', self.HIGH_TEMP_THRESHOLD),
+                'cold': ('low_temp', '<', self.LOW_TEMP_THRESHOLD),
+            })
+        # Replaced rather than modified so publishing never iterates a changing list
+        self.__TELEMETRY_LISTENERS = self.__TELEMETRY_LISTENERS + [listener]
+
+    def remove_telemetry_listener(self, listener):
+        """Stop telling a listener about threshold alerts
+        Arguments:
+            listener: callable given to add_telemetry_listener
+        """
+        self.__TELEMETRY_LISTENERS = [other for other in self.__TELEMETRY_LISTENERS if other is not listener]
+        if not self.__TELEMETRY_LISTENERS:
+            self.__TELEMETRY_ALERTS = None
+
+    @property
+    def telemetry(self):
+        """Latest telemetry snapshot, never touches the drone link
+        Return:
+            TelemetrySnapshot
+        """
+        return self.__STATE.telemetry
+
+    @property
+    def telemetry_age(self):
+        """Seconds since the last telemetry refresh
+        Return:
+            float
+        """
+        return self.__STATE.telemetry.age
+
+    def start_telemetry(self, rate=None):
+        """Refresh telemetry in a background thread
+        Arguments:
+            rate: refresh per second, defaults to TELEMETRY_RATE
+        """
+        if self.__TELEMETRY_POLLER is not None:
+            return
+        self.__TELEMETRY_POLLER = TelemetryPoller(self.__refresh_telemetry, rate or self.TELEMETRY_RATE,
+                                                  on_error=lambda e: self.log('Telemetry refresh failed: ' + str(e)))
+        self.__TELEMETRY_POLLER.start()
+
+    def stop_telemetry(self):
+        """Stop the background telemetry refresh"""
+        if self.__TELEMETRY_POLLER is not None:
+            self.__TELEMETRY_POLLER.stop()
+            self.__TELEMETRY_POLLER = None
+
+    def __refresh_telemetry(self):
+        """Background refresh, timed while metrics are on"""
+        if self.__METRICS is None:
+            self.update_telemetry()
+            return
+        start = time.perf_counter()
+        self.update_telemetry()
+        self.__METRICS.observe('drone_telemetry_refresh_seconds', time.perf_counter() - start)
 
     @abstractmethod
     def update_telemetry(self):
@@ -159,15 +280,16 @@ class AbstractDroneBase(ABC):
     def info(self):
         """Prints drone information
         """
+        telemetry = self.__STATE.telemetry
         print('+--------------------------------------------------------------+')
-        info = "Aircraft : {aircraft}, Firmware : {firmware}".format(aircraft=self.__NAME, firmware=str(self.__TELEMETRY_DRONE_FIRMWARE_VERSION))
+        info = "Aircraft : {aircraft}, Firmware : {firmware}".format(aircraft=self.__NAME, firmware=str(telemetry.drone_firmware_version))
         print(info)
 
-        battery = str(self.__TELEMETRY_BATTERY_PERC)+'%'
-        average_temp = str(self.__TELEMETRY_AVERAGE_TEMP)+'°C'
-        high_temp = str(self.__TELEMETRY_HIGH_TEMP)+'°C'
-        low_temp = str(self.__TELEMETRY_LOW_TEMP)+'°C'
-        altitude = str(self.__TELEMETRY_ALTITUDE)+'cm'
+        battery = str(telemetry.battery)+'%'
+        average_temp = str(telemetry.average_temp)+'°C'
+        high_temp = str(telemetry.high_temp)+'°C'
+        low_temp = str(telemetry.low_temp)+'°C'
+        altitude = str(telemetry.altitude)+'cm'
         info = "Battery : {battery}, Altitude : {altitude}".format(battery=battery, altitude=altitude)
         print(info)
 
@@ -179,11 +301,11 @@ class AbstractDroneBase(ABC):
     # Flag setter and conditional methods
     # +--------------------------------------------------------------+
     def im_connected(self, x: bool):
-        """Set __IM_CONNECTED flag
+        """Set connected flag
         Parameters:
             x: bool
         """
-        self.__IS_CONNECTED = x
+        self.__STATE.connected = x
 
     @property
     def is_connected(self):
@@ -191,14 +313,14 @@ class AbstractDroneBase(ABC):
         Return:
             boolean
         """
-        return self.__IS_CONNECTED
+        return self.__STATE.connected
 
     def im_fying(self, x: bool):
-        """Set __IM_FLYING flag
+        """Set flying flag
         Parameters:
             x: bool
         """
-        self.__IS_FLYING = x
+        self.__STATE.flying = x
 
     @property
     def is_flying(self):
@@ -206,7 +328,7 @@ class AbstractDroneBase(ABC):
         Return:
             boolean
         """
-        return self.__IS_FLYING
+        return self.__STATE.flying
 
     @property
     def is_low_battery(self):
@@ -214,7 +336,7 @@ class AbstractDroneBase(ABC):
         Return:
             boolean
         """
-        if self.__TELEMETRY_BATTERY_PERC < self.LOW_BATT_THRESHOLD:
+        if self.__STATE.telemetry.battery < self.LOW_BATT_THRESHOLD:
             return True
         else:
             return False
@@ -225,7 +347,7 @@ class AbstractDroneBase(ABC):
         Return:
             boolean
         """
-        if self.__TELEMETRY_HIGH_TEMP > self.HIGH_TEMP_THRESHOLD:
+        if self.__STATE.telemetry.high_temp > self.HIGH_TEMP_THRESHOLD:
             return True
         else:
             return False
@@ -236,17 +358,17 @@ class AbstractDroneBase(ABC):
         Return:
             boolean
         """
-        if self.__TELEMETRY_LOW_TEMP < self.LOW_TEMP_THRESHOLD:
+        if self.__STATE.telemetry.low_temp < self.LOW_TEMP_THRESHOLD:
             return True
         else:
             return False
 
     def i_can_land(self, x: bool):
-        """Set __IS_SAFE_TO_LAND flag
+        """Set safe to land flag
         Parameters:
             x: bool
         """
-        self.__IS_SAFE_TO_LAND = x
+        self.__STATE.safe_to_land = x
 
     @property
     def can_land(self):
@@ -254,14 +376,14 @@ class AbstractDroneBase(ABC):
         Return:
             boolean
         """
-        return self.__IS_SAFE_TO_LAND
+        return self.__STATE.safe_to_land
 
     def im_video_streaming(self, x: bool):
-        """Set __NO_VIDEO_STREAM flag
+        """Set video streaming flag
         Parameters:
             x: bool
         """
-        self.__NO_VIDEO_STREAM = x
+        self.__STATE.video_streaming = x
 
     @property
     def is_video_streaming(self):
@@ -269,7 +391,156 @@ class AbstractDroneBase(ABC):
         Return:
             boolean
         """
-        return self.__NO_VIDEO_STREAM
+        return self.__STATE.video_streaming
+
+    # +--------------------------------------------------------------+
+    # Command link
+    # +--------------------------------------------------------------+
+    def command(self, name, *args):
+        """Send a command to the aircraft, backends route every command
+        through here so it can be recorded
+        Arguments:
+            name: command name, e.g. 'forward'
+            args: command arguments
+        Return:
+            backend response
+        """
+        if self.__RECORDER is not None:
+            self.__RECORDER.record_command(name, args)
+        if self.__METRICS is None:
+            response = self.send(name, *args)
+        else:
+            start = time.perf_counter()
+            response = self.send(name, *args)
+            self.__METRICS.observe('drone_command_seconds', time.perf_counter() - start, name)
+        if self.__CONNECTION is not None and name not in self.UNACKNOWLEDGED:
+            self.__CONNECTION.alive()
+        return response
+
+    @abstractmethod
+    def send(self, name, *args):
+        """Put a command on the backend link, implemented by every backend
+        Arguments:
+            name: command name
+            args: command arguments
+        """
+        pass
+
+    def attach_recorder(self, recorder):
+        """Record telemetry, commands and frames of this drone
+        Arguments:
+            recorder: FlightRecorder, None detaches
+        """
+        self.__RECORDER = recorder
+
+    @property
+    def recorder(self):
+        """Attached flight recorder
+        Return:
+            FlightRecorder or None
+        """
+        return self.__RECORDER
+
+    # +--------------------------------------------------------------+
+    # Metrics
+    # +--------------------------------------------------------------+
+    def enable_metrics(self, metrics=None):
+        """Time the hot paths into streaming histograms, off by default
+        Arguments:
+            metrics: Metrics to fill, e.g. shared by a fleet, defaults to a new one labelled with the drone name
+        Return:
+            Metrics
+        """
+        if metrics is None:
+            metrics = self.__METRICS or Metrics({'drone': self.__NAME} if self.__NAME else None)
+        self.__METRICS = metrics
+        return metrics
+
+    def disable_metrics(self):
+        """Stop timing, the hot paths are back to a single None check"""
+        self.__METRICS = None
+
+    @property
+    def metrics(self):
+        """Attached metrics
+        Return:
+            Metrics or None
+        """
+        return self.__METRICS
+
+    def serve_metrics(self, port=None, host=None):
+        """Enable metrics and export them over HTTP, Prometheus text on /metrics and JSON on /metrics.json
+        Arguments:
+            port: port to listen on, 0 picks a free one
+            host: address to listen on, local only by default
+        Return:
+            MetricsServer
+        """
+        if self.__METRICS_SERVER is None:
+            self.__METRICS_SERVER = MetricsServer(self.enable_metrics(), host=host, port=port).start()
+        return self.__METRICS_SERVER
+
+    def stop_metrics_server(self):
+        """Stop the HTTP export, the histograms are kept"""
+        if self.__METRICS_SERVER is not None:
+            self.__METRICS_SERVER.stop()
+            self.__METRICS_SERVER = None
+
+    # +--------------------------------------------------------------+
+    # Connection management
+    # +--------------------------------------------------------------+
+    def start_connection_manager(self, keepalive=None, stale_after=None):
+        """Keep the link alive and reconnect with backoff when it drops
+        Arguments:
+            keepalive: seconds of silence before the link is probed
+            stale_after: seconds of silence before the link is re-established
+        """
+        if self.__CONNECTION is not None:
+            return
+        self.__CONNECTION = ConnectionManager(self, keepalive, stale_after)
+        self.__CONNECTION.start()
+
+    def stop_connection_manager(self):
+        """Stop watching the link"""
+        if self.__CONNECTION is not None:
+            self.__CONNECTION.stop()
+            self.__CONNECTION = None
+
+    @property
+    def connection(self):
+        """Running connection manager
+        Return:
+            ConnectionManager or None
+        """
+        return self.__CONNECTION
+
+    def link_alive(self):
+        """Tell the connection manager the aircraft was heard, backends call
+        it for every packet received outside of command responses"""
+        if self.__CONNECTION is not None:
+            self.__CONNECTION.alive()
+
+    def ping(self):
+        """Cheap round trip proving the link is up, raises when it is not,
+        backends override it with a short timeout query"""
+        self.send('connect')
+
+    def reconnect(self):
+        """Re-establish the link without touching flags, telemetry or queued
+        commands, raises when the aircraft does not answer"""
+        self.command('connect')
+        if self.is_video_streaming:
+            self.command('streamon')
+
+    def pause_commands(self):
+        """Hold queued non-blocking commands, the one running finishes"""
+        if self.__COMMAND_QUEUE is not None:
+            self.__COMMAND_QUEUE.pause()
+
+    def resume_commands(self):
+        """Run held non-blocking commands again"""
+        if self.__COMMAND_QUEUE is not None:
+            self.__COMMAND_QUEUE.resume()
 
     # +--------------------------------------------------------------+
     # Abstract general methods
@@ -411,6 +682,135 @@ class AbstractDroneBase(ABC):
         """
         pass
 
+    def start_rc(self, rate=None):
+        """Send RC commands from a fixed rate scheduler thread, see set_rc
+        Arguments:
+            rate: commands per second, defaults to RC_RATE
+        """
+        if self.__RC_SCHEDULER is not None:
+            return
+        self.__RC_SCHEDULER = RCScheduler(self.rc_command, rate or self.RC_RATE, self.RC_KEEPALIVE,
+                                          on_error=lambda e: self.log('RC command failed: ' + str(e)))
+        self.__RC_SCHEDULER.start()
+
+    def stop_rc(self):
+        """Stop the RC scheduler"""
+        if self.__RC_SCHEDULER is not None:
+            self.__RC_SCHEDULER.stop()
+            self.__RC_SCHEDULER = None
+
+    @property
+    def rc_scheduler(self):
+        """Running RC scheduler
+        Return:
+            RCScheduler or None
+        """
+        return self.__RC_SCHEDULER
+
+    @property
+    def rc_sticks(self):
+        """Sticks of the last set_rc, kept through a link outage
+        Return:
+            (roll, pitch, throttle, yaw) or None once released
+        """
+        return self.__RC_STICKS
+
+    def set_rc(self, roll: int, pitch: int, throttle: int, yaw: int):
+        """Update the RC sticks, sent by the scheduler on its next tick or
+        right away when no scheduler is running
+        Arguments:
+            roll: -100~100 (left/right)
+            pitch: -100~100 (forward/backward)
+            throttle: -100~100 (up/down)
+            yaw: -100~100 (yaw)
+        """
+        self.__RC_STICKS = (roll, pitch, throttle, yaw)
+        if self.__RC_SCHEDULER is not None:
+            self.__RC_SCHEDULER.set(roll, pitch, throttle, yaw)
+        else:
+            self.rc_command(roll, pitch, throttle, yaw)
+
+    def release_rc(self):
+        """Stop sending RC commands until the next set_rc"""
+        self.__RC_STICKS = None
+        if self.__RC_SCHEDULER is not None:
+            self.__RC_SCHEDULER.release()
+
+    # +--------------------------------------------------------------+
+    # Non-blocking navigation control
+    # +--------------------------------------------------------------+
+    def submit_command(self, method, *args, timeout=None, delay=None, callback=None):
+        """Queue a drone method on the drone command thread and return at once,
+        commands run one at a time in submission order
+        Arguments:
+            method: name of the drone method, e.g. 'forward'
+            timeout: seconds the command must start within, dropped otherwise
+            delay: seconds to wait before running it, without blocking the caller
+            callback: callable receiving the handle once done
+        Return:
+            CommandHandle, a Future that can also be awaited or cancelled
+        """
+        if self.__COMMAND_QUEUE is None:
+            self.__COMMAND_QUEUE = CommandQueue()
+            self.__COMMAND_QUEUE.start()
+        return self.__COMMAND_QUEUE.submit(method, getattr(self, method), *args,
+                                           timeout=timeout, delay=delay, callback=callback)
+
+    @property
+    def pending_commands(self):
+        """Number of queued non-blocking commands
+        Return:
+            int
+        """
+        return 0 if self.__COMMAND_QUEUE is None else self.__COMMAND_QUEUE.pending
+
+    def cancel_commands(self):
+        """Cancel every queued command that has not started
+        Return:
+            int number of cancelled commands
+        """
+        return 0 if self.__COMMAND_QUEUE is None else self.__COMMAND_QUEUE.cancel_pending()
+
+    def takeoff_async(self, altitude=None, timeout=None, callback=None):
+        """Non-blocking takeoff, see submit_command"""
+        return self.submit_command('takeoff', altitude, timeout=timeout, callback=callback)
+
+    def land_async(self, delay=None, timeout=None, callback=None):
+        """Non-blocking land, the delay is waited on the command thread"""
+        return self.submit_command('land', timeout=timeout, delay=delay, callback=callback)
+
+    def ascend_async(self, v: int, timeout=None, callback=None):
+        """Non-blocking ascend, see submit_command"""
+        return self.submit_command('ascend', v, timeout=timeout, callback=callback)
+
+    def descend_async(self, v: int, timeout=None, callback=None):
+        """Non-blocking descend, see submit_command"""
+        return self.submit_command('descend', v, timeout=timeout, callback=callback)
+
+    def forward_async(self, v: int, timeout=None, callback=None):
+        """Non-blocking forward, see submit_command"""
+        return self.submit_command('forward', v, timeout=timeout, callback=callback)
+
+    def backward_async(self, v: int, timeout=None, callback=None):
+        """Non-blocking backward, see submit_command"""
+        return self.submit_command('backward', v, timeout=timeout, callback=callback)
+
+    def left_async(self, v: int, timeout=None, callback=None):
+        """Non-blocking left, see submit_command"""
+        return self.submit_command('left', v, timeout=timeout, callback=callback)
+
+    def right_async(self, v: int, timeout=None, callback=None):
+        """Non-blocking right, see submit_command"""
+        return self.submit_command('right', v, timeout=timeout, callback=callback)
+
+    def rotate_left_async(self, v: int, timeout=None, callback=None):
+        """Non-blocking rotate_left, see submit_command"""
+        return self.submit_command('rotate_left', v, timeout=timeout, callback=callback)
+
+    def rotate_right_async(self, v: int, timeout=None, callback=None):
+        """Non-blocking rotate_right, see submit_command"""
+        return self.submit_command('rotate_right', v, timeout=timeout, callback=callback)
+
     # +--------------------------------------------------------------+
     # Abstract video streaming methods
     # +--------------------------------------------------------------+
@@ -429,20 +829,101 @@ class AbstractDroneBase(ABC):
         """Get video stream frames"""
         pass
 
+    def start_frame_server(self, path=None, slots=None):
+        """Share the video with other local processes, call it once streaming
+        Arguments:
+            path: Unix socket path subscribers connect to
+            slots: frames kept in the shared memory ring
+        Return:
+            FrameServer
+        """
+        if self.__FRAME_SERVER is None:
+            from lib.drone.frame_server import FrameServer
+            self.__FRAME_SERVER = FrameServer(self.get_video_frames(), path, slots).start()
+        return self.__FRAME_SERVER
+
+    def stop_frame_server(self):
+        """Disconnect the subscribers and free the ring"""
+        if self.__FRAME_SERVER is not None:
+            self.__FRAME_SERVER.stop()
+            self.__FRAME_SERVER = None
+
+    @property
+    def frame_server(self):
+        """Running frame server
+        Return:
+            FrameServer or None
+        """
+        return self.__FRAME_SERVER
+
+    @property
+    def frame_scheduler(self):
+        """Scheduler running the registered frame processors
+        Return:
+            ProcessorScheduler
+        """
+        if self.__FRAME_SCHEDULER is None:
+            self.__FRAME_SCHEDULER = ProcessorScheduler(self.FRAME_BUDGET, log=self.log)
+        return self.__FRAME_SCHEDULER
+
+    def add_frame_processor(self, processor):
+        """Register a computer vision stage on the video path
+        Arguments:
+            processor: FrameProcessor
+        """
+        self.frame_scheduler.add(processor)
+
+    def remove_frame_processor(self, processor):
+        """Unregister a computer vision stage
+        Arguments:
+            processor: FrameProcessor
+        """
+        self.frame_scheduler.remove(processor)
+
+    def attach_batch(self, batch, name=None):
+        """Run a model shared with other drones on this drone frames, in batches
+        Arguments:
+            batch: BatchInference
+            name: result key in the FrameContext
+        Return:
+            BatchProcessor, pass it to remove_frame_processor to detach
+        """
+        processor = batch.processor(name)
+        self.add_frame_processor(processor)
+        return processor
+
+    def process_frame(self, frame, seq=None, timestamp=None):
+        """Run the frame processors due on a video frame
+        Arguments:
+            frame: numpy array in BGR
+            seq: frame sequence number
+            timestamp: monotonic capture time
+        Return:
+            FrameContext
+        """
+        if self.__RECORDER is not None:
+            self.__RECORDER.record_frame(frame)
+        if self.__METRICS is None:
+            return self.frame_scheduler.run(frame, seq, timestamp)
+        start = time.perf_counter()
+        context = self.frame_scheduler.run(frame, seq, timestamp)
+        self.__METRICS.observe('drone_frame_stage_seconds', time.perf_counter() - start, 'process')
+        return context
+
     # +--------------------------------------------------------------+
     # Drone Stats
     # +--------------------------------------------------------------+
     @abstractmethod
     def get_battery(self):
-        """Get battery statistics"""
+        """Get battery statistics from the telemetry snapshot"""
         pass
 
     @abstractmethod
     def get_temperature(self):
-        """Get average temperature"""
+        """Get average temperature from the telemetry snapshot"""
         pass
 
     @abstractmethod
     def get_altitude(self):
-        """Get current drone altitude"""
+        """Get current drone altitude from the telemetry snapshot"""
         pass
@@ -1 +1,42 @@
-__all__ = ['ryze_tello']
+"""Drone package
+
+Submodules are imported on first access only, so importing the package or
+one backend never pays for the others. Backends are looked up by name
+through get_backend, which loads nothing but the module of that backend.
+"""
+
+# coding=utf-8
+
+import importlib
+
+__all__ = ['ryze_tello', 'simulated', 'replay', 'fleet', 'rc', 'commands', 'recorder', 'video', 'connection',
+           'frame_server', 'metrics']
+
+# Backend name and the module holding its Drone class
+BACKENDS = {
+    'tello': 'ryze_tello',
+    'simulated': 'simulated',
+    'replay': 'replay',
+}
+
+
+def get_backend(name):
+    """Drone class of a backend, importing its module on first use
+    Arguments:
+        name: key of BACKENDS
+    Return:
+        AbstractDroneBase subclass
+    """
+    try:
+        module = BACKENDS[name]
+    except KeyError:
+        raise ValueError('Unknown drone backend {name}, use one of {names}'.format(
+            name=name, names=', '.join(sorted(BACKENDS))))
+    return importlib.import_module(__name__ + '.' + module).Drone
+
+
+def __getattr__(name):
+    # PEP 562, lib.drone.simulated and friends resolve without an explicit import
+    if name in __all__:
+        return importlib.import_module(__name__ + '.' + name)
+    raise AttributeError('module {module} has no attribute {name}'.format(module=__name__, name=name))
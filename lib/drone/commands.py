@@ -0,0 +1,165 @@
+"""Drone command queue library
+
+Runs blocking drone commands one after another on a per-drone thread and
+hands back a handle right away. A handle is a concurrent.futures.Future that
+can also be awaited from asyncio, cancelled while it is still queued, and
+given a deadline after which it is dropped instead of flown late.
+"""
+
+# coding=utf-8
+
+from concurrent.futures import Future
+import queue
+import threading
+import time
+
+
+class CommandTimeout(Exception):
+    """Raised by a handle whose command could not start before its deadline"""
+    pass
+
+
+class CommandHandle(Future):
+    """Pending drone command"""
+
+    def __init__(self, name, function, args, timeout=None, delay=None):
+        """
+        Arguments:
+            name: string, used in logs and errors
+            function: callable running the command
+            args: tuple of arguments
+            timeout: seconds from submission the command must start within
+            delay: seconds to wait before starting the command
+        """
+        super().__init__()
+        self.name = name
+        self.function = function
+        self.args = args
+        self.submitted = time.monotonic()
+        self.deadline = None if timeout is None else self.submitted + timeout
+        self.delay = delay
+
+    def __await__(self):
+        import asyncio  # Heavy, only needed by asyncio callers
+
+        return asyncio.wrap_future(self).__await__()
+
+    def __repr__(self):
+        return '<CommandHandle {name}{args} {state}>'.format(name=self.name, args=self.args, state=self._state)
+
+
+class CommandQueue(threading.Thread):
+    # +--------------------------------------------------------------+
+    # DEFAULT OBJECT VARIABLES
+    # +--------------------------------------------------------------+
+    POLL = 0.05  # Seconds between cancellation checks while delaying a command
+
+    def __init__(self, name='commands'):
+        """
+        Arguments:
+            name: thread name
+        """
+        super().__init__(name=name, daemon=True)
+        self.__queue = queue.Queue()
+        self.__stop = threading.Event()
+        self.__resumed = threading.Event()
+        self.__resumed.set()
+
+    def submit(self, name, function, *args, timeout=None, delay=None, callback=None):
+        """Queue a command behind the ones already submitted
+        Arguments:
+            name: string
+            function: callable running the command
+            timeout: seconds from now the command must start within
+            delay: seconds to wait before starting it, does not block the caller
+            callback: callable receiving the handle once it is done
+        Return:
+            CommandHandle
+        """
+        handle = CommandHandle(name, function, args, timeout, delay)
+        if callback is not None:
+            handle.add_done_callback(callback)
+        if self.__stop.is_set():
+            handle.cancel()
+        else:
+            self.__queue.put(handle)
+        return handle
+
+    @property
+    def pending(self):
+        """Number of queued commands
+        Return:
+            int
+        """
+        return self.__queue.qsize()
+
+    def pause(self):
+        """Hold queued commands until resume, the running one finishes"""
+        self.__resumed.clear()
+
+    def resume(self):
+        """Run held commands again"""
+        self.__resumed.set()
+
+    @property
+    def paused(self):
+        return not self.__resumed.is_set()
+
+    def run(self):
+        while not self.__stop.is_set():
+            if not self.__resumed.wait(self.POLL):
+                continue
+            try:
+                handle = self.__queue.get(timeout=self.POLL)
+            except queue.Empty:
+                continue
+            self.__execute(handle)
+
+    def __execute(self, handle):
+        """Run one command unless it was cancelled or expired
+        Arguments:
+            handle: CommandHandle
+        """
+        if handle.delay:
+            start = time.monotonic() + handle.delay
+            while not handle.cancelled() and not self.__stop.is_set():
+                remaining = start - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.__stop.wait(min(remaining, self.POLL))
+            if self.__stop.is_set():
+                handle.cancel()
+
+        if not handle.set_running_or_notify_cancel():
+            return
+        if handle.deadline is not None and time.monotonic() > handle.deadline:
+            handle.set_exception(CommandTimeout('{name} did not start in time'.format(name=handle.name)))
+            return
+        try:
+            handle.set_result(handle.function(*handle.args))
+        except Exception as e:
+            handle.set_exception(e)
+
+    def cancel_pending(self):
+        """Cancel every command not started yet
+        Return:
+            int number of cancelled commands
+        """
+        cancelled = 0
+        while True:
+            try:
+                handle = self.__queue.get_nowait()
+            except queue.Empty:
+                return cancelled
+            if handle.cancel():
+                cancelled += 1
+
+    def stop(self, timeout=None):
+        """Cancel pending commands and stop the thread
+        Arguments:
+            timeout: seconds to wait for a running command
+        """
+        self.__stop.set()
+        self.cancel_pending()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
@@ -0,0 +1,159 @@
+"""Drone connection manager library
+
+Watches the command link of a drone and brings it back after a drop. Every
+response from the aircraft counts as a sign of life, when the link has been
+quiet for a while it is probed with a cheap keep-alive, and a link silent
+for longer than the stale limit is declared down. While down, queued
+commands are held, RC goes quiet and the telemetry snapshot keeps being
+served, the link is re-established with exponential backoff and everything
+resumes where it stopped, sticks included, instead of the flight being
+restarted.
+"""
+
+# coding=utf-8
+
+import random
+import threading
+import time
+
+
+class ConnectionManager(threading.Thread):
+    # +--------------------------------------------------------------+
+    # DEFAULT OBJECT VARIABLES
+    # +--------------------------------------------------------------+
+    KEEPALIVE = 1.0  # Seconds of silence after which the link is probed
+    STALE_AFTER = 2.5  # Seconds of silence after which the link is down
+    CHECK_INTERVAL = 0.1  # Seconds between two link checks
+    BACKOFF_BASE = 0.5  # Seconds before the first reconnect attempt
+    BACKOFF_MAX = 8.0  # Longest wait between reconnect attempts
+    BACKOFF_JITTER = 0.2  # Random fraction added to every wait so fleets do not retry in lockstep
+
+    UP = 'up'
+    DOWN = 'down'
+
+    def __init__(self, drone, keepalive=None, stale_after=None):
+        """
+        Arguments:
+            drone: AbstractDroneBase whose link is managed
+            keepalive: seconds of silence before probing, defaults to KEEPALIVE
+            stale_after: seconds of silence before reconnecting, defaults to STALE_AFTER
+        """
+        super().__init__(name='connection-manager', daemon=True)
+        self.drone = drone
+        self.keepalive = keepalive or self.KEEPALIVE
+        self.stale_after = stale_after or self.STALE_AFTER
+        self.state = self.UP
+        self.pings = 0
+        self.ping_failures = 0
+        self.outages = 0
+        self.reconnects = 0
+        self.attempts = 0
+        self.downtime = 0.0  # Seconds spent down, finished outages only
+        self.last_outage = 0.0
+        self.__last_alive = time.monotonic()
+        self.__down_since = None
+        self.__rtt = 0.0
+        self.__stop = threading.Event()
+
+    def alive(self):
+        """Record a sign of life from the aircraft, cheap enough for every packet"""
+        self.__last_alive = time.monotonic()
+
+    @property
+    def silence(self):
+        """Seconds since the aircraft was last heard
+        Return:
+            float
+        """
+        return time.monotonic() - self.__last_alive
+
+    def run(self):
+        while not self.__stop.wait(self.CHECK_INTERVAL):
+            if self.state == self.UP:
+                self.__check()
+            else:
+                self.__reconnect()
+
+    def __check(self):
+        """Probe a quiet link, declare a silent one down"""
+        silence = self.silence
+        if silence < self.keepalive:
+            return
+        self.pings += 1
+        start = time.monotonic()
+        try:
+            self.drone.ping()
+        except Exception:
+            self.ping_failures += 1
+            if self.silence >= self.stale_after:
+                self.__down()
+            return
+        self.__rtt = time.monotonic() - start
+        self.alive()
+
+    def __down(self):
+        """Hold the drone while the link is gone"""
+        self.state = self.DOWN
+        self.outages += 1
+        self.__down_since = time.monotonic()
+        self.drone.log('Link to the aircraft lost, reconnecting')
+        self.drone.im_connected(False)
+        # Quiet the scheduler but keep the sticks, they are re-armed once the link is back
+        if self.drone.rc_scheduler is not None:
+            self.drone.rc_scheduler.release()
+        self.drone.pause_commands()
+
+    def __reconnect(self):
+        """Reconnect attempts with exponential backoff until one succeeds"""
+        attempt = 0
+        while not self.__stop.is_set():
+            delay = min(self.BACKOFF_MAX, self.BACKOFF_BASE * 2 ** attempt)
+            if self.__stop.wait(delay * (1.0 + random.random() * self.BACKOFF_JITTER)):
+                return
+            attempt += 1
+            self.attempts += 1
+            try:
+                self.drone.reconnect()
+            except Exception as e:
+                self.drone.log('Reconnect attempt {n} failed: {error}'.format(n=attempt, error=str(e)))
+                continue
+            self.__up()
+            return
+
+    def __up(self):
+        """Resume after a reconnect, telemetry and queued commands carry on"""
+        self.alive()
+        self.last_outage = time.monotonic() - self.__down_since
+        self.downtime += self.last_outage
+        self.__down_since = None
+        self.reconnects += 1
+        self.state = self.UP
+        self.drone.im_connected(True)
+        # Newest sticks, set before or during the outage, unless RC was released meanwhile
+        sticks = self.drone.rc_sticks
+        if sticks is not None:
+            self.drone.set_rc(*sticks)
+        self.drone.resume_commands()
+        self.drone.log('Link to the aircraft back after {s:.1f}s'.format(s=self.last_outage))
+
+    def stop(self, timeout=None):
+        """Stop watching the link
+        Arguments:
+            timeout: seconds to wait for the thread
+        """
+        self.__stop.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
+    @property
+    def stats(self):
+        """Link health, times in seconds
+        Return:
+            dict
+        """
+        current = 0.0 if self.__down_since is None else time.monotonic() - self.__down_since
+        return {'state': self.state, 'silence': self.silence, 'pings': self.pings,
+                'ping_failures': self.ping_failures, 'ping_rtt': self.__rtt * 1000.0,
+                'outages': self.outages, 'reconnects': self.reconnects, 'attempts': self.attempts,
+                'downtime': self.downtime + current, 'last_outage': self.last_outage,
+                'current_outage': current}
@@ -0,0 +1,183 @@
+"""Drone fleet library
+
+Drive many drones from one process with asyncio. Every drone gets its own
+worker thread and its own command socket, so its blocking SDK calls stay in
+order while commands to different drones run in parallel under a bounded
+concurrency. Synchronized commands hold every drone at a barrier to start
+together, a drone not ready in time never keeps the others on the ground,
+the barrier is dropped and each drone runs the command as soon as it can.
+"""
+
+# coding=utf-8
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+
+class Fleet(object):
+    # +--------------------------------------------------------------+
+    # DEFAULT OBJECT VARIABLES
+    # +--------------------------------------------------------------+
+    MAX_CONCURRENCY = 32  # Drones commanded at the same time
+    SYNC_TIMEOUT = 5.0  # Seconds a synchronized command waits for every drone to be ready, then goes unsynchronized
+
+    def __init__(self, drones=None, max_concurrency=None):
+        """
+        Arguments:
+            drones: dict of name and AbstractDroneBase
+            max_concurrency: drones commanded at the same time, defaults to MAX_CONCURRENCY
+        """
+        self.max_concurrency = max_concurrency or self.MAX_CONCURRENCY
+        self.last_fanout = {}  # Timing of the last broadcast, see broadcast()
+        self.__drones = {}
+        self.__workers = {}
+        self.__semaphore = None
+        for name, drone in (drones or {}).items():
+            self.add(name, drone)
+
+    def add(self, name, drone):
+        """Add a drone to the fleet
+        Arguments:
+            name: string
+            drone: AbstractDroneBase
+        """
+        if name in self.__drones:
+            raise ValueError('Drone {name} is already in the fleet'.format(name=name))
+        self.__drones[name] = drone
+        # One thread per drone keeps its commands in order
+        self.__workers[name] = ThreadPoolExecutor(max_workers=1, thread_name_prefix='fleet-' + str(name))
+
+    def remove(self, name):
+        """Remove a drone, its pending commands still complete
+        Arguments:
+            name: string
+        Return:
+            AbstractDroneBase
+        """
+        self.__workers.pop(name).shutdown(wait=False)
+        return self.__drones.pop(name)
+
+    @property
+    def names(self):
+        return list(self.__drones)
+
+    def __getitem__(self, name):
+        return self.__drones[name]
+
+    def __len__(self):
+        return len(self.__drones)
+
+    def __iter__(self):
+        return iter(self.__drones.items())
+
+    def close(self):
+        """Stop every worker thread"""
+        for worker in self.__workers.values():
+            worker.shutdown(wait=False)
+
+    # +--------------------------------------------------------------+
+    # Command dispatch
+    # +--------------------------------------------------------------+
+    def __limit(self):
+        if self.__semaphore is None:
+            self.__semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self.__semaphore
+
+    async def call(self, name, method, *args, **kwargs):
+        """Run a drone method on the drone worker thread
+        Arguments:
+            name: drone name
+            method: AbstractDroneBase method name
+        Return:
+            method result
+        """
+        function = getattr(self.__drones[name], method)
+        loop = asyncio.get_running_loop()
+        async with self.__limit():
+            return await loop.run_in_executor(self.__workers[name], lambda: function(*args, **kwargs))
+
+    async def broadcast(self, method, *args, names=None, synchronized=False, **kwargs):
+        """Run a drone method on many drones in parallel
+        Arguments:
+            method: AbstractDroneBase method name
+            names: drones to target, all by default
+            synchronized: hold every drone until all workers are ready, then
+                release them together to keep the fan-out spread minimal, after
+                SYNC_TIMEOUT every drone is sent the command on its own
+        Return:
+            dict of name and result, or the exception the drone raised
+        """
+        names = list(self.__drones) if names is None else list(names)
+        if not names:
+            return {}
+        if synchronized and len(names) > self.max_concurrency:
+            raise ValueError('Cannot synchronize more drones than max_concurrency')
+
+        barrier = threading.Barrier(len(names)) if synchronized else None
+        started = {}
+        unsynchronized = []
+        loop = asyncio.get_running_loop()
+
+        async def dispatch(name):
+            function = getattr(self.__drones[name], method)
+
+            def job():
+                if barrier is not None:
+                    try:
+                        barrier.wait(self.SYNC_TIMEOUT)
+                    except threading.BrokenBarrierError:
+                        # A busy drone must not cancel the command for the others
+                        unsynchronized.append(name)
+                started[name] = time.perf_counter()
+                return function(*args, **kwargs)
+
+            async with self.__limit():
+                return await loop.run_in_executor(self.__workers[name], job)
+
+        begin = time.perf_counter()
+        results = await asyncio.gather(*(dispatch(name) for name in names), return_exceptions=True)
+        finished = time.perf_counter()
+
+        # Spread is the time between the first and the last drone receiving the call
+        self.last_fanout = {'drones': len(names), 'duration': (finished - begin) * 1000.0,
+                            'unsynchronized': len(unsynchronized),
+                            'spread': (max(started.values()) - min(started.values())) * 1000.0 if started else 0.0}
+        return dict(zip(names, results))
+
+    # +--------------------------------------------------------------+
+    # Fleet wide commands
+    # +--------------------------------------------------------------+
+    async def hello(self, names=None):
+        """Connect to every drone"""
+        return await self.broadcast('hello', names=names)
+
+    async def bye(self, names=None):
+        """Disconnect every drone"""
+        return await self.broadcast('bye', names=names)
+
+    async def takeoff(self, altitude=None, names=None):
+        """Take off together"""
+        return await self.broadcast('takeoff', altitude, names=names, synchronized=True)
+
+    async def land(self, names=None):
+        """Land every drone as soon as its worker is free, a busy drone never holds the others up"""
+        return await self.broadcast('land', names=names)
+
+    async def rc_command(self, roll: int, pitch: int, throttle: int, yaw: int, names=None):
+        """Send the same RC command to every drone"""
+        return await self.broadcast('rc_command', roll, pitch, throttle, yaw, names=names, synchronized=True)
+
+    async def telemetry(self, refresh=True, names=None):
+        """Telemetry of every drone
+        Arguments:
+            refresh: read the drones in parallel first, otherwise return the cached snapshots
+            names: drones to read, all by default
+        Return:
+            dict of name and TelemetrySnapshot
+        """
+        names = list(self.__drones) if names is None else list(names)
+        if refresh:
+            await self.broadcast('update_telemetry', names=names)
+        return {name: self.__drones[name].telemetry for name in names}
@@ -0,0 +1,591 @@
+"""Local frame server library
+
+Fans the decoded video of one drone out to any number of local processes,
+a recorder, a detector and a UI reading the same stream. Frames are written
+once into a ring of shared memory slots, subscribers only receive a small
+notice per frame over a Unix socket and copy the frame straight out of the
+ring. Every subscriber has its own queue and drop policy and acknowledges
+what it consumed, so a slow one loses frames on its own without holding
+back the publisher or the others, and how far behind it is shows up in the
+server stats. A LATEST subscriber acknowledges a frame only when it asks
+for the next one, its notice is then picked at that very moment and is the
+newest frame however slow the subscriber is.
+"""
+
+# coding=utf-8
+
+from collections import deque, namedtuple
+import json
+import os
+import socket
+import struct
+import tempfile
+import threading
+import time
+
+NOTICE = struct.Struct('=qId')  # seq, slot, monotonic publication time
+ACK = struct.Struct('=q')  # seq consumed by the subscriber
+LENGTH = struct.Struct('=I')  # Size of a handshake message
+ALIGN = 64  # Slot alignment in the ring
+
+# Drop policies
+LATEST = 'latest'  # Only the newest frame waits, handed out when asked for, for detectors and displays
+FIFO = 'fifo'  # Frames wait in order, the oldest is dropped when the backlog is full, for recorders
+POLICIES = (LATEST, FIFO)
+
+SharedFrame = namedtuple('SharedFrame', ['seq', 'frame', 'timestamp'])
+
+_SERVED = set()  # Rings created by servers of this process
+
+
+def _send_message(sock, message):
+    """Send a JSON handshake message
+    Arguments:
+        sock: connected socket
+        message: dict
+    """
+    data = json.dumps(message).encode()
+    sock.sendall(LENGTH.pack(len(data)) + data)
+
+
+def _recv_message(sock):
+    """Receive a JSON handshake message
+    Arguments:
+        sock: connected socket
+    Return:
+        dict, None once the peer closed
+    """
+    header = _recv_exactly(sock, LENGTH.size)
+    if header is None:
+        return None
+    data = _recv_exactly(sock, LENGTH.unpack(header)[0])
+    return None if data is None else json.loads(data.decode())
+
+
+def _recv_exactly(sock, size):
+    """Receive a fixed number of bytes
+    Arguments:
+        sock: connected socket
+        size: bytes to read
+    Return:
+        bytes, None once the peer closed
+    """
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def _attach(name):
+    """Open an existing shared memory block without taking ownership of it
+    Arguments:
+        name: shared memory name
+    Return:
+        SharedMemory
+    """
+    from multiprocessing import shared_memory
+
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        import multiprocessing
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name=name)
+        # Only the server unlinks the ring, older Pythons would unlink it when this process exits.
+        # The server process and its children share one resource tracker, it keeps a single entry
+        if name not in _SERVED and multiprocessing.parent_process() is None:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+def _ring_views(shm, layout):
+    """numpy views of the ring slots
+    Arguments:
+        shm: SharedMemory holding the ring
+        layout: ring layout sent in the handshake
+    Return:
+        (int64 array of the seq stamped in every slot, list of frame arrays)
+    """
+    import numpy as np
+
+    stamps = np.ndarray((layout['slots'],), dtype=np.int64, buffer=shm.buf)
+    frames = [np.ndarray(tuple(layout['shape']), dtype=layout['dtype'], buffer=shm.buf,
+                         offset=layout['base'] + slot * layout['stride'])
+              for slot in range(layout['slots'])]
+    return stamps, frames
+
+
+class _Subscription(object):
+    """Server side of a subscriber, its queue, drop policy and lag"""
+    LATENCY_WINDOW = 256
+
+    def __init__(self, conn, name, policy, depth, backlog):
+        """
+        Arguments:
+            conn: connected socket
+            name: subscriber name
+            policy: LATEST or FIFO
+            depth: frames handed out before an acknowledgement is needed
+            backlog: frames waiting at most with the FIFO policy
+        """
+        self.conn = conn
+        self.name = name
+        self.policy = policy
+        self.depth = depth
+        self.backlog = backlog
+        self.closed = False
+        self.sent = 0
+        self.acked = 0
+        self.dropped = 0
+        self.latest = 0  # Newest seq offered
+        self.acked_seq = 0  # Newest seq consumed
+        self.__pending = deque()
+        self.__in_flight = {}  # seq: publication time of the frames handed out
+        self.__latency = deque(maxlen=self.LATENCY_WINDOW)
+        self.__cond = threading.Condition()
+        self.__threads = [threading.Thread(target=self.__send, name='frames-send-' + name, daemon=True),
+                          threading.Thread(target=self.__receive, name='frames-ack-' + name, daemon=True)]
+
+    def start(self):
+        for thread in self.__threads:
+            thread.start()
+
+    def offer(self, seq, slot, timestamp, oldest):
+        """Queue a published frame according to the drop policy
+        Arguments:
+            seq: frame number
+            slot: ring slot holding it
+            timestamp: monotonic publication time
+            oldest: oldest seq still in the ring
+        """
+        with self.__cond:
+            if self.closed:
+                return
+            if not self.latest:
+                self.acked_seq = seq - 1  # Lag counts from the first frame offered
+            self.latest = seq
+            if self.policy == LATEST:
+                self.dropped += len(self.__pending)
+                self.__pending.clear()
+            else:
+                while self.__pending and (len(self.__pending) >= self.backlog or self.__pending[0][0] < oldest):
+                    self.__pending.popleft()
+                    self.dropped += 1
+            self.__pending.append((seq, slot, timestamp))
+            self.__cond.notify_all()
+
+    def __send(self):
+        while True:
+            with self.__cond:
+                self.__cond.wait_for(lambda: self.closed or (self.__pending and len(self.__in_flight) < self.depth))
+                if self.closed:
+                    return
+                seq, slot, timestamp = self.__pending.popleft()
+                self.__in_flight[seq] = timestamp
+            try:
+                self.conn.sendall(NOTICE.pack(seq, slot, timestamp))
+            except OSError:
+                self.close()
+                return
+            self.sent += 1
+
+    def __receive(self):
+        while not self.closed:
+            try:
+                data = _recv_exactly(self.conn, ACK.size)
+            except OSError:
+                data = None
+            if data is None:
+                self.close()
+                return
+            seq = ACK.unpack(data)[0]
+            now = time.monotonic()
+            with self.__cond:
+                timestamp = self.__in_flight.pop(seq, None)
+                if timestamp is not None:
+                    self.__latency.append(now - timestamp)
+                self.acked += 1
+                self.acked_seq = max(self.acked_seq, seq)
+                self.__cond.notify_all()
+
+    def close(self):
+        """Drop the subscriber, its threads exit on their own"""
+        with self.__cond:
+            if self.closed:
+                return
+            self.closed = True
+            self.__cond.notify_all()
+        try:
+            self.conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.conn.close()
+
+    @property
+    def stats(self):
+        """Delivery counters and lag, lag in frames behind the newest, latency in milliseconds
+        from publication to acknowledgement
+        Return:
+            dict
+        """
+        samples = sorted(self.__latency)
+        stats = {'policy': self.policy, 'sent': self.sent, 'acked': self.acked, 'dropped': self.dropped,
+                 'pending': len(self.__pending), 'lag': self.latest - self.acked_seq,
+                 'latency_avg': 0.0, 'latency_p95': 0.0, 'latency_max': 0.0}
+        if samples:
+            stats['latency_avg'] = sum(samples) / len(samples) * 1000.0
+            stats['latency_p95'] = samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000.0
+            stats['latency_max'] = samples[-1] * 1000.0
+        return stats
+
+
+class FrameServer(object):
+    # +--------------------------------------------------------------+
+    # DEFAULT OBJECT VARIABLES
+    # +--------------------------------------------------------------+
+    SLOTS = 8  # Frames kept in the ring, a subscriber lagging further loses them
+    POLL = 0.1  # Seconds between stop checks
+    CAPTURE_POLL = 0.002  # Seconds between checks for a new frame of a source without acquire()
+
+    def __init__(self, frame_read=None, path=None, slots=None):
+        """
+        Arguments:
+            frame_read: video reader to publish, a VideoStream or anything exposing .frame and .stopped,
+                None to call publish() by hand
+            path: Unix socket path, defaults to a per process path in the temp directory
+            slots: ring size, defaults to SLOTS
+        """
+        self.frame_read = frame_read
+        self.path = path or os.path.join(tempfile.gettempdir(), 'drone-frames-{pid}.sock'.format(pid=os.getpid()))
+        self.slots = max(2, slots or self.SLOTS)
+        self.seq = 0
+        self.__shm = None
+        self.__layout = None
+        self.__stamps = None
+        self.__frames = None
+        self.__ready = threading.Event()  # The first frame sized the ring
+        self.__subscribers = []
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+        self.__listener = None
+        self.__threads = []
+
+    # +--------------------------------------------------------------+
+    # Lifecycle
+    # +--------------------------------------------------------------+
+    def start(self):
+        """Listen for subscribers and publish the reader frames
+        Return:
+            self
+        """
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.__listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.__listener.bind(self.path)
+        self.__listener.listen()
+        self.__listener.settimeout(self.POLL)
+        self.__threads = [threading.Thread(target=self.__accept, name='frames-accept', daemon=True)]
+        if self.frame_read is not None:
+            self.__threads.append(threading.Thread(target=self.__run, name='frames-publish', daemon=True))
+        for thread in self.__threads:
+            thread.start()
+        return self
+
+    def stop(self, timeout=1.0):
+        """Disconnect every subscriber and free the ring
+        Arguments:
+            timeout: seconds to wait for every thread
+        """
+        self.__stop.set()
+        for thread in self.__threads:
+            thread.join(timeout)
+        self.__threads = []
+        if self.__listener is not None:
+            self.__listener.close()
+            self.__listener = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+        with self.__lock:
+            subscribers, self.__subscribers = self.__subscribers, []
+        for subscriber in subscribers:
+            subscriber.close()
+        if self.__shm is not None:
+            self.__stamps = self.__frames = None  # Views must go before the block closes
+            _SERVED.discard(self.__shm.name)
+            self.__shm.close()
+            self.__shm.unlink()
+            self.__shm = None
+
+    # +--------------------------------------------------------------+
+    # Publishing
+    # +--------------------------------------------------------------+
+    def __run(self):
+        """Publish every new frame of the reader"""
+        acquire = getattr(self.frame_read, 'acquire', None)
+        last = None
+        after = 0
+        while not self.__stop.is_set():
+            if acquire is not None:
+                # Pooled frames are held only for the copy into the ring
+                pooled = acquire(after=after, timeout=self.POLL)
+                if pooled is None:
+                    if self.frame_read.stopped:
+                        break
+                    continue
+                after = pooled.seq
+                try:
+                    self.publish(pooled.array, pooled.timestamp)
+                finally:
+                    pooled.release()
+            else:
+                if self.frame_read.stopped:
+                    break
+                frame = self.frame_read.frame
+                if frame is None or frame is last:
+                    self.__stop.wait(self.CAPTURE_POLL)
+                    continue
+                last = frame
+                self.publish(frame)
+        # Subscribers see the end of the stream as a closed connection
+        with self.__lock:
+            subscribers, self.__subscribers = self.__subscribers, []
+        for subscriber in subscribers:
+            subscriber.close()
+
+    def publish(self, frame, timestamp=None):
+        """Write a frame into the ring and notify every subscriber, call it from one thread only
+        Arguments:
+            frame: numpy array, every frame has the shape and dtype of the first one
+            timestamp: monotonic capture time, defaults to now
+        Return:
+            int seq of the frame
+        """
+        import numpy as np
+
+        if self.__shm is None:
+            self.__allocate(frame)
+        elif list(frame.shape) != self.__layout['shape'] or frame.dtype.str != self.__layout['dtype']:
+            raise ValueError('Frame {shape} {dtype} does not match the ring'.format(shape=frame.shape,
+                                                                                    dtype=frame.dtype))
+        self.seq += 1
+        seq = self.seq
+        slot = seq % self.slots
+        # The stamp tells readers whether the slot changed under them
+        self.__stamps[slot] = -1
+        np.copyto(self.__frames[slot], frame)
+        self.__stamps[slot] = seq
+
+        timestamp = timestamp or time.monotonic()
+        oldest = seq - self.slots + 1
+        with self.__lock:
+            subscribers = self.__subscribers
+        for subscriber in subscribers:
+            subscriber.offer(seq, slot, timestamp, oldest)
+        return seq
+
+    def __allocate(self, frame):
+        """Create the ring for frames like this one
+        Arguments:
+            frame: numpy array
+        """
+        from multiprocessing import shared_memory
+
+        base = -(-self.slots * 8 // ALIGN) * ALIGN
+        stride = -(-frame.nbytes // ALIGN) * ALIGN
+        self.__shm = shared_memory.SharedMemory(create=True, size=base + stride * self.slots)
+        self.__layout = {'shm': self.__shm.name, 'slots': self.slots, 'shape': list(frame.shape),
+                         'dtype': frame.dtype.str, 'base': base, 'stride': stride}
+        _SERVED.add(self.__shm.name)
+        self.__stamps, self.__frames = _ring_views(self.__shm, self.__layout)
+        self.__stamps[:] = 0
+        self.__ready.set()
+
+    # +--------------------------------------------------------------+
+    # Subscribers
+    # +--------------------------------------------------------------+
+    def __accept(self):
+        while not self.__stop.is_set():
+            try:
+                conn, _ = self.__listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            # The handshake waits for the first frame, never on this thread
+            threading.Thread(target=self.__handshake, args=(conn,), name='frames-handshake', daemon=True).start()
+
+    def __handshake(self, conn):
+        """Read the subscriber request and send the ring layout
+        Arguments:
+            conn: accepted socket
+        """
+        try:
+            conn.settimeout(None)
+            request = _recv_message(conn)
+            if request is None:
+                conn.close()
+                return
+            policy = request.get('policy', LATEST)
+            if policy not in POLICIES:
+                _send_message(conn, {'error': 'Unknown drop policy ' + str(policy)})
+                conn.close()
+                return
+            while not self.__ready.wait(self.POLL):
+                if self.__stop.is_set():
+                    conn.close()
+                    return
+            # A notice handed out ahead of reading ages in the socket, the newest frame goes one at a time
+            depth = 1 if policy == LATEST else max(1, min(self.slots - 1, int(request.get('depth') or 1)))
+            with self.__lock:
+                name = request.get('name') or 'subscriber-{n}'.format(n=len(self.__subscribers) + 1)
+            _send_message(conn, dict(self.__layout, depth=depth))
+        except (OSError, ValueError):
+            conn.close()
+            return
+
+        subscription = _Subscription(conn, name, policy, depth, self.slots - depth)
+        subscription.start()
+        with self.__lock:
+            # Copy on write, publish() iterates without holding the lock
+            self.__subscribers = [s for s in self.__subscribers if not s.closed] + [subscription]
+
+    @property
+    def stats(self):
+        """Frames published and delivery of every subscriber
+        Return:
+            dict
+        """
+        with self.__lock:
+            subscribers = [s for s in self.__subscribers if not s.closed]
+        return {'published': self.seq, 'subscribers': {s.name: s.stats for s in subscribers}}
+
+
+class FrameSubscriber(object):
+    """Reads the frames of a FrameServer, from this or another process"""
+
+    def __init__(self, path, policy=LATEST, depth=1, name=None):
+        """
+        Arguments:
+            path: Unix socket path of the server
+            policy: LATEST to always get the newest frame, FIFO to get every frame the ring still holds
+            depth: frames handed out ahead of reading, FIFO only, LATEST hands out one when read
+            name: shown in the server stats, defaults to an assigned name
+        """
+        self.path = path
+        self.policy = policy
+        self.depth = depth
+        self.name = name
+        self.layout = None
+        self.received = 0
+        self.overruns = 0  # Frames overwritten in the ring before they could be copied
+        self.stopped = False
+        self.__sock = None
+        self.__shm = None
+        self.__stamps = None
+        self.__frames = None
+        self.__unacked = None  # LATEST frame acknowledged by the next read
+
+    def connect(self, timeout=None):
+        """Subscribe, waits for the first published frame
+        Arguments:
+            timeout: seconds to wait for the server
+        Return:
+            self
+        """
+        self.__sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.__sock.settimeout(timeout)
+        self.__sock.connect(self.path)
+        _send_message(self.__sock, {'policy': self.policy, 'depth': self.depth, 'name': self.name})
+        layout = _recv_message(self.__sock)
+        if layout is None or 'error' in layout:
+            self.close()
+            raise ConnectionError(layout['error'] if layout else 'Frame server closed the connection')
+        self.layout = layout
+        self.__shm = _attach(layout['shm'])
+        self.__stamps, self.__frames = _ring_views(self.__shm, layout)
+        return self
+
+    def read(self, timeout=None, out=None):
+        """Next frame the server hands out
+        Arguments:
+            timeout: seconds to wait, None waits until the stream ends
+            out: numpy array receiving the frame, a new array by default
+        Return:
+            SharedFrame, None on timeout or once the stream ended
+        """
+        import numpy as np
+
+        if self.__unacked is not None:
+            # Asking for the next frame, the server picks the newest one now
+            self.__ack(self.__unacked)
+            self.__unacked = None
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.stopped:
+            self.__sock.settimeout(None if deadline is None else max(0.0, deadline - time.monotonic()))
+            try:
+                data = _recv_exactly(self.__sock, NOTICE.size)
+            except socket.timeout:
+                return None
+            except OSError:
+                data = None
+            if data is None:
+                self.stopped = True
+                return None
+            seq, slot, timestamp = NOTICE.unpack(data)
+            frame = None
+            if self.__stamps[slot] == seq:
+                if out is None:
+                    frame = self.__frames[slot].copy()
+                else:
+                    np.copyto(out, self.__frames[slot])
+                    frame = out
+                if self.__stamps[slot] != seq:
+                    frame = None  # Overwritten while copying
+            if frame is None:
+                self.__ack(seq)
+                self.overruns += 1
+                continue
+            if self.policy == LATEST:
+                self.__unacked = seq
+            else:
+                self.__ack(seq)
+            self.received += 1
+            return SharedFrame(seq, frame, timestamp)
+        return None
+
+    def __ack(self, seq):
+        """Tell the server a frame was consumed
+        Arguments:
+            seq: frame number
+        """
+        try:
+            self.__sock.sendall(ACK.pack(seq))
+        except OSError:
+            self.stopped = True
+
+    def __iter__(self):
+        while True:
+            shared = self.read()
+            if shared is None:
+                return
+            yield shared
+
+    def close(self):
+        """Unsubscribe"""
+        self.stopped = True
+        if self.__sock is not None:
+            self.__sock.close()
+            self.__sock = None
+        if self.__shm is not None:
+            self.__stamps = self.__frames = None
+            self.__shm.close()
+            self.__shm = None
+
+    def __enter__(self):
+        return self if self.__sock is not None else self.connect()
+
+    def __exit__(self, *args):
+        self.close()
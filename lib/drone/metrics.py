@@ -0,0 +1,283 @@
+"""Drone metrics library
+
+Streaming latency histograms for the hot paths of a drone: command round
+trips, telemetry refreshes, the video frame stages and the pre-flight
+check. A histogram keeps counts in fixed exponential buckets, so memory
+stays flat and an observation costs a bisect and a few additions.
+Instrumentation is off until a Metrics registry is attached, the hot paths
+then pay a single None check. MetricsServer exports every registry in the
+Prometheus text format on /metrics, each metric family once across all of
+them, and as JSON on /metrics.json from a local HTTP endpoint.
+"""
+
+# coding=utf-8
+
+from bisect import bisect_left
+import json
+import threading
+
+# Name: (help, label) of every metric the drone library observes
+METRICS = {
+    'drone_command_seconds': ('Command round trip on the drone link', 'command'),
+    'drone_telemetry_refresh_seconds': ('Background telemetry refresh', None),
+    'drone_telemetry_interval_seconds': ('Time between two fresh telemetry readings', None),
+    'drone_frame_stage_seconds': ('Video frame stage', 'stage'),
+    'drone_can_we_fly_seconds': ('Pre-flight check', None),
+}
+
+# Upper bounds in seconds, factor sqrt(2) from 25us to about 2 minutes
+BUCKETS = tuple(0.000025 * 2 ** (i / 2.0) for i in range(45))
+
+
+class Histogram(object):
+    """Latency distribution in fixed exponential buckets"""
+
+    def __init__(self, bounds=BUCKETS):
+        """
+        Arguments:
+            bounds: sorted bucket upper bounds in seconds, one more bucket catches the rest
+        """
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.__lock = threading.Lock()
+
+    def observe(self, seconds):
+        """Add a sample
+        Arguments:
+            seconds: float
+        """
+        index = bisect_left(self.bounds, seconds)
+        with self.__lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def quantile(self, q):
+        """Estimated quantile, linear inside the bucket holding it
+        Arguments:
+            q: 0~1
+        Return:
+            float seconds
+        """
+        with self.__lock:
+            counts, count, largest = list(self.counts), self.count, self.max
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for index, n in enumerate(counts):
+            if n and seen + n >= rank:
+                lower = self.bounds[index - 1] if index else 0.0
+                upper = self.bounds[index] if index < len(self.bounds) else largest
+                return min(largest, lower + (upper - lower) * (rank - seen) / n)
+            seen += n
+        return largest
+
+    def snapshot(self):
+        """Consistent copy of the counters
+        Return:
+            (bucket counts, count, sum, max)
+        """
+        with self.__lock:
+            return list(self.counts), self.count, self.sum, self.max
+
+    @property
+    def stats(self):
+        """Summary in milliseconds
+        Return:
+            dict
+        """
+        counts, count, total, largest = self.snapshot()
+        return {'count': count, 'avg': total / count * 1000.0 if count else 0.0,
+                'p50': self.quantile(0.50) * 1000.0, 'p95': self.quantile(0.95) * 1000.0,
+                'p99': self.quantile(0.99) * 1000.0, 'max': largest * 1000.0}
+
+
+class Metrics(object):
+    """Histograms of one or more drones, by metric name and label value"""
+
+    def __init__(self, labels=None, bounds=BUCKETS):
+        """
+        Arguments:
+            labels: dict of labels added to every exported series, e.g. {'drone': 'tello-1'}
+            bounds: bucket upper bounds of every histogram
+        """
+        self.labels = dict(labels or {})
+        self.bounds = bounds
+        self.__histograms = {}  # (name, label value): Histogram
+        self.__lock = threading.Lock()
+
+    def histogram(self, name, label=None):
+        """Histogram of a metric, created on first use
+        Arguments:
+            name: key of METRICS
+            label: value of the metric label, e.g. the command name
+        Return:
+            Histogram
+        """
+        key = (name, label)
+        histogram = self.__histograms.get(key)
+        if histogram is None:
+            with self.__lock:
+                histogram = self.__histograms.setdefault(key, Histogram(self.bounds))
+        return histogram
+
+    def observe(self, name, seconds, label=None):
+        """Add a sample to a metric
+        Arguments:
+            name: key of METRICS
+            seconds: float
+            label: value of the metric label
+        """
+        self.histogram(name, label).observe(seconds)
+
+    def items(self):
+        """Every histogram, sorted
+        Return:
+            list of ((name, label value), Histogram)
+        """
+        with self.__lock:
+            return sorted(self.__histograms.items(), key=lambda item: (item[0][0], str(item[0][1])))
+
+    # +--------------------------------------------------------------+
+    # Export
+    # +--------------------------------------------------------------+
+    def prometheus(self):
+        """Prometheus text exposition of every histogram
+        Return:
+            string
+        """
+        return prometheus(self)
+
+    def json(self):
+        """Summary of every histogram, times in milliseconds
+        Return:
+            dict of metric name and {label value or 'all': stats}
+        """
+        result = {}
+        for (name, value), histogram in self.items():
+            result.setdefault(name, {})['all' if value is None else str(value)] = histogram.stats
+        return {'labels': self.labels, 'metrics': result}
+
+
+def prometheus(*registries):
+    """Prometheus text exposition of several registries, the series of a metric
+    are grouped under a single HELP and TYPE whichever registry they come from
+    Arguments:
+        registries: Metrics, e.g. one per drone of a fleet
+    Return:
+        string
+    """
+    families = {}  # Name: list of (labels, Histogram)
+    for registry in registries:
+        for (name, value), histogram in registry.items():
+            labels = dict(registry.labels)
+            if value is not None:
+                labels[METRICS.get(name, (name, 'label'))[1]] = value
+            families.setdefault(name, []).append((labels, histogram))
+    lines = []
+    for name in sorted(families):
+        lines.append('# HELP {name} {help}'.format(name=name, help=METRICS.get(name, (name, None))[0]))
+        lines.append('# TYPE {name} histogram'.format(name=name))
+        for labels, histogram in families[name]:
+            counts, count, total, _ = histogram.snapshot()
+            cumulative = 0
+            for bound, n in zip(histogram.bounds, counts):
+                cumulative += n
+                lines.append('{name}_bucket{labels} {n}'.format(
+                    name=name, labels=_labels(labels, le='{:.6g}'.format(bound)), n=cumulative))
+            lines.append('{name}_bucket{labels} {n}'.format(name=name, labels=_labels(labels, le='+Inf'), n=count))
+            lines.append('{name}_sum{labels} {total:.9g}'.format(name=name, labels=_labels(labels), total=total))
+            lines.append('{name}_count{labels} {n}'.format(name=name, labels=_labels(labels), n=count))
+    return '\n'.join(lines) + '\n'
+
+
+def _labels(labels, **extra):
+    """Prometheus label set
+    Arguments:
+        labels: dict
+        extra: more labels
+    Return:
+        string, empty without labels
+    """
+    labels = dict(labels, **extra)
+    if not labels:
+        return ''
+    return '{' + ','.join('{key}="{value}"'.format(
+        key=key, value=str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels.items()) + '}'
+
+
+class MetricsServer(object):
+    # +--------------------------------------------------------------+
+    # DEFAULT OBJECT VARIABLES
+    # +--------------------------------------------------------------+
+    HOST = '127.0.0.1'  # Local only, put a reverse proxy in front to expose it
+    PORT = 9464
+
+    def __init__(self, *registries, host=None, port=None):
+        """
+        Arguments:
+            registries: Metrics to export, e.g. one per drone of a fleet
+            host: address to listen on, defaults to HOST
+            port: port to listen on, 0 picks a free one, defaults to PORT
+        """
+        self.registries = registries
+        self.host = host or self.HOST
+        self.port = self.PORT if port is None else port
+        self.__server = None
+        self.__thread = None
+
+    def start(self):
+        """Serve in a background thread
+        Return:
+            self
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registries = self.registries
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                if path == '/metrics':
+                    body = prometheus(*registries).encode()
+                    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+                elif path == '/metrics.json':
+                    body = json.dumps([registry.json() for registry in registries], sort_keys=True).encode()
+                    content_type = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # Scrapes would flood the drone log
+
+        self.__server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.__server.daemon_threads = True
+        self.port = self.__server.server_address[1]
+        self.__thread = threading.Thread(target=self.__server.serve_forever, name='metrics-http', daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving"""
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__server = None
+            self.__thread.join(1.0)
+
+    @property
+    def url(self):
+        return 'http://{host}:{port}/metrics'.format(host=self.host, port=self.port)
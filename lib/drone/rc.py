@@ -0,0 +1,129 @@
+"""RC command scheduler library
+
+Sends the 4-channel RC command from its own thread at a fixed rate, no
+matter how often the sticks are updated. Updates between two ticks are
+coalesced into the newest one and unchanged commands are only repeated as
+a keep-alive, so the link carries what matters and control latency does
+not depend on the UI frame rate.
+"""
+
+# coding=utf-8
+
+from collections import deque
+import threading
+import time
+
+
+class RCScheduler(threading.Thread):
+    # +--------------------------------------------------------------+
+    # DEFAULT OBJECT VARIABLES
+    # +--------------------------------------------------------------+
+    RATE = 20  # Ticks per second
+    KEEPALIVE = 1.0  # Seconds after which an unchanged command is sent again
+    JITTER_WINDOW = 256  # Number of tick samples kept for stats
+
+    def __init__(self, send, rate=None, keepalive=None, on_error=None):
+        """
+        Arguments:
+            send: callable(roll, pitch, throttle, yaw) putting the command on the link
+            rate: ticks per second, defaults to RATE
+            keepalive: seconds between repeats of an unchanged command, defaults to KEEPALIVE
+            on_error: callable receiving the exception raised by send
+        """
+        super().__init__(name='rc-scheduler', daemon=True)
+        self.__send = send
+        self.__interval = 1.0 / (rate or self.RATE)
+        self.__keepalive = keepalive or self.KEEPALIVE
+        self.__on_error = on_error
+        self.__lock = threading.Lock()
+        self.__pending = None  # Newest command, None sends nothing
+        self.__dirty = False
+        self.__stop = threading.Event()
+        self.__jitter = deque(maxlen=self.JITTER_WINDOW)
+        self.updates = 0
+        self.coalesced = 0
+        self.sent = 0
+        self.suppressed = 0
+        self.errors = 0
+
+    def set(self, roll: int, pitch: int, throttle: int, yaw: int):
+        """Update the sticks, sent on the next tick
+        Arguments:
+            roll: -100~100 (left/right)
+            pitch: -100~100 (forward/backward)
+            throttle: -100~100 (up/down)
+            yaw: -100~100 (yaw)
+        """
+        with self.__lock:
+            if self.__dirty:
+                self.coalesced += 1
+            self.__pending = (roll, pitch, throttle, yaw)
+            self.__dirty = True
+            self.updates += 1
+
+    def release(self):
+        """Stop sending until the next set, e.g. after landing"""
+        with self.__lock:
+            self.__pending = None
+            self.__dirty = False
+
+    def run(self):
+        last_sent = None
+        last_time = 0.0
+        deadline = time.monotonic()
+        while not self.__stop.is_set():
+            deadline += self.__interval
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                self.__stop.wait(delay)
+            if self.__stop.is_set():
+                break
+            now = time.monotonic()
+            self.__jitter.append(abs(now - deadline))
+            if now - deadline > self.__interval:
+                deadline = now  # Fell behind, do not burst to catch up
+
+            with self.__lock:
+                command, self.__dirty = self.__pending, False
+            if command is None:
+                last_sent = None
+                continue
+            if command == last_sent and now - last_time < self.__keepalive:
+                self.suppressed += 1
+                continue
+
+            try:
+                self.__send(*command)
+            except Exception as e:
+                self.errors += 1
+                if self.__on_error is not None:
+                    self.__on_error(e)
+                continue
+            last_sent = command
+            last_time = now
+            self.sent += 1
+
+    def stop(self, timeout=None):
+        """Stop the scheduler thread
+        Arguments:
+            timeout: seconds to wait for the thread
+        """
+        self.__stop.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
+    @property
+    def stats(self):
+        """Send counters and tick jitter in milliseconds
+        Return:
+            dict
+        """
+        samples = sorted(self.__jitter)
+        stats = {'updates': self.updates, 'coalesced': self.coalesced, 'sent': self.sent,
+                 'suppressed': self.suppressed, 'errors': self.errors,
+                 'jitter_avg': 0.0, 'jitter_p95': 0.0, 'jitter_max': 0.0}
+        if samples:
+            stats['jitter_avg'] = sum(samples) / len(samples) * 1000.0
+            stats['jitter_p95'] = samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000.0
+            stats['jitter_max'] = samples[-1] * 1000.0
+        return stats
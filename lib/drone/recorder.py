@@ -0,0 +1,267 @@
+"""Flight recorder library
+
+Keeps the last minutes of a flight in a fixed-size memory-mapped ring file:
+telemetry snapshots, every command sent to the aircraft and optionally
+downsampled video frames. Appending is a couple of struct writes into the
+mapping, cheap enough to leave on, and the file survives a crash of the
+process because the pages belong to the kernel page cache.
+"""
+
+# coding=utf-8
+
+from collections import namedtuple
+import mmap
+import os
+import struct
+import threading
+import time
+
+MAGIC = b'DRONEREC'
+VERSION = 1
+
+# File header: magic, version, capacity, head, tail, live record count, next sequence
+FILE_HEADER = struct.Struct('<8sIQQQQQ')
+# Record header: total length, kind, padding, sequence, wall clock time
+RECORD_HEADER = struct.Struct('<IB3xQd')
+DATA_OFFSET = 64  # Records start after the file header
+EMPTY = 0xFFFFFFFFFFFFFFFF  # Tail of a ring without records
+ALIGN = 8
+
+# Record kinds
+WRAP = 0
+TELEMETRY = 1
+COMMAND = 2
+FRAME = 3
+
+TELEMETRY_PAYLOAD = struct.Struct('<5d')  # battery, altitude, average_temp, high_temp, low_temp
+FRAME_PAYLOAD = struct.Struct('<HHB')  # height, width, channels
+
+Record = namedtuple('Record', ['seq', 'timestamp', 'kind', 'data'])
+
+
+class FlightRecorder(object):
+    # +--------------------------------------------------------------+
+    # DEFAULT OBJECT VARIABLES
+    # +--------------------------------------------------------------+
+    CAPACITY = 64 * 1024 * 1024  # Bytes of records kept
+    FRAME_EVERY = 0  # Record every Nth frame, 0 records no frames
+    FRAME_SCALE = 4  # Keep every Nth pixel in both directions
+
+    def __init__(self, path, capacity=None, frame_every=None, frame_scale=None):
+        """Open or create a ring file, an existing one is appended to
+        Arguments:
+            path: file path
+            capacity: bytes of records, defaults to CAPACITY, ignored for an existing file
+            frame_every: record every Nth frame, defaults to FRAME_EVERY
+            frame_scale: frame downsampling factor, defaults to FRAME_SCALE
+        """
+        self.path = path
+        self.frame_every = self.FRAME_EVERY if frame_every is None else frame_every
+        self.frame_scale = frame_scale or self.FRAME_SCALE
+        self.__frames = 0
+        self.__lock = threading.Lock()
+
+        exists = os.path.exists(path) and os.path.getsize(path) > DATA_OFFSET
+        self.__file = open(path, 'r+b' if exists else 'w+b')
+        if exists:
+            self.__map = mmap.mmap(self.__file.fileno(), 0)
+            magic, version, self.capacity, self.__head, self.__tail, self.__count, self.__seq = \
+                FILE_HEADER.unpack_from(self.__map, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError('{path} is not a flight recording'.format(path=path))
+        else:
+            self.capacity = (capacity or self.CAPACITY) // ALIGN * ALIGN
+            self.__file.truncate(DATA_OFFSET + self.capacity)
+            self.__map = mmap.mmap(self.__file.fileno(), 0)
+            self.__head, self.__tail, self.__count, self.__seq = 0, EMPTY, 0, 0
+            self.__write_header()
+
+    def __write_header(self):
+        FILE_HEADER.pack_into(self.__map, 0, MAGIC, VERSION, self.capacity,
+                              self.__head, self.__tail, self.__count, self.__seq)
+
+    def close(self):
+        """Flush and close the ring file"""
+        with self.__lock:
+            if self.__map is None:
+                return
+            self.__map.flush()
+            self.__map.close()
+            self.__file.close()
+            self.__map = None
+
+    # +--------------------------------------------------------------+
+    # Ring buffer
+    # +--------------------------------------------------------------+
+    def __skip_wrap(self, position):
+        """Move a record position past the end of the ring or a wrap marker
+        Arguments:
+            position: offset in the data region
+        Return:
+            int
+        """
+        if self.capacity - position < RECORD_HEADER.size or \
+                RECORD_HEADER.unpack_from(self.__map, DATA_OFFSET + position)[1] == WRAP:
+            return 0
+        return position
+
+    def __reclaim(self, start, end):
+        """Drop the oldest records overlapping the region about to be written
+        Arguments:
+            start: offset in the data region
+            end: offset in the data region
+        """
+        while self.__count and start <= self.__tail < end:
+            length = RECORD_HEADER.unpack_from(self.__map, DATA_OFFSET + self.__tail)[0]
+            self.__count -= 1
+            self.__tail = self.__skip_wrap(self.__tail + length) if self.__count else EMPTY
+
+    def append(self, kind, payload, timestamp=None):
+        """Append a record, overwriting the oldest ones when full
+        Arguments:
+            kind: record kind
+            payload: bytes-like
+            timestamp: wall clock time, defaults to now
+        Return:
+            int sequence number
+        """
+        size = RECORD_HEADER.size + len(payload)
+        size = (size + ALIGN - 1) // ALIGN * ALIGN
+        if size > self.capacity // 2:
+            raise ValueError('Record of {size} bytes does not fit the recorder'.format(size=size))
+
+        with self.__lock:
+            if self.__map is None:
+                return None
+            if self.__head + size > self.capacity:
+                self.__reclaim(self.__head, self.capacity)
+                if self.capacity - self.__head >= RECORD_HEADER.size:
+                    RECORD_HEADER.pack_into(self.__map, DATA_OFFSET + self.__head, 0, WRAP, 0, 0.0)
+                self.__head = 0
+            self.__reclaim(self.__head, self.__head + size)
+
+            offset = DATA_OFFSET + self.__head
+            seq = self.__seq
+            RECORD_HEADER.pack_into(self.__map, offset, size, kind, seq, timestamp or time.time())
+            end = offset + RECORD_HEADER.size + len(payload)
+            self.__map[offset + RECORD_HEADER.size:end] = payload
+            self.__map[end:offset + size] = bytes(offset + size - end)  # Zero the alignment padding
+
+            if self.__tail == EMPTY:
+                self.__tail = self.__head
+            self.__head += size
+            self.__count += 1
+            self.__seq += 1
+            self.__write_header()
+            return seq
+
+    # +--------------------------------------------------------------+
+    # Typed records
+    # +--------------------------------------------------------------+
+    def record_telemetry(self, snapshot):
+        """Append a telemetry snapshot
+        Arguments:
+            snapshot: TelemetrySnapshot
+        """
+        self.append(TELEMETRY, TELEMETRY_PAYLOAD.pack(snapshot.battery or 0, snapshot.altitude or 0,
+                                                      snapshot.average_temp or 0, snapshot.high_temp or 0,
+                                                      snapshot.low_temp or 0))
+
+    def record_command(self, name, args=()):
+        """Append a command sent to the aircraft
+        Arguments:
+            name: string
+            args: tuple of arguments
+        """
+        self.append(COMMAND, ' '.join([name] + [str(arg) for arg in args]).encode('utf-8'))
+
+    def record_frame(self, frame):
+        """Append a downsampled video frame if one is due
+        Arguments:
+            frame: numpy array (height, width, channels)
+        """
+        if not self.frame_every:
+            return
+        self.__frames += 1
+        if self.__frames % self.frame_every:
+            return
+        small = frame[::self.frame_scale, ::self.frame_scale]
+        height, width = small.shape[:2]
+        channels = small.shape[2] if small.ndim == 3 else 1
+        self.append(FRAME, FRAME_PAYLOAD.pack(height, width, channels) + small.tobytes())
+
+    # +--------------------------------------------------------------+
+    # Reading
+    # +--------------------------------------------------------------+
+    @property
+    def count(self):
+        return self.__count
+
+    def records(self):
+        """Records still in the ring, oldest first
+        Return:
+            generator of Record
+        """
+        with self.__lock:
+            tail, count = self.__tail, self.__count
+        return read_ring(self.__map, self.capacity, tail, count)
+
+
+def read_ring(buffer, capacity, tail, count):
+    """Walk the records of a ring buffer, payloads are decoded lazily
+    Arguments:
+        buffer: mmap or bytes of the whole file
+        capacity: data region size
+        tail: offset of the oldest record
+        count: number of records
+    Return:
+        generator of Record
+    """
+    position = tail
+    for _ in range(count):
+        if capacity - position < RECORD_HEADER.size:
+            position = 0
+        length, kind, seq, timestamp = RECORD_HEADER.unpack_from(buffer, DATA_OFFSET + position)
+        if kind == WRAP:
+            position = 0
+            length, kind, seq, timestamp = RECORD_HEADER.unpack_from(buffer, DATA_OFFSET + position)
+        start = DATA_OFFSET + position + RECORD_HEADER.size
+        yield Record(seq, timestamp, kind, decode(kind, buffer[start:DATA_OFFSET + position + length]))
+        position += length
+
+
+def decode(kind, payload):
+    """Decode a record payload
+    Arguments:
+        kind: record kind
+        payload: bytes
+    Return:
+        dict for telemetry, string for commands, numpy array for frames
+    """
+    if kind == TELEMETRY:
+        battery, altitude, average_temp, high_temp, low_temp = TELEMETRY_PAYLOAD.unpack_from(payload)
+        return {'battery': battery, 'altitude': altitude, 'average_temp': average_temp,
+                'high_temp': high_temp, 'low_temp': low_temp}
+    if kind == COMMAND:
+        return bytes(payload).decode('utf-8').rstrip('\0')
+    if kind == FRAME:
+        import numpy as np
+        height, width, channels = FRAME_PAYLOAD.unpack_from(payload)
+        pixels = np.frombuffer(payload, dtype=np.uint8, count=height * width * channels, offset=FRAME_PAYLOAD.size)
+        return pixels.reshape((height, width, channels))
+    return payload
+
+
+def read(path):
+    """Records of a flight recording, oldest first
+    Arguments:
+        path: ring file path
+    Return:
+        generator of Record
+    """
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, capacity, head, tail, count, seq = FILE_HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('{path} is not a flight recording'.format(path=path))
+    return read_ring(buffer, capacity, tail, count)
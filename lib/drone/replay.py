@@ -0,0 +1,283 @@
+"""Replay drone object library
+
+Plays a flight recording back through the drone API: telemetry lands in the
+telemetry snapshot, frames come out of get_video_frames() and recorded
+commands are handed to a callback. Records are streamed from the memory
+mapped file, and video optionally from a separate file, so a long flight
+never has to fit in memory. Playback runs in real time, faster, or as fast
+as the consumer takes the frames.
+"""
+
+# coding=utf-8
+
+import threading
+import time
+from lib.drone.AbstractDroneBase import AbstractDroneBase
+from lib.drone import recorder
+
+
+class ReplayFrameRead(object):
+    """Frames of a replay, same interface as djitellopy BackgroundFrameRead
+
+    In lock-step mode the playback waits until the current frame has been
+    taken, through the frame property or frames(), so no frame is skipped.
+    """
+
+    def __init__(self, lockstep=False):
+        """
+        Arguments:
+            lockstep: hold playback until each frame is taken
+        """
+        self.lockstep = lockstep
+        self.stopped = False
+        self.count = 0  # Frames played
+        self.__frame = None
+        self.__taken = True
+        self.__cond = threading.Condition()
+
+    @property
+    def frame(self):
+        with self.__cond:
+            self.__taken = True
+            self.__cond.notify_all()
+            return self.__frame
+
+    def push(self, frame):
+        """Publish the next frame, called by the playback thread
+        Arguments:
+            frame: numpy array
+        """
+        with self.__cond:
+            if self.lockstep:
+                while not self.__taken and not self.stopped:
+                    self.__cond.wait(0.1)
+            self.__frame = frame
+            self.__taken = False
+            self.count += 1
+            self.__cond.notify_all()
+
+    def frames(self, timeout=None):
+        """Every frame of the replay, one after another
+        Arguments:
+            timeout: seconds to wait for the next frame
+        Return:
+            generator of numpy arrays
+        """
+        while True:
+            with self.__cond:
+                if self.__taken and not self.stopped:
+                    self.__cond.wait_for(lambda: not self.__taken or self.stopped, timeout)
+                if self.__taken:
+                    return
+                self.__taken = True
+                frame = self.__frame
+                self.__cond.notify_all()
+            yield frame
+
+    def stop(self):
+        with self.__cond:
+            self.stopped = True
+            self.__cond.notify_all()
+
+
+class Drone(AbstractDroneBase):
+    SPEED = 1.0  # Playback speed, 2.0 plays twice as fast
+
+    parent = None
+
+    def __init__(self, path, speed=SPEED, video=None, on_command=None):
+        """
+        Arguments:
+            path: flight recording written by FlightRecorder
+            speed: playback speed factor, None plays as fast as possible and holds on
+                every frame until it is taken, from the first frame on so none is lost
+                before video streaming starts, stop_video_streaming() lets playback run free
+            video: optional video file played instead of the recorded frames
+            on_command: callable receiving every recorded command Record
+        """
+        super().__init__()
+        self.path = path
+        self.playback_speed = speed
+        self.video = video
+        self.on_command = on_command
+        self.finished = threading.Event()
+        self.__frame_read = ReplayFrameRead(lockstep=speed is None)
+        self.__stop = threading.Event()
+        self.__threads = []
+        self.__running = 0
+        self.__lock = threading.Lock()
+
+    # +--------------------------------------------------------------+
+    # Playback
+    # +--------------------------------------------------------------+
+    def __wait_until(self, start, offset):
+        """Sleep until a recording offset is due at the playback speed
+        Arguments:
+            start: monotonic time playback started
+            offset: seconds since the first record
+        """
+        if self.playback_speed is None:
+            return
+        delay = start + offset / self.playback_speed - time.monotonic()
+        if delay > 0:
+            self.__stop.wait(delay)
+
+    def __play_records(self):
+        start = time.monotonic()
+        first = None
+        for record in recorder.read(self.path):
+            if self.__stop.is_set():
+                break
+            first = record.timestamp if first is None else first
+            if record.kind == recorder.TELEMETRY:
+                self.__wait_until(start, record.timestamp - first)
+                self.parent.publish_telemetry(**record.data)
+            elif record.kind == recorder.COMMAND:
+                self.__wait_until(start, record.timestamp - first)
+                if self.on_command is not None:
+                    self.on_command(record)
+            elif record.kind == recorder.FRAME and self.video is None:
+                self.__wait_until(start, record.timestamp - first)
+                self.__frame_read.push(record.data)
+
+    def __play_video(self):
+        import cv2
+
+        capture = cv2.VideoCapture(self.video)
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        start = time.monotonic()
+        index = 0
+        try:
+            while not self.__stop.is_set():
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                self.__wait_until(start, index / fps)
+                self.__frame_read.push(frame)
+                index += 1
+        finally:
+            capture.release()
+
+    def __run(self, target):
+        try:
+            target()
+        except Exception as e:
+            self.parent.log('Replay failed: ' + str(e))
+        finally:
+            # Frames end with the video, or with the records if there is no video
+            if target == self.__play_video or self.video is None:
+                self.__frame_read.stop()
+            with self.__lock:
+                self.__running -= 1
+                if not self.__running:
+                    self.finished.set()
+
+    def wait(self, timeout=None):
+        """Wait for the replay to finish
+        Arguments:
+            timeout: seconds
+        Return:
+            boolean, True once finished
+        """
+        return self.finished.wait(timeout)
+
+    # +--------------------------------------------------------------+
+    # AbstractDroneBase implementation
+    # +--------------------------------------------------------------+
+    def hello(self):
+        self.parent = super()
+        self.parent.setup('replay')
+
+        if self.parent.is_connected is not True:
+            self.parent.im_connected(True)
+            targets = [self.__play_records]
+            if self.video is not None:
+                targets.append(self.__play_video)
+            self.__running = len(targets)
+            self.__threads = [threading.Thread(target=self.__run, args=(target,), name='replay', daemon=True)
+                              for target in targets]
+            for thread in self.__threads:
+                thread.start()
+
+    def update_telemetry(self):
+        # Telemetry is pushed by the playback
+        pass
+
+    def send(self, name, *args):
+        # Nothing is flying, commands go nowhere
+        return None
+
+    def bye(self):
+        self.__stop.set()
+        self.__frame_read.stop()
+        for thread in self.__threads:
+            thread.join(1.0)
+        self.parent.closing()
+
+    def instance(self):
+        return self
+
+    def kill(self):
+        self.parent.command('kill')
+
+    def restart(self):
+        self.parent.command('restart')
+
+    def speed(self, speed: int):
+        self.parent.command('speed', speed)
+
+    def takeoff(self, altitude=None):
+        self.parent.command('takeoff')
+
+    def land(self, delay=None):
+        self.parent.command('land')
+
+    def ascend(self, v: int):
+        self.parent.command('ascend', v)
+
+    def descend(self, v: int):
+        self.parent.command('descend', v)
+
+    def forward(self, v: int):
+        self.parent.command('forward', v)
+
+    def backward(self, v: int):
+        self.parent.command('backward', v)
+
+    def left(self, v: int):
+        self.parent.command('left', v)
+
+    def right(self, v: int):
+        self.parent.command('right', v)
+
+    def rotate_left(self, v: int):
+        self.parent.command('rotate_left', v)
+
+    def rotate_right(self, v: int):
+        self.parent.command('rotate_right', v)
+
+    def rc_command(self, roll: int, pitch: int, throttle: int, yaw: int):
+        self.parent.command('rc_command', roll, pitch, throttle, yaw)
+
+    def start_video_streaming(self):
+        if self.parent.is_connected is True:
+            self.__frame_read.lockstep = self.playback_speed is None
+            self.parent.im_video_streaming(True)
+
+    def stop_video_streaming(self):
+        if self.parent.is_connected is True:
+            self.__frame_read.lockstep = False
+            self.parent.im_video_streaming(False)
+
+    def get_video_frames(self):
+        if self.parent.is_connected is True and self.parent.is_video_streaming:
+            return self.__frame_read
+
+    def get_battery(self):
+        return self.parent.telemetry.battery
+
+    def get_temperature(self):
+        return self.parent.telemetry.average_temp
+
+    def get_altitude(self):
+        return self.parent.telemetry.altitude
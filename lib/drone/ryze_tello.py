@@ -6,39 +6,182 @@ be other features the drone may offer.
 
 # coding=utf-8
 
-from djitellopy import Tello
+import socket
+import threading
 import time
 from lib.drone.AbstractDroneBase import AbstractDroneBase
+from lib.drone.video import VideoStream
+from lib.drone.telemetry import parse_state, state_fields
+
+
+class StatePacket(dict):
+    """djitellopy state of one packet, with our telemetry fields and its arrival time"""
+    telemetry = None
+    arrived = None
+
+
+def hook_state(tello):
+    """Have the djitellopy state receiver, shared by every drone, run each raw
+    packet through parse_state and stamp it as it arrives
+    Arguments:
+        tello: djitellopy Tello class
+    """
+    original = tello.parse_state
+    if getattr(original, 'hooked', False):
+        return
+
+    def parse(state):
+        packet = StatePacket(original(state))
+        packet.telemetry = parse_state(state)
+        packet.arrived = time.monotonic()
+        return packet
+
+    parse.hooked = True
+    tello.parse_state = staticmethod(parse)
+
+
+_COMMAND_LINKS = {}  # djitellopy Tello class: its subclass with a command socket per drone
+
+
+def command_link(tello):
+    """Subclass of the djitellopy Tello sending its commands from a socket of its own.
+    djitellopy shares one command socket between every drone and polls the answers
+    every 100ms, with a socket per drone the aircraft answers that drone only and
+    the answer is read as soon as it lands, so a fleet talks to all drones at once
+    Arguments:
+        tello: djitellopy Tello class
+    Return:
+        Tello subclass
+    """
+    link = _COMMAND_LINKS.get(tello)
+    if link is not None:
+        return link
+
+    class CommandLink(tello):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.command_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.command_socket.bind(('', 0))
+            self.command_lock = threading.Lock()
+
+        def send_command_with_return(self, command, timeout=tello.RESPONSE_TIMEOUT):
+            with self.command_lock:
+                # The aircraft ignores commands sent too close together
+                wait = self.TIME_BTW_COMMANDS - (time.time() - self.last_received_command_timestamp)
+                if wait > 0:
+                    time.sleep(wait)
+                self.__drain()
+                self.command_socket.settimeout(timeout)
+                self.command_socket.sendto(command.encode('utf-8'), self.address)
+                try:
+                    data = self.command_socket.recv(1024)
+                except socket.timeout:
+                    return "Aborting command '{command}'. Did not receive a response after {timeout} seconds".format(
+                        command=command, timeout=timeout)
+                self.last_received_command_timestamp = time.time()
+                return data.decode('utf-8', 'ignore').rstrip('\r\n')
+
+        def __drain(self):
+            """Drop late answers of commands that timed out, they would be read as this one's"""
+            self.command_socket.setblocking(False)
+            try:
+                while True:
+                    self.command_socket.recv(1024)
+            except OSError:
+                pass
+
+        def end(self):
+            super().end()
+            self.command_socket.close()
+
+    _COMMAND_LINKS[tello] = CommandLink
+    return CommandLink
 
 
 class Drone(AbstractDroneBase):
+    HOST = '192.168.10.1'  # Default address of the aircraft access point
+    VIDEO_POOL = 8  # Decoded frame buffers reused for the whole flight
+    PING_TIMEOUT = 0.5  # Seconds to wait for a keep-alive answer
+    TELEMETRY_RATE = 10  # Same rate the aircraft pushes its state packets
     DRONE = None
+    VIDEO = None
     parent = None
-    __VIDEO_STREAM_FRAMES = None
+    __PACKET = None  # State packet of the last published telemetry
+
+    # Drone command name and the djitellopy method sending it
+    COMMANDS = {
+        'connect': 'connect',
+        'kill': 'emergency',
+        'restart': 'reboot',
+        'speed': 'set_speed',
+        'takeoff': 'takeoff',
+        'land': 'land',
+        'ascend': 'move_up',
+        'descend': 'move_down',
+        'forward': 'move_forward',
+        'backward': 'move_back',
+        'left': 'move_left',
+        'right': 'move_right',
+        'rotate_left': 'rotate_counter_clockwise',
+        'rotate_right': 'rotate_clockwise',
+        'rc_command': 'send_rc_control',
+        'streamon': 'streamon',
+        'streamoff': 'streamoff',
+    }
+
+    def __init__(self, host=None):
+        """
+        Arguments:
+            host: aircraft address, set one per drone when flying a fleet
+        """
+        super().__init__()
+        self.HOST = host or self.HOST
 
     def hello(self):
         self.parent = super()
         self.parent.setup('ryze_tello')
 
-        # Initialize tello object
-        self.DRONE = Tello()
+        # Initialize tello object, djitellopy drags OpenCV and NumPy in so it waits until we fly
+        from djitellopy import Tello
+        hook_state(Tello)
+        self.DRONE = command_link(Tello)(host=self.HOST)
 
         if self.parent.is_connected is not True:
-            self.DRONE.connect()
+            self.parent.command('connect')
             self.parent.im_connected(True)  # Set connection flag to True
 
             # Since we are now connected let's set our telemetry,
-            # so we can use can_we_fly() method, we can also call this in realtime
+            # so we can use can_we_fly() method, after that keep it fresh
+            # in the background so readers never wait on the drone
             self.update_telemetry()
+            self.parent.start_telemetry()
 
     def update_telemetry(self):
-        self.parent.set_telemetry('battery', self.DRONE.get_battery())
-        self.parent.set_telemetry('altitude', self.DRONE.get_barometer())
-        self.parent.set_telemetry('low_temp', self.DRONE.get_lowest_temperature())
-        self.parent.set_telemetry('high_temp', self.DRONE.get_highest_temperature())
-        self.parent.set_telemetry('average_temp', self.DRONE.get_temperature())
+        # djitellopy stores a new dict for every state packet, the same one means
+        # nothing arrived since and the snapshot is left to age
+        packet = self.DRONE.get_current_state()
+        if not packet or packet is self.__PACKET:
+            return
+        self.__PACKET = packet
+        if isinstance(packet, StatePacket):
+            self.parent.publish_telemetry(timestamp=packet.arrived, **packet.telemetry)
+        else:
+            self.parent.publish_telemetry(**state_fields(packet))
+        self.parent.link_alive()
+
+    def send(self, name, *args):
+        return getattr(self.DRONE, self.COMMANDS[name])(*args)
+
+    def ping(self):
+        # Re-entering SDK mode is answered right away and changes nothing
+        response = self.DRONE.send_command_with_return('command', timeout=self.PING_TIMEOUT)
+        if response.lower() != 'ok':
+            raise ConnectionError('Keep-alive failed: ' + response)
 
     def bye(self):
+        if self.VIDEO is not None:
+            self.VIDEO.stop()
+            self.VIDEO = None
         self.parent.closing()
         self.DRONE.end()
 
@@ -46,87 +189,91 @@ class Drone(AbstractDroneBase):
         return self.DRONE
 
     def kill(self):
-        self.DRONE.emergency()
+        self.parent.command('kill')
 
     def restart(self):
-        self.DRONE.reboot()
+        self.parent.command('restart')
 
     def speed(self, speed: int):
-        self.DRONE.set_speed(speed)
+        self.parent.command('speed', speed)
 
     def takeoff(self, altitude=None):
         if self.parent.can_we_fly is True:
-            self.DRONE.takeoff()
+            self.parent.command('takeoff')
             if altitude is not None:
-                self.DRONE.move_up(altitude)
+                self.parent.command('ascend', altitude)
 
     def land(self, delay=None):
         if self.parent.can_we_land is True:
             if delay is not None:
                 time.sleep(delay)
-            self.DRONE.land()
+            self.parent.command('land')
 
     def ascend(self, v: int):
         if self.parent.can_we_fly is True:
-            self.DRONE.move_up(v)
+            self.parent.command('ascend', v)
 
     def descend(self, v: int):
         if self.parent.can_we_fly is True:
-            self.DRONE.move_down(v)
+            self.parent.command('descend', v)
 
     def forward(self, v: int):
         if self.parent.can_we_fly is True:
-            self.DRONE.move_forward(v)
+            self.parent.command('forward', v)
 
     def backward(self, v: int):
         if self.parent.can_we_fly is True:
-            self.DRONE.move_back(v)
+            self.parent.command('backward', v)
 
     def left(self, v: int):
         if self.parent.can_we_fly is True:
-            self.DRONE.move_left(v)
+            self.parent.command('left', v)
 
     def right(self, v: int):
         if self.parent.can_we_fly is True:
-            self.DRONE.move_right(v)
+            self.parent.command('right', v)
 
     def rotate_left(self, v: int):
         if self.parent.can_we_fly is True:
-            self.DRONE.rotate_counter_clockwise(v)
+            self.parent.command('rotate_left', v)
 
     def rotate_right(self, v: int):
         if self.parent.can_we_fly is True:
-            self.DRONE.rotate_clockwise(v)
+            self.parent.command('rotate_right', v)
 
     def rc_command(self, roll: int, pitch: int, throttle: int, yaw: int):
-        self.DRONE.send_rc_control(roll, pitch, throttle, yaw)
+        self.parent.command('rc_command', roll, pitch, throttle, yaw)
 
     def start_video_streaming(self):
         if self.parent.is_connected is True:
-            self.DRONE.streamoff()  # Just incase it was never closed properly
-            self.DRONE.streamon()
+            self.parent.command('streamoff')  # Just incase it was never closed properly
+            self.parent.command('streamon')
+            # Decode into a fixed pool of buffers instead of djitellopy's reader
+            # allocating a new frame every time
+            self.VIDEO = VideoStream(self.DRONE.get_udp_video_address(), pool_size=self.VIDEO_POOL,
+                                     metrics=self.parent.metrics).start()
             # Let's update the flag so any function that requires video frame
             # is aware of
             self.parent.im_video_streaming(True)
 
     def stop_video_streaming(self):
         if self.parent.is_connected is True:
-            self.DRONE.streamoff()
+            self.parent.command('streamoff')
+            if self.VIDEO is not None:
+                self.VIDEO.stop()
+                self.VIDEO = None
             self.parent.im_video_streaming(False)
 
     def get_video_frames(self):
         if self.parent.is_connected is True and self.parent.is_video_streaming:
-            return self.DRONE.get_frame_read()
+            return self.VIDEO
 
     def get_battery(self):
-        if self.parent.is_connected is True:
-            return self.DRONE.get_battery()
+        return self.parent.telemetry.battery
 
     def get_temperature(self):
-        if self.parent.is_connected is True:
-            return self.DRONE.get_temperature()
+        return self.parent.telemetry.average_temp
 
     def get_altitude(self):
-        if self.parent.is_connected is True:
-            return self.DRONE.get_barometer()
+        return self.parent.telemetry.altitude
         
\ No newline at end of file
@@ -0,0 +1,698 @@
+"""Simulated drone object library
+
+Local stand-in for a Ryze Tello. SimulatedTelloServer speaks the Tello SDK
+text protocol over UDP on the loopback interface, with configurable latency,
+packet loss, telemetry drift and a synthetic video source, and Drone is the
+AbstractDroneBase implementation talking to it. Everything is seeded so a run
+can be reproduced, which makes it usable for CI, load and latency testing.
+
+The video is not the H.264 stream of a real aircraft. Raw BGR frames are cut
+into chunks with a small header of their own and sent to the video port,
+SimulatedFrameRead puts them back together. Loss and latency then apply per
+chunk with no encoder in the loop, but VideoStream and its decoder are not
+exercised, use a recorded H.264 file or a tcp:// stand-in for that.
+"""
+
+# coding=utf-8
+
+import heapq
+import random
+import socket
+import struct
+import threading
+import time
+from lib.drone.AbstractDroneBase import AbstractDroneBase
+from lib.drone.telemetry import parse_state
+
+# Video datagram header: frame id, chunk index, chunk count, width, height, send time
+VIDEO_HEADER = struct.Struct('!IHHHHd')
+VIDEO_CHUNK_SIZE = 60000
+
+
+class CommandError(Exception):
+    """Raised when the simulated drone does not acknowledge a command"""
+    pass
+
+
+class SimulatedTelloServer(object):
+    # +--------------------------------------------------------------+
+    # DEFAULT OBJECT VARIABLES
+    # +--------------------------------------------------------------+
+    STATE_RATE = 10  # State packets per second, same as the real aircraft
+    VIDEO_FPS = 30
+    FRAME_SIZE = (960, 720)
+    TAKEOFF_HEIGHT = 80  # cm
+    SOCKET_BUFFER = 4 * 1024 * 1024
+
+    def __init__(self, host='127.0.0.1', command_port=0, state_port=8890, video_port=11111,
+                 latency=0.0, jitter=0.0, loss=0.0, battery_drain=0.0, temperature_drift=0.0,
+                 video=True, frame_size=None, video_fps=None, seed=0):
+        """
+        Arguments:
+            host: address to listen on
+            command_port: SDK command port, 0 picks a free one
+            state_port: client port receiving state packets
+            video_port: client port receiving video datagrams
+            latency: seconds added to every packet sent back
+            jitter: random extra seconds on top of latency
+            loss: probability 0-1 of dropping any packet in either direction
+            battery_drain: battery percent lost per second
+            temperature_drift: degrees Celsius gained per second
+            video: send the synthetic video stream after streamon
+            frame_size: (width, height) of the synthetic video
+            video_fps: synthetic video frame rate
+            seed: random seed, same seed gives the same run
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.battery_drain = battery_drain
+        self.temperature_drift = temperature_drift
+        self.video = video
+        self.frame_size = frame_size or self.FRAME_SIZE
+        self.video_fps = video_fps or self.VIDEO_FPS
+        self.state_port = state_port
+        self.video_port = video_port
+        self.commands = 0  # Commands received, rc included
+
+        # One generator per channel so thread scheduling does not change the outcome
+        self.__random = {channel: random.Random('{seed}-{channel}'.format(seed=seed, channel=channel))
+                         for channel in ('command', 'state', 'video', 'noise')}
+
+        self.__command_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.__command_sock.bind((host, command_port))
+        self.__out_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.__out_sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.SOCKET_BUFFER)
+
+        self.__client = None  # Host that sent the SDK "command" handshake
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+        self.__outbox = []  # Heap of delayed packets
+        self.__outbox_cond = threading.Condition()
+        self.__outbox_seq = 0
+        self.__threads = []
+        self.__flight = {'flying': False, 'streaming': False, 'speed': 10, 'battery': 100.0,
+                         'templ': 50.0, 'temph': 52.0, 'height': 0.0, 'yaw': 0.0,
+                         'rc': (0, 0, 0, 0), 'started': time.monotonic()}
+
+    @property
+    def address(self):
+        """Address of the SDK command socket
+        Return:
+            tuple
+        """
+        return self.__command_sock.getsockname()
+
+    def start(self):
+        """Start serving
+        Return:
+            SimulatedTelloServer
+        """
+        for target, name in ((self.__serve_commands, 'sim-command'), (self.__serve_state, 'sim-state'),
+                             (self.__serve_video, 'sim-video'), (self.__deliver, 'sim-deliver')):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self.__threads.append(thread)
+        return self
+
+    def stop(self):
+        """Stop serving and release the sockets"""
+        self.__stop.set()
+        with self.__outbox_cond:
+            self.__outbox_cond.notify_all()
+        for thread in self.__threads:
+            thread.join(1.0)
+        self.__command_sock.close()
+        self.__out_sock.close()
+
+    # +--------------------------------------------------------------+
+    # Network impairments
+    # +--------------------------------------------------------------+
+    def __lost(self, channel):
+        return self.loss > 0 and self.__random[channel].random() < self.loss
+
+    def __send(self, channel, data, address):
+        """Send a packet through the simulated link
+        Arguments:
+            channel: string, random generator to use
+            data: bytes
+            address: tuple
+        """
+        if self.__lost(channel):
+            return
+        delay = self.latency
+        if self.jitter > 0:
+            delay += self.__random[channel].random() * self.jitter
+        if delay <= 0:
+            self.__sendto(data, address)
+            return
+        with self.__outbox_cond:
+            self.__outbox_seq += 1
+            heapq.heappush(self.__outbox, (time.monotonic() + delay, self.__outbox_seq, data, address))
+            self.__outbox_cond.notify()
+
+    def __sendto(self, data, address):
+        try:
+            self.__out_sock.sendto(data, address)
+        except OSError:
+            pass  # Client went away, same as a real drone would not care
+
+    def __deliver(self):
+        """Send delayed packets once they are due"""
+        while not self.__stop.is_set():
+            with self.__outbox_cond:
+                if not self.__outbox:
+                    self.__outbox_cond.wait(0.1)
+                    continue
+                due, _, data, address = self.__outbox[0]
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self.__outbox_cond.wait(delay)
+                    continue
+                heapq.heappop(self.__outbox)
+            self.__sendto(data, address)
+
+    # +--------------------------------------------------------------+
+    # SDK command protocol
+    # +--------------------------------------------------------------+
+    def __serve_commands(self):
+        self.__command_sock.settimeout(0.5)
+        while not self.__stop.is_set():
+            try:
+                data, address = self.__command_sock.recvfrom(1024)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.commands += 1
+            if self.__lost('command'):
+                continue
+            command = data.decode('utf-8', 'ignore').strip()
+            if command == 'command':
+                self.__client = address[0]
+            response = self.__execute(command)
+            if response is not None:
+                self.__send('command', response.encode('utf-8'), address)
+
+    def __execute(self, command):
+        """Apply an SDK command to the flight state
+        Arguments:
+            command: string
+        Return:
+            string response, None for commands without one
+        """
+        name, _, argument = command.partition(' ')
+        flight = self.__flight
+        with self.__lock:
+            self.__advance()
+            if name == 'rc':
+                try:
+                    flight['rc'] = tuple(int(v) for v in argument.split())[:4]
+                except ValueError:
+                    pass
+                return None
+            if name in ('command', 'speed', 'reboot'):
+                if name == 'speed':
+                    flight['speed'] = int(argument or flight['speed'])
+                return 'ok'
+            if name == 'streamon':
+                flight['streaming'] = True
+                return 'ok'
+            if name == 'streamoff':
+                flight['streaming'] = False
+                return 'ok'
+            if name == 'takeoff':
+                flight['flying'] = True
+                flight['height'] = float(self.TAKEOFF_HEIGHT)
+                return 'ok'
+            if name in ('land', 'emergency'):
+                flight['flying'] = False
+                flight['height'] = 0.0
+                flight['rc'] = (0, 0, 0, 0)
+                return 'ok'
+            if name in ('up', 'down', 'forward', 'back', 'left', 'right', 'cw', 'ccw'):
+                if not flight['flying']:
+                    return 'error Not joystick'
+                value = int(argument or 0)
+                if name == 'up':
+                    flight['height'] += value
+                elif name == 'down':
+                    flight['height'] = max(0.0, flight['height'] - value)
+                elif name == 'cw':
+                    flight['yaw'] = (flight['yaw'] + value) % 360
+                elif name == 'ccw':
+                    flight['yaw'] = (flight['yaw'] - value) % 360
+                return 'ok'
+            if name == 'battery?':
+                return str(int(flight['battery']))
+            if name == 'temp?':
+                return '{low}~{high}C'.format(low=int(flight['templ']), high=int(flight['temph']))
+            if name == 'baro?':
+                return '{baro:.2f}'.format(baro=flight['height'] / 100.0)
+            if name == 'height?':
+                return '{height}dm'.format(height=int(flight['height'] / 10))
+            if name == 'time?':
+                return '{time}s'.format(time=int(time.monotonic() - flight['started']))
+            if name == 'speed?':
+                return str(flight['speed'])
+            if name == 'sdk?':
+                return '20'
+            if name == 'sn?':
+                return 'SIM' + str(self.address[1])
+            if name == 'wifi?':
+                return '90'
+            return 'unknown command: ' + name
+
+    def __advance(self):
+        """Move the simulated flight forward to now, call with the lock held"""
+        flight = self.__flight
+        now = time.monotonic()
+        elapsed = now - flight.get('updated', now)
+        flight['updated'] = now
+        if elapsed <= 0:
+            return
+        flight['battery'] = max(0.0, flight['battery'] - self.battery_drain * elapsed)
+        flight['templ'] += self.temperature_drift * elapsed
+        flight['temph'] += self.temperature_drift * elapsed
+        if flight['flying']:
+            roll, pitch, throttle, yaw = flight['rc']
+            flight['height'] = max(0.0, flight['height'] + throttle * elapsed)
+            flight['yaw'] = (flight['yaw'] + yaw * elapsed) % 360
+
+    # +--------------------------------------------------------------+
+    # State stream
+    # +--------------------------------------------------------------+
+    def __serve_state(self):
+        noise = self.__random['noise']
+        interval = 1.0 / self.STATE_RATE
+        while not self.__stop.wait(interval):
+            if self.__client is None:
+                continue
+            with self.__lock:
+                self.__advance()
+                flight = dict(self.__flight)
+            state = ('pitch:0;roll:0;yaw:{yaw};vgx:0;vgy:0;vgz:0;templ:{templ};temph:{temph};tof:{tof};'
+                     'h:{h};bat:{bat};baro:{baro:.2f};time:{time};agx:{agx:.2f};agy:{agy:.2f};agz:{agz:.2f};\r\n')
+            state = state.format(yaw=int(flight['yaw']) - 180, templ=int(flight['templ']), temph=int(flight['temph']),
+                                 tof=int(flight['height']) + 10, h=int(flight['height']), bat=int(flight['battery']),
+                                 baro=flight['height'] / 100.0 + noise.gauss(0, 0.05),
+                                 time=int(time.monotonic() - flight['started']),
+                                 agx=noise.gauss(0, 2), agy=noise.gauss(0, 2), agz=-1000 + noise.gauss(0, 2))
+            self.__send('state', state.encode('ascii'), (self.__client, self.state_port))
+
+    # +--------------------------------------------------------------+
+    # Synthetic video
+    # +--------------------------------------------------------------+
+    def __serve_video(self):
+        if not self.video:
+            return
+        import numpy as np
+
+        width, height = self.frame_size
+        # Static gradient background with a square moving over it
+        background = np.empty((height, width, 3), dtype=np.uint8)
+        background[..., 0] = np.linspace(0, 255, width, dtype=np.uint8)[None, :]
+        background[..., 1] = np.linspace(0, 255, height, dtype=np.uint8)[:, None]
+        background[..., 2] = 64
+        frame = np.empty_like(background)
+        box = max(8, height // 8)
+
+        interval = 1.0 / self.video_fps
+        frame_id = 0
+        deadline = time.monotonic()
+        while not self.__stop.is_set():
+            deadline += interval
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                self.__stop.wait(delay)
+            else:
+                deadline = time.monotonic()
+            if self.__client is None or not self.__flight['streaming']:
+                continue
+
+            frame_id = (frame_id + 1) & 0xFFFFFFFF
+            np.copyto(frame, background)
+            x = (frame_id * 7) % (width - box)
+            y = (frame_id * 3) % (height - box)
+            frame[y:y + box, x:x + box] = (0, 0, 255)
+
+            payload = memoryview(frame).cast('B')
+            count = (len(payload) + VIDEO_CHUNK_SIZE - 1) // VIDEO_CHUNK_SIZE
+            sent_at = time.monotonic()
+            address = (self.__client, self.video_port)
+            for index in range(count):
+                chunk = payload[index * VIDEO_CHUNK_SIZE:(index + 1) * VIDEO_CHUNK_SIZE]
+                header = VIDEO_HEADER.pack(frame_id, index, count, width, height, sent_at)
+                self.__send('video', header + chunk.tobytes(), address)
+
+
+class SimulatedFrameRead(object):
+    """Reassemble the simulated video datagrams into frames, same interface
+    as djitellopy BackgroundFrameRead"""
+
+    def __init__(self, sock):
+        """
+        Arguments:
+            sock: bound UDP socket receiving the video datagrams
+        """
+        self.frame = None
+        self.frame_id = None
+        self.latency = 0.0  # Seconds between the server sending and the frame being complete
+        self.stopped = False
+        self.__sock = sock
+        self.__thread = threading.Thread(target=self.__receive, name='sim-video-read', daemon=True)
+        self.__thread.start()
+
+    def __receive(self):
+        import numpy as np
+
+        self.__sock.settimeout(0.5)
+        current, chunks, received = None, None, 0
+        while not self.stopped:
+            try:
+                data = self.__sock.recv(VIDEO_HEADER.size + VIDEO_CHUNK_SIZE)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            frame_id, index, count, width, height, sent_at = VIDEO_HEADER.unpack_from(data)
+            if frame_id != current:
+                # Newer frame started, whatever was left of the previous one is lost
+                current, chunks, received = frame_id, [None] * count, 0
+            if chunks[index] is None:
+                chunks[index] = data[VIDEO_HEADER.size:]
+                received += 1
+            if received == count:
+                self.frame = np.frombuffer(b''.join(chunks), dtype=np.uint8).reshape((height, width, 3))
+                self.frame_id = frame_id
+                self.latency = time.monotonic() - sent_at
+                current = None
+        self.stopped = True
+
+    def stop(self):
+        self.stopped = True
+        self.__thread.join(1.0)
+
+
+class Drone(AbstractDroneBase):
+    # +--------------------------------------------------------------+
+    # DEFAULT OBJECT VARIABLES
+    # +--------------------------------------------------------------+
+    COMMAND_TIMEOUT = 1.0  # Seconds to wait for an acknowledgement
+    COMMAND_RETRIES = 3
+    PING_TIMEOUT = 0.3  # Seconds to wait for a keep-alive answer
+    SOCKET_BUFFER = 4 * 1024 * 1024
+
+    parent = None
+
+    # Drone command name, SDK command and whether the aircraft acknowledges it
+    COMMANDS = {
+        'connect': ('command', True),
+        'kill': ('emergency', False),
+        'restart': ('reboot', False),
+        'speed': ('speed', True),
+        'takeoff': ('takeoff', True),
+        'land': ('land', True),
+        'ascend': ('up', True),
+        'descend': ('down', True),
+        'forward': ('forward', True),
+        'backward': ('back', True),
+        'left': ('left', True),
+        'right': ('right', True),
+        'rotate_left': ('ccw', True),
+        'rotate_right': ('cw', True),
+        'rc_command': ('rc', False),
+        'streamon': ('streamon', True),
+        'streamoff': ('streamoff', True),
+    }
+
+    def __init__(self, address=('127.0.0.1', 8889), state_port=8890, video_port=11111, host='127.0.0.1'):
+        """
+        Arguments:
+            address: SDK command address of the simulator
+            state_port: local port receiving state packets, 0 picks a free one
+            video_port: local port receiving video, 0 picks a free one
+            host: local address to bind
+        """
+        super().__init__()
+        self.address = address
+        self.__command_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.__command_sock.bind((host, 0))
+        self.__state_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.__state_sock.bind((host, state_port))
+        self.__video_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.__video_sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.SOCKET_BUFFER)
+        self.__video_sock.bind((host, video_port))
+        self.__command_lock = threading.Lock()
+        self.__packet = None  # Latest raw state packet
+        self.__received = (None, None)  # Latest raw state packet and its monotonic arrival time
+        self.__published = None  # Last state packet in the telemetry snapshot
+        self.__publish_lock = threading.Lock()
+        self.__state_thread = None
+        self.__frame_read = None
+        self.__closed = False
+
+    @property
+    def state_port(self):
+        return self.__state_sock.getsockname()[1]
+
+    @property
+    def video_port(self):
+        return self.__video_sock.getsockname()[1]
+
+    # +--------------------------------------------------------------+
+    # SDK transport
+    # +--------------------------------------------------------------+
+    def send_command(self, command, timeout=None):
+        """Send an SDK command and wait for the response, retrying on timeout
+        Arguments:
+            command: string
+            timeout: seconds per attempt, defaults to COMMAND_TIMEOUT
+        Return:
+            string response
+        """
+        with self.__command_lock:
+            for _ in range(self.COMMAND_RETRIES):
+                self.__drain()
+                self.__command_sock.settimeout(timeout or self.COMMAND_TIMEOUT)
+                self.__command_sock.sendto(command.encode('utf-8'), self.address)
+                try:
+                    data, _ = self.__command_sock.recvfrom(1024)
+                except socket.timeout:
+                    continue
+                return data.decode('utf-8', 'ignore').strip()
+        raise CommandError('No response to "{command}"'.format(command=command))
+
+    def send_control_command(self, command, timeout=None):
+        """Send an SDK command that must be acknowledged with ok
+        Arguments:
+            command: string
+            timeout: seconds per attempt
+        """
+        response = self.send_command(command, timeout)
+        if response.lower() != 'ok':
+            raise CommandError('"{command}" failed: {response}'.format(command=command, response=response))
+
+    def send_command_without_return(self, command):
+        """Fire and forget an SDK command
+        Arguments:
+            command: string
+        """
+        self.__command_sock.sendto(command.encode('utf-8'), self.address)
+
+    def send(self, name, *args):
+        command, acknowledged = self.COMMANDS[name]
+        command = ' '.join([command] + [str(arg) for arg in args])
+        if acknowledged:
+            self.send_control_command(command)
+        else:
+            self.send_command_without_return(command)
+
+    def __drain(self):
+        """Discard late responses to commands that already timed out"""
+        self.__command_sock.setblocking(False)
+        try:
+            while True:
+                self.__command_sock.recvfrom(1024)
+        except OSError:
+            pass
+
+    def __receive_state(self):
+        self.__state_sock.settimeout(0.5)
+        while not self.__closed:
+            try:
+                data = self.__state_sock.recv(1024)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            # Every packet lands in the telemetry snapshot as it arrives, no polling
+            self.__packet = data
+            self.__received = (data, time.monotonic())
+            self.__publish(*self.__received)
+
+    def __publish(self, packet, arrived):
+        """Put a state packet in the telemetry snapshot, once, stamped with its arrival
+        Arguments:
+            packet: raw state packet
+            arrived: monotonic time it was received
+        """
+        with self.__publish_lock:
+            if packet is self.__published:
+                return
+            self.__published = packet
+            self.parent.publish_telemetry(timestamp=arrived, **parse_state(packet))
+        self.parent.link_alive()
+
+    def get_state_field(self, key, cast=int):
+        """Latest value of a state packet field
+        Arguments:
+            key: string
+            cast: type of the value
+        Return:
+            value or None before the first state packet
+        """
+        if self.__packet is None:
+            return None
+        for field in self.__packet.decode('ascii', 'ignore').strip().split(';'):
+            name, _, value = field.partition(':')
+            if name == key:
+                return cast(float(value))
+        return None
+
+    # +--------------------------------------------------------------+
+    # AbstractDroneBase implementation
+    # +--------------------------------------------------------------+
+    def hello(self):
+        self.parent = super()
+        self.parent.setup('simulated')
+
+        if self.parent.is_connected is not True:
+            self.parent.command('connect')
+            self.parent.im_connected(True)
+            self.__state_thread = threading.Thread(target=self.__receive_state, name='sim-state-read', daemon=True)
+            self.__state_thread.start()
+
+            # Wait for the first state packet so can_we_fly() has telemetry,
+            # after that the state stream keeps it fresh on its own
+            deadline = time.monotonic() + self.COMMAND_TIMEOUT * self.COMMAND_RETRIES
+            while self.__packet is None and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+    def ping(self):
+        response = self.send_command('command', self.PING_TIMEOUT)
+        if response.lower() != 'ok':
+            raise CommandError('Keep-alive failed: ' + response)
+
+    def update_telemetry(self):
+        # The state stream publishes packets on arrival, only one it has not got to yet
+        # goes out here, a dead link leaves the snapshot to age
+        packet, arrived = self.__received
+        if packet is not None:
+            self.__publish(packet, arrived)
+
+    def bye(self):
+        self.parent.closing()
+        if self.__frame_read is not None:
+            self.__frame_read.stop()
+        self.__closed = True
+        for sock in (self.__command_sock, self.__state_sock, self.__video_sock):
+            sock.close()
+
+    def instance(self):
+        return self
+
+    def kill(self):
+        self.parent.command('kill')
+
+    def restart(self):
+        self.parent.command('restart')
+
+    def speed(self, speed: int):
+        self.parent.command('speed', speed)
+
+    def takeoff(self, altitude=None):
+        if self.parent.can_we_fly is True:
+            self.parent.command('takeoff')
+            if altitude is not None:
+                self.parent.command('ascend', altitude)
+
+    def land(self, delay=None):
+        if self.parent.can_we_land is True:
+            if delay is not None:
+                time.sleep(delay)
+            self.parent.command('land')
+
+    def ascend(self, v: int):
+        if self.parent.can_we_fly is True:
+            self.parent.command('ascend', v)
+
+    def descend(self, v: int):
+        if self.parent.can_we_fly is True:
+            self.parent.command('descend', v)
+
+    def forward(self, v: int):
+        if self.parent.can_we_fly is True:
+            self.parent.command('forward', v)
+
+    def backward(self, v: int):
+        if self.parent.can_we_fly is True:
+            self.parent.command('backward', v)
+
+    def left(self, v: int):
+        if self.parent.can_we_fly is True:
+            self.parent.command('left', v)
+
+    def right(self, v: int):
+        if self.parent.can_we_fly is True:
+            self.parent.command('right', v)
+
+    def rotate_left(self, v: int):
+        if self.parent.can_we_fly is True:
+            self.parent.command('rotate_left', v)
+
+    def rotate_right(self, v: int):
+        if self.parent.can_we_fly is True:
+            self.parent.command('rotate_right', v)
+
+    def rc_command(self, roll: int, pitch: int, throttle: int, yaw: int):
+        self.parent.command('rc_command', roll, pitch, throttle, yaw)
+
+    def start_video_streaming(self):
+        if self.parent.is_connected is True:
+            self.parent.command('streamoff')  # Just incase it was never closed properly
+            self.parent.command('streamon')
+            self.parent.im_video_streaming(True)
+
+    def stop_video_streaming(self):
+        if self.parent.is_connected is True:
+            self.parent.command('streamoff')
+            self.parent.im_video_streaming(False)
+
+    def get_video_frames(self):
+        if self.parent.is_connected is True and self.parent.is_video_streaming:
+            if self.__frame_read is None:
+                self.__frame_read = SimulatedFrameRead(self.__video_sock)
+            return self.__frame_read
+
+    def get_battery(self):
+        return self.parent.telemetry.battery
+
+    def get_temperature(self):
+        return self.parent.telemetry.average_temp
+
+    def get_altitude(self):
+        return self.parent.telemetry.altitude
+
+
+def launch(**kwargs):
+    """Start a simulator on free local ports and a drone bound to it
+    Arguments:
+        kwargs: SimulatedTelloServer arguments
+    Return:
+        (Drone, SimulatedTelloServer), call hello() on the drone to connect
+    """
+    drone = Drone(state_port=0, video_port=0)
+    server = SimulatedTelloServer(state_port=drone.state_port, video_port=drone.video_port, **kwargs).start()
+    drone.address = server.address
+    return drone, server
@@ -0,0 +1,34 @@
+"""Drone state library
+
+Compact per-drone record of the connection flags and the telemetry snapshot.
+"""
+
+# coding=utf-8
+
+from lib.drone.telemetry import TelemetrySnapshot
+
+
+class DroneState(object):
+    """Connection flags and latest telemetry of one drone
+
+    Slots keep every drone instance small and attribute access direct, which
+    matters when one process holds a whole fleet.
+    """
+    __slots__ = ('connected', 'flying', 'safe_to_land', 'video_streaming', 'telemetry')
+
+    FLAGS = ('connected', 'flying', 'safe_to_land', 'video_streaming')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Back to the disconnected defaults"""
+        self.connected = False  # type: bool
+        self.flying = False  # type: bool
+        self.safe_to_land = True  # type: bool
+        self.video_streaming = False  # type: bool
+        self.telemetry = TelemetrySnapshot.empty()  # type: TelemetrySnapshot
+
+    def __repr__(self):
+        flags = ', '.join('{flag}={value}'.format(flag=flag, value=getattr(self, flag)) for flag in self.FLAGS)
+        return 'DroneState({flags}, telemetry={telemetry})'.format(flags=flags, telemetry=self.telemetry)
@@ -0,0 +1,180 @@
+"""Drone telemetry library
+
+Immutable telemetry snapshot and a background poller that keeps it fresh,
+so flight checks and UI overlays never have to wait on the drone link. The
+state packets the aircraft pushes are parsed in one pass straight into
+snapshot fields, and threshold alerts fire on the packet that crosses them.
+"""
+
+# coding=utf-8
+
+from collections import namedtuple
+import operator
+import re
+import threading
+import time
+
+
+class TelemetrySnapshot(namedtuple('TelemetrySnapshot', ['battery', 'altitude', 'average_temp', 'high_temp',
+                                                         'low_temp', 'drone_firmware_version', 'timestamp'])):
+    """Read-only view of every telemetry field at one point in time
+
+    A snapshot is never modified once published, a refresh replaces the whole
+    object, so readers on any thread always see a consistent set of values
+    without taking a lock.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def empty(cls):
+        """Snapshot used before the first telemetry refresh
+        Return:
+            TelemetrySnapshot
+        """
+        return cls(battery=0, altitude=0, average_temp=0, high_temp=0, low_temp=0,
+                   drone_firmware_version=0, timestamp=None)
+
+    def merge(self, fields):
+        """New snapshot with the given fields replaced, built in one pass
+        Arguments:
+            fields: dict of telemetry name and value, unknown names are ignored
+        Return:
+            TelemetrySnapshot
+        """
+        values = list(self)
+        for name, value in fields.items():
+            index = TELEMETRY_INDEX.get(name)
+            if index is not None:
+                values[index] = value
+        return tuple.__new__(TelemetrySnapshot, values)
+
+    @property
+    def age(self):
+        """Seconds since this snapshot was taken, infinite if it never was
+        Return:
+            float
+        """
+        if self.timestamp is None:
+            return float('inf')
+        return time.monotonic() - self.timestamp
+
+
+TELEMETRY_INDEX = {name: index for index, name in enumerate(TelemetrySnapshot._fields)}
+
+# State packet key, telemetry name and conversion, baro is sent in meters
+STATE_FIELDS = {
+    'bat': ('battery', int),
+    'baro': ('altitude', lambda value: float(value) * 100.0),
+    'templ': ('low_temp', int),
+    'temph': ('high_temp', int),
+}
+# Only the keys we keep are matched, the rest of the packet is skipped in C
+STATE_PATTERN = re.compile(r'(?:^|;)(' + '|'.join(STATE_FIELDS) + r'):(-?[0-9.]+)')
+
+
+def state_fields(state):
+    """Telemetry fields of a parsed state packet
+    Arguments:
+        state: dict of state packet key and value
+    Return:
+        dict of telemetry name and value
+    """
+    fields = {}
+    for key, (name, convert) in STATE_FIELDS.items():
+        value = state.get(key)
+        if value is not None:
+            fields[name] = convert(value)
+    if 'low_temp' in fields and 'high_temp' in fields:
+        fields['average_temp'] = (fields['low_temp'] + fields['high_temp']) / 2
+    return fields
+
+
+def parse_state(packet):
+    """Telemetry fields of a raw state packet, parsed in one pass
+        parse_state(b'pitch:0;...;templ:60;temph:63;...;bat:87;baro:1.23;...')
+    Arguments:
+        packet: bytes or string
+    Return:
+        dict of telemetry name and value
+    """
+    if isinstance(packet, bytes):
+        packet = packet.decode('ascii', 'ignore')
+    return state_fields(dict(STATE_PATTERN.findall(packet)))
+
+
+class TelemetryAlerts(object):
+    """Edge-triggered threshold checks, an alert is reported when it starts
+    and when it clears, not on every snapshot in between"""
+
+    OPERATORS = {'<': operator.lt, '>': operator.gt}
+
+    def __init__(self, rules):
+        """
+        Arguments:
+            rules: dict of alert name and (telemetry name, '<' or '>', threshold)
+        """
+        self.__rules = [(name, TELEMETRY_INDEX[field], self.OPERATORS[op], threshold)
+                        for name, (field, op, threshold) in rules.items()]
+        self.active = set()
+
+    def check(self, snapshot):
+        """Alerts changing state with this snapshot
+        Arguments:
+            snapshot: TelemetrySnapshot
+        Return:
+            list of (alert name, boolean active)
+        """
+        changes = []
+        for name, index, compare, threshold in self.__rules:
+            value = snapshot[index]
+            active = value is not None and compare(value, threshold)
+            if active != (name in self.active):
+                changes.append((name, active))
+                if active:
+                    self.active.add(name)
+                else:
+                    self.active.discard(name)
+        return changes
+
+
+class TelemetryPoller(threading.Thread):
+    """Background thread calling a refresh function at a fixed rate"""
+
+    def __init__(self, refresh, rate: float, on_error=None):
+        """
+        Arguments:
+            refresh: callable, reads the drone and publishes a new snapshot
+            rate: refresh per second
+            on_error: callable receiving the exception raised by refresh
+        """
+        super().__init__(name='telemetry-poller', daemon=True)
+        self.__refresh = refresh
+        self.__interval = 1.0 / rate
+        self.__on_error = on_error
+        self.__stop = threading.Event()
+
+    def run(self):
+        deadline = time.monotonic()
+        while not self.__stop.is_set():
+            try:
+                self.__refresh()
+            except Exception as e:  # Keep polling, the link may come back
+                if self.__on_error is not None:
+                    self.__on_error(e)
+
+            # Schedule on a fixed grid so a slow refresh does not drift the rate
+            deadline += self.__interval
+            delay = deadline - time.monotonic()
+            if delay < 0:
+                deadline = time.monotonic()
+                delay = 0
+            self.__stop.wait(delay)
+
+    def stop(self, timeout=None):
+        """Stop polling and wait for the thread to finish
+        Arguments:
+            timeout: seconds to wait for the current refresh
+        """
+        self.__stop.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
@@ -0,0 +1,284 @@
+"""Drone video ingestion library
+
+Decodes the aircraft H.264 stream, or a local file or network stand-in for
+it, into a fixed pool of preallocated frame buffers. A buffer is recycled
+once every reader released it, so decoding at 30 fps allocates nothing per
+frame and memory stays flat however long the flight lasts. Readers get
+read-only views, the same numpy array object each time a buffer comes
+around, and hold on to a frame past the next few decodes by acquiring it.
+"""
+
+# coding=utf-8
+
+import threading
+import time
+
+
+class PooledFrame(object):
+    """Read-only frame borrowed from a FramePool, release it when done"""
+    __slots__ = ('array', 'seq', 'timestamp', '_pool', '_index')
+
+    def __init__(self, pool, index, seq, timestamp):
+        """
+        Arguments:
+            pool: FramePool the buffer belongs to
+            index: buffer index in the pool
+            seq: frame number in the stream
+            timestamp: monotonic time the frame was decoded
+        """
+        self.array = pool.views[index]
+        self.seq = seq
+        self.timestamp = timestamp
+        self._pool = pool
+        self._index = index
+
+    def share(self):
+        """Another hold on the same buffer, for a second reader releasing on its own
+        Return:
+            PooledFrame
+        """
+        self._pool.retain(self._index)
+        return PooledFrame(self._pool, self._index, self.seq, self.timestamp)
+
+    def release(self):
+        """Give the buffer back to the pool, calling it twice is harmless"""
+        if self._pool is not None:
+            self._pool.release(self._index)
+            self._pool = None
+
+    def __enter__(self):
+        return self.array
+
+    def __exit__(self, *args):
+        self.release()
+
+
+class FramePool(object):
+    """Fixed set of frame buffers with a reference count each"""
+
+    def __init__(self, shape, size, dtype='uint8'):
+        """
+        Arguments:
+            shape: frame shape, (height, width, channels)
+            size: number of buffers
+            dtype: numpy dtype of a buffer
+        """
+        import numpy as np
+
+        self.shape = tuple(shape)
+        self.buffers = [np.empty(self.shape, dtype=dtype) for _ in range(size)]
+        self.views = []
+        for buffer in self.buffers:
+            view = buffer.view()
+            view.flags.writeable = False
+            self.views.append(view)
+        self.__refs = [0] * size
+        self.__next = 0  # Buffer the round-robin search starts from
+        self.__lock = threading.Lock()
+
+    def take(self):
+        """Claim a buffer nobody is reading, round-robin so a freed buffer is
+        reused as late as possible and an unretained view lives for a full lap
+        Return:
+            int buffer index, None when every buffer is in use
+        """
+        size = len(self.__refs)
+        with self.__lock:
+            for step in range(size):
+                index = (self.__next + step) % size
+                if not self.__refs[index]:
+                    self.__refs[index] = 1
+                    self.__next = (index + 1) % size
+                    return index
+        return None
+
+    def retain(self, index):
+        """Add a reader to a buffer
+        Arguments:
+            index: buffer index
+        """
+        with self.__lock:
+            self.__refs[index] += 1
+
+    def release(self, index):
+        """Remove a reader from a buffer, the last one frees it
+        Arguments:
+            index: buffer index
+        """
+        with self.__lock:
+            if self.__refs[index]:
+                self.__refs[index] -= 1
+
+    @property
+    def free(self):
+        """Number of buffers ready to be decoded into
+        Return:
+            int
+        """
+        with self.__lock:
+            return self.__refs.count(0)
+
+
+class VideoStream(object):
+    """Decode a video source into a FramePool, same interface as djitellopy
+    BackgroundFrameRead
+
+    The frame property is the newest frame, valid until the pool has gone
+    around once more; acquire() keeps a frame until it is released. When
+    readers hold every buffer, new frames are grabbed and dropped instead of
+    allocating.
+    """
+    # +--------------------------------------------------------------+
+    # DEFAULT OBJECT VARIABLES
+    # +--------------------------------------------------------------+
+    POOL_SIZE = 8  # Buffers, at least two so decoding never overwrites the newest frame
+
+    def __init__(self, source, pool_size=None, realtime=False, metrics=None):
+        """
+        Arguments:
+            source: anything cv2.VideoCapture opens, e.g. udp://@0.0.0.0:11111, a
+                tcp:// stand-in, a video file or a camera index
+            pool_size: number of frame buffers, defaults to POOL_SIZE
+            realtime: pace a file source at its own frame rate instead of decoding flat out
+            metrics: Metrics timing the decode of every frame as the acquire stage
+        """
+        self.source = source
+        self.pool_size = max(2, pool_size or self.POOL_SIZE)
+        self.realtime = realtime
+        self.metrics = metrics
+        self.pool = None
+        self.stopped = False
+        self.error = None  # Exception that ended decoding
+        self.decoded = 0
+        self.dropped = 0  # Frames grabbed while readers held every buffer
+        self.__latest = None
+        self.__seq = 0
+        self.__timestamp = None
+        self.__cond = threading.Condition()
+        self.__thread = None
+
+    def start(self):
+        """Start decoding in the background
+        Return:
+            self
+        """
+        self.__thread = threading.Thread(target=self.__decode, name='video-decode', daemon=True)
+        self.__thread.start()
+        return self
+
+    def __decode(self):
+        capture = None
+        try:
+            import cv2
+            import numpy as np
+
+            capture = cv2.VideoCapture(self.source)
+            capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            interval = 0.0
+            if self.realtime:
+                fps = capture.get(cv2.CAP_PROP_FPS)
+                interval = 1.0 / fps if fps and fps > 0 else 0.0
+            deadline = time.monotonic()
+
+            # The first frame tells the buffer shape
+            ok, image = capture.read()
+            if not ok:
+                return
+            self.pool = FramePool(image.shape, self.pool_size, image.dtype)
+            index = self.pool.take()
+            np.copyto(self.pool.buffers[index], image)
+            self.__publish(index)
+
+            while not self.stopped:
+                if interval:
+                    deadline += interval
+                    delay = deadline - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                index = self.pool.take()
+                if index is None:
+                    if not capture.grab():
+                        break
+                    self.dropped += 1
+                    continue
+                buffer = self.pool.buffers[index]
+                start = time.perf_counter()
+                ok, image = capture.read(buffer)
+                if not ok:
+                    self.pool.release(index)
+                    break
+                if image is not buffer:
+                    np.copyto(buffer, image)  # Decoder did not write in place
+                if self.metrics is not None:
+                    self.metrics.observe('drone_frame_stage_seconds', time.perf_counter() - start, 'acquire')
+                self.__publish(index)
+        except Exception as e:
+            self.error = e
+        finally:
+            if capture is not None:
+                capture.release()
+            with self.__cond:
+                self.stopped = True
+                self.__cond.notify_all()
+
+    def __publish(self, index):
+        """Make a decoded buffer the newest frame
+        Arguments:
+            index: buffer index, its reference passes to the stream
+        """
+        with self.__cond:
+            previous = self.__latest
+            self.__latest = index
+            self.__seq += 1
+            self.__timestamp = time.monotonic()
+            self.decoded += 1
+            self.__cond.notify_all()
+        if previous is not None:
+            self.pool.release(previous)
+
+    @property
+    def frame(self):
+        """Newest frame, a read-only view recycled once the decoder has gone
+        around the pool, acquire() it to read it any longer than that
+        Return:
+            numpy array or None before the first frame
+        """
+        latest = self.__latest
+        return None if latest is None else self.pool.views[latest]
+
+    @property
+    def seq(self):
+        return self.__seq
+
+    def acquire(self, after=None, timeout=None):
+        """Borrow the newest frame, it is not recycled until released
+        Arguments:
+            after: wait for a frame newer than this sequence number, by default any frame
+            timeout: seconds to wait for it
+        Return:
+            PooledFrame or None on timeout/stop
+        """
+        after = after or 0
+        with self.__cond:
+            self.__cond.wait_for(lambda: self.__seq > after or self.stopped, timeout)
+            if self.__seq <= after:
+                return None
+            self.pool.retain(self.__latest)
+            return PooledFrame(self.pool, self.__latest, self.__seq, self.__timestamp)
+
+    def stop(self):
+        """Stop decoding and wait for the thread"""
+        self.stopped = True
+        if self.__thread is not None and threading.current_thread() is not self.__thread:
+            self.__thread.join(1.0)
+        with self.__cond:
+            self.__cond.notify_all()
+
+    @property
+    def stats(self):
+        """Decode counters and pool usage
+        Return:
+            dict
+        """
+        return {'decoded': self.decoded, 'dropped': self.dropped,
+                'pool_size': self.pool_size, 'pool_free': self.pool.free if self.pool else self.pool_size}
@@ -0,0 +1 @@
+__all__ = ['processor', 'tracking', 'batch', 'workers']
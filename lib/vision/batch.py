@@ -0,0 +1,224 @@
+"""Batch inference library
+
+Runs one model over the frames of several drones at once. Every drone
+processing thread hands its newest frame to a shared BatchInference and
+waits for its own result, at most for its frame budget; the batching thread packs the frames into one
+contiguous preallocated array and makes a single vectorized model call.
+Batch size and the longest a frame waits for others trade throughput
+against latency.
+"""
+
+# coding=utf-8
+
+from concurrent.futures import Future, TimeoutError
+import queue
+import threading
+import time
+from lib.vision.processor import FrameProcessor, ProcessorScheduler
+
+
+class BatchInference(object):
+    # +--------------------------------------------------------------+
+    # DEFAULT OBJECT VARIABLES
+    # +--------------------------------------------------------------+
+    BATCH_SIZE = 4  # Frames per model call at most, usually the number of drones
+    MAX_WAIT = 0.010  # Seconds the first frame of a batch waits for the others
+    POLL = 0.1  # Seconds between stop checks while idle
+
+    def __init__(self, model, input_size=None, batch_size=None, max_wait=None, name='batch'):
+        """
+        Arguments:
+            model: callable taking a (N, height, width, channels) array and returning N results,
+                the array is reused by the next batch so results must not be views of it
+            input_size: (width, height) frames are resized to, defaults to the size of the first frame
+            batch_size: frames per call, defaults to BATCH_SIZE
+            max_wait: seconds to wait for a full batch, defaults to MAX_WAIT
+            name: thread name
+        """
+        self.model = model
+        self.input_size = input_size
+        self.batch_size = batch_size or self.BATCH_SIZE
+        self.max_wait = self.MAX_WAIT if max_wait is None else max_wait
+        self.batches = 0
+        self.frames = 0
+        self.errors = 0
+        self.__wait = 0.0  # Total seconds frames waited for their batch
+        self.__model_time = 0.0
+        self.__buffer = None
+        self.__queue = queue.Queue()
+        self.__stop = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, name=name, daemon=True)
+
+    def start(self):
+        """Start the batching thread
+        Return:
+            self
+        """
+        self.__thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Stop batching, frames still waiting get cancelled
+        Arguments:
+            timeout: seconds to wait for the running model call
+        """
+        self.__stop.set()
+        if self.__thread.is_alive():
+            self.__thread.join(timeout)
+        while True:
+            try:
+                self.__queue.get_nowait()[1].cancel()
+            except queue.Empty:
+                break
+
+    def submit(self, frame):
+        """Queue a frame for the next batch
+        Arguments:
+            frame: numpy array (height, width, channels)
+        Return:
+            concurrent.futures.Future of the model result for this frame
+        """
+        future = Future()
+        if self.__stop.is_set():
+            future.cancel()
+        else:
+            self.__queue.put((frame, future, time.monotonic()))
+        return future
+
+    def infer(self, frame, timeout=None):
+        """Run the model on a frame together with the frames of the other drones
+        Arguments:
+            frame: numpy array (height, width, channels)
+            timeout: seconds to wait for the result
+        Return:
+            model result for this frame
+        """
+        return self.submit(frame).result(timeout)
+
+    def processor(self, name=None, timeout=None):
+        """Frame processor feeding a drone video path into this batch
+        Arguments:
+            name: result key, defaults to BatchProcessor
+            timeout: seconds a frame waits for its result, defaults to BatchProcessor.TIMEOUT
+        Return:
+            BatchProcessor
+        """
+        return BatchProcessor(self, name, timeout)
+
+    # +--------------------------------------------------------------+
+    # Batching thread
+    # +--------------------------------------------------------------+
+    def __collect(self):
+        """Wait for a first frame, then for the others up to max_wait
+        Return:
+            list of (frame, future, submitted) tuples, empty when idle
+        """
+        try:
+            requests = [self.__queue.get(timeout=self.POLL)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.max_wait
+        while len(requests) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                requests.append(self.__queue.get(timeout=remaining) if remaining > 0 else self.__queue.get_nowait())
+            except queue.Empty:
+                break
+        return [request for request in requests if request[1].set_running_or_notify_cancel()]
+
+    def __pack(self, frames):
+        """Copy frames into the preallocated batch array
+        Arguments:
+            frames: list of numpy arrays
+        Return:
+            numpy array (N, height, width, channels), a view of the batch array
+        """
+        import numpy as np
+
+        first = frames[0]
+        channels = first.shape[2] if first.ndim == 3 else 1
+        width, height = self.input_size or (first.shape[1], first.shape[0])
+        shape = (self.batch_size, height, width, channels)
+        if self.__buffer is None or self.__buffer.shape != shape or self.__buffer.dtype != first.dtype:
+            self.__buffer = np.empty(shape, dtype=first.dtype)
+
+        for index, frame in enumerate(frames):
+            slot = self.__buffer[index]
+            if frame.ndim == 2:
+                frame = frame[:, :, None]
+            if frame.shape == slot.shape:
+                np.copyto(slot, frame)
+            else:
+                import cv2
+                resized = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+                np.copyto(slot, resized.reshape(slot.shape))
+        return self.__buffer[:len(frames)]
+
+    def __run(self):
+        while not self.__stop.is_set():
+            requests = self.__collect()
+            if not requests:
+                continue
+            start = time.monotonic()
+            try:
+                batch = self.__pack([request[0] for request in requests])
+                results = self.model(batch)
+                if len(results) != len(requests):
+                    raise ValueError('Model returned {n} results for {m} frames'.format(n=len(results),
+                                                                                       m=len(requests)))
+            except Exception as e:
+                self.errors += 1
+                for request in requests:
+                    request[1].set_exception(e)
+                continue
+            finished = time.monotonic()
+
+            self.batches += 1
+            self.frames += len(requests)
+            self.__model_time += finished - start
+            for (frame, future, submitted), result in zip(requests, results):
+                self.__wait += start - submitted
+                future.set_result(result)
+
+    @property
+    def stats(self):
+        """Batch fill and timing, times in milliseconds
+        Return:
+            dict
+        """
+        return {'batches': self.batches, 'frames': self.frames, 'errors': self.errors,
+                'batch_avg': self.frames / self.batches if self.batches else 0.0,
+                'wait_avg': self.__wait / self.frames * 1000.0 if self.frames else 0.0,
+                'model_avg': self.__model_time / self.batches * 1000.0 if self.batches else 0.0}
+
+
+class BatchProcessor(FrameProcessor):
+    """Frame processor handing a drone frames to a shared BatchInference"""
+
+    # +--------------------------------------------------------------+
+    # DEFAULT OBJECT VARIABLES
+    # +--------------------------------------------------------------+
+    TIMEOUT = ProcessorScheduler.BUDGET  # Seconds a frame waits for its result before it is skipped
+
+    def __init__(self, batch, name=None, timeout=None):
+        """
+        Arguments:
+            batch: BatchInference shared by the drones
+            name: result key, defaults to class name
+            timeout: seconds a frame waits for its result, defaults to TIMEOUT,
+                keep it within the budget of the drone ProcessorScheduler
+        """
+        self.batch = batch
+        self.NAME = name or self.NAME
+        self.timeout = timeout or self.TIMEOUT
+        self.timeouts = 0  # Frames skipped because their batch came back too late
+
+    def process(self, frame, context):
+        future = self.batch.submit(frame)
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            # The frame budget is spent, a frame still queued is dropped from its batch
+            future.cancel()
+            self.timeouts += 1
+            return None
@@ -0,0 +1,275 @@
+"""Frame processor library
+
+Plugin interface for computer vision stages and the scheduler running them
+on the video path within a per-frame time budget. Stages can work on a
+downscaled frame or regions of interest, resizes are cached on the frame
+context so stages asking for the same scale share a single one.
+"""
+
+# coding=utf-8
+
+from abc import ABC, abstractmethod
+import math
+import time
+
+
+class FrameContext(object):
+    """Everything the processors know about one frame"""
+
+    def __init__(self, frame, seq=None, timestamp=None):
+        """
+        Arguments:
+            frame: numpy array in BGR
+            seq: frame sequence number
+            timestamp: monotonic time the frame was captured
+        """
+        self.frame = frame
+        self.seq = seq
+        self.timestamp = timestamp
+        self.results = {}  # Latest result of every processor, keyed by name
+        self.fresh = set()  # Processors that ran on this very frame
+        self.__cache = {}
+
+    def scaled(self, scale=1.0):
+        """Frame resized by a factor, computed once per frame and scale
+        Arguments:
+            scale: resize factor, 0.5 halves width and height
+        Return:
+            numpy array in BGR
+        """
+        if scale == 1.0:
+            return self.frame
+        key = ('scaled', scale)
+        image = self.__cache.get(key)
+        if image is None:
+            import cv2
+            image = cv2.resize(self.frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            self.__cache[key] = image
+        return image
+
+    def gray(self, scale=1.0):
+        """Grayscale frame resized by a factor, computed once per frame and scale
+        Arguments:
+            scale: resize factor
+        Return:
+            numpy array
+        """
+        key = ('gray', scale)
+        image = self.__cache.get(key)
+        if image is None:
+            import cv2
+            image = cv2.cvtColor(self.scaled(scale), cv2.COLOR_BGR2GRAY)
+            self.__cache[key] = image
+        return image
+
+    def roi(self, box, scale=1.0):
+        """Region of the frame, cropped before resizing so a small region is cheap
+        Arguments:
+            box: (x, y, width, height) in frame pixels, clipped to the frame
+            scale: resize factor of the region
+        Return:
+            numpy array in BGR, a view of the frame when scale is 1
+        """
+        x, y, width, height = self.clip(box)
+        crop = self.frame[y:y + height, x:x + width]
+        if scale == 1.0 or not crop.size:
+            return crop
+        key = ('roi', x, y, width, height, scale)
+        image = self.__cache.get(key)
+        if image is None:
+            import cv2
+            image = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            self.__cache[key] = image
+        return image
+
+    def clip(self, box):
+        """Box limited to the frame
+        Arguments:
+            box: (x, y, width, height) in frame pixels
+        Return:
+            tuple of int
+        """
+        frame_height, frame_width = self.frame.shape[:2]
+        x, y = max(0, int(box[0])), max(0, int(box[1]))
+        right = min(frame_width, int(box[0] + box[2]))
+        bottom = min(frame_height, int(box[1] + box[3]))
+        return x, y, max(0, right - x), max(0, bottom - y)
+
+    @staticmethod
+    def to_frame(box, scale):
+        """Box found on a resized frame in frame pixels
+        Arguments:
+            box: (x, y, width, height) on a frame resized by scale
+            scale: resize factor
+        Return:
+            tuple of int
+        """
+        return tuple(int(round(v / scale)) for v in box)
+
+
+class FrameProcessor(ABC):
+    """Computer vision stage, subclass and register it on a drone"""
+    NAME = None  # Result key, defaults to class name
+    EVERY_N = 1  # Run on every Nth frame at most
+    SCALE = 1.0  # Resize factor of the frame handed to process, shared with stages asking the same
+
+    @property
+    def name(self):
+        return self.NAME or self.__class__.__name__
+
+    def setup(self):
+        """Called once when registered, load models here"""
+        pass
+
+    def teardown(self):
+        """Called once when unregistered"""
+        pass
+
+    @abstractmethod
+    def process(self, frame, context):
+        """Analyse a frame, do not modify it
+        Arguments:
+            frame: numpy array in BGR, resized by SCALE
+            context: FrameContext, results of processors that ran before
+        Return:
+            any, stored in context.results under the processor name
+        """
+        pass
+
+    def annotate(self, canvas, result):
+        """Draw a result on the display buffer
+        Arguments:
+            canvas: numpy array in RGB
+            result: value returned by process
+        """
+        pass
+
+
+class _Entry(object):
+    """Scheduling state of a registered processor"""
+    __slots__ = ('processor', 'stride', 'cost', 'last_seq', 'result', 'runs', 'skips', 'overruns', 'errors')
+
+    def __init__(self, processor):
+        self.processor = processor
+        self.stride = max(1, processor.EVERY_N)
+        self.cost = 0.0
+        self.last_seq = None
+        self.result = None
+        self.runs = 0
+        self.skips = 0
+        self.overruns = 0
+        self.errors = 0
+
+
+class ProcessorScheduler(object):
+    # +--------------------------------------------------------------+
+    # DEFAULT OBJECT VARIABLES
+    # +--------------------------------------------------------------+
+    BUDGET = 1 / 30  # Seconds of processing allowed per frame
+    COST_SMOOTHING = 0.2  # Weight of the newest sample in the cost average
+    MAX_STRIDE = 30  # Slowest processors still run once every MAX_STRIDE frames
+
+    def __init__(self, budget=None, log=None):
+        """
+        Arguments:
+            budget: seconds per frame, defaults to BUDGET
+            log: callable receiving error messages
+        """
+        self.budget = budget or self.BUDGET
+        self.log = log
+        self.__entries = []
+        self.__seq = 0
+
+    def add(self, processor):
+        """Register a processor, on every frame the longest waiting runs first
+        Arguments:
+            processor: FrameProcessor
+        """
+        processor.setup()
+        self.__entries.append(_Entry(processor))
+
+    def remove(self, processor):
+        """Unregister a processor
+        Arguments:
+            processor: FrameProcessor
+        """
+        for entry in self.__entries:
+            if entry.processor is processor:
+                self.__entries.remove(entry)
+                processor.teardown()
+                break
+
+    @property
+    def processors(self):
+        return [entry.processor for entry in self.__entries]
+
+    def run(self, frame, seq=None, timestamp=None):
+        """Run the processors due on this frame within the budget
+        Arguments:
+            frame: numpy array in BGR
+            seq: frame sequence number, counted here if omitted
+            timestamp: monotonic capture time
+        Return:
+            FrameContext
+        """
+        if seq is None:
+            self.__seq += 1
+            seq = self.__seq
+        context = FrameContext(frame, seq, timestamp)
+        deadline = time.perf_counter() + self.budget
+
+        # Processors that waited the longest go first so none starves
+        for entry in sorted(self.__entries, key=lambda e: -1 if e.last_seq is None else e.last_seq):
+            name = entry.processor.name
+            if entry.last_seq is not None:
+                context.results[name] = entry.result
+                if seq - entry.last_seq < entry.stride:
+                    continue
+                # A processor slower than the whole budget only runs on a frame of its own
+                if context.fresh and entry.cost > deadline - time.perf_counter():
+                    entry.skips += 1
+                    continue
+
+            start = time.perf_counter()
+            try:
+                entry.result = entry.processor.process(context.scaled(entry.processor.SCALE), context)
+            except Exception as e:
+                entry.errors += 1
+                if self.log is not None:
+                    self.log('Frame processor {name} failed: {error}'.format(name=name, error=str(e)))
+            cost = time.perf_counter() - start
+
+            entry.last_seq = seq
+            entry.runs += 1
+            entry.cost = cost if entry.runs == 1 else entry.cost + (cost - entry.cost) * self.COST_SMOOTHING
+            context.results[name] = entry.result
+            context.fresh.add(name)
+
+            # Spread slow processors over enough frames to use at most half the
+            # budget on average, and bring them back to every frame once fast
+            if cost > self.budget:
+                entry.overruns += 1
+            stride = math.ceil(entry.cost * 2 / self.budget)
+            entry.stride = min(max(stride, entry.processor.EVERY_N, 1), self.MAX_STRIDE)
+        return context
+
+    def annotate(self, canvas, context):
+        """Let every processor draw its latest result
+        Arguments:
+            canvas: numpy array in RGB
+            context: FrameContext
+        """
+        for entry in self.__entries:
+            name = entry.processor.name
+            if context is not None and context.results.get(name) is not None:
+                entry.processor.annotate(canvas, context.results[name])
+
+    @property
+    def stats(self):
+        """Scheduling stats of every processor, cost in milliseconds
+        Return:
+            dict
+        """
+        return {entry.processor.name: {'cost': entry.cost * 1000.0, 'stride': entry.stride, 'runs': entry.runs,
+                                       'skips': entry.skips, 'overruns': entry.overruns, 'errors': entry.errors}
+                for entry in self.__entries}
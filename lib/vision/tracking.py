@@ -0,0 +1,163 @@
+"""Object tracking library
+
+Base processor for detectors too slow to run on every frame. Full-frame
+detection runs every N frames on a downscaled frame, in between every object
+is followed by matching its template in a small search window around its
+last position, which costs a fraction of a detection. Losing an object
+brings the next detection forward.
+"""
+
+# coding=utf-8
+
+from abc import abstractmethod
+from collections import namedtuple
+import itertools
+from lib.vision.processor import FrameProcessor, FrameContext
+
+Track = namedtuple('Track', ['id', 'box', 'score', 'detected'])
+
+
+class _Target(object):
+    """Tracking state of one object"""
+    __slots__ = ('id', 'box', 'score', 'template')
+
+    def __init__(self, id, box, score, template):
+        self.id = id
+        self.box = box
+        self.score = score
+        self.template = template
+
+
+def overlap(a, b):
+    """Intersection over union of two boxes
+    Arguments:
+        a: (x, y, width, height)
+        b: (x, y, width, height)
+    Return:
+        float 0-1
+    """
+    width = min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0])
+    height = min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width * height
+    return intersection / float(a[2] * a[3] + b[2] * b[3] - intersection)
+
+
+class TrackingProcessor(FrameProcessor):
+    """Detect every DETECT_EVERY frames, track in between, subclass and implement detect"""
+    # +--------------------------------------------------------------+
+    # DEFAULT OBJECT VARIABLES
+    # +--------------------------------------------------------------+
+    DETECT_EVERY = 10  # Frames between two full-frame detections
+    DETECT_SCALE = 0.5  # Resize factor of the frame handed to detect
+    TRACK_SCALE = 0.5  # Resize factor of the grayscale frame used for tracking
+    SEARCH = 2.0  # Search window size, in multiples of the object size
+    MIN_SCORE = 0.5  # Match score under which an object is lost
+    SAME_OBJECT = 0.3  # Overlap of a detection with a track for it to keep the track id
+
+    def __init__(self):
+        self.detections = 0
+        self.tracked = 0
+        self.lost = 0
+        self.__targets = []
+        self.__since = None  # Frames since the last detection
+        self.__ids = itertools.count(1)
+
+    @abstractmethod
+    def detect(self, frame, context):
+        """Find the objects on a whole frame
+        Arguments:
+            frame: numpy array in BGR, resized by DETECT_SCALE
+            context: FrameContext
+        Return:
+            list of (x, y, width, height) boxes on the frame given
+        """
+        pass
+
+    def process(self, frame, context):
+        due = self.__since is None or self.__since + 1 >= self.DETECT_EVERY
+        if due:
+            self.__detect(context)
+        else:
+            self.__since += 1
+            self.__track(context)
+        return [Track(target.id, target.box, target.score, due) for target in self.__targets]
+
+    def __detect(self, context):
+        boxes = [context.clip(FrameContext.to_frame(box, self.DETECT_SCALE))
+                 for box in self.detect(context.scaled(self.DETECT_SCALE), context)]
+        targets = []
+        for box in boxes:
+            if not box[2] or not box[3]:
+                continue
+            # Keep the id of the track the detection lands on
+            best = max(self.__targets, key=lambda target: overlap(target.box, box), default=None)
+            if best is not None and overlap(best.box, box) >= self.SAME_OBJECT:
+                self.__targets.remove(best)
+                target_id = best.id
+            else:
+                target_id = next(self.__ids)
+            targets.append(_Target(target_id, box, 1.0, self.__template(context, box)))
+        self.__targets = targets
+        self.__since = 0
+        self.detections += 1
+
+    def __template(self, context, box):
+        x, y, width, height = [int(v * self.TRACK_SCALE) for v in box]
+        return context.gray(self.TRACK_SCALE)[y:y + max(1, height), x:x + max(1, width)].copy()
+
+    def __track(self, context):
+        import cv2
+
+        gray = context.gray(self.TRACK_SCALE)
+        gray_height, gray_width = gray.shape[:2]
+        kept = []
+        for target in self.__targets:
+            height, width = target.template.shape[:2]
+            # Search window around the last position, in tracking pixels
+            center_x = (target.box[0] + target.box[2] / 2.0) * self.TRACK_SCALE
+            center_y = (target.box[1] + target.box[3] / 2.0) * self.TRACK_SCALE
+            left = max(0, int(center_x - width * self.SEARCH / 2))
+            top = max(0, int(center_y - height * self.SEARCH / 2))
+            right = min(gray_width, int(center_x + width * self.SEARCH / 2) + 1)
+            bottom = min(gray_height, int(center_y + height * self.SEARCH / 2) + 1)
+            window = gray[top:bottom, left:right]
+            if window.shape[0] < height or window.shape[1] < width:
+                self.lost += 1
+                continue
+
+            scores = cv2.matchTemplate(window, target.template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (match_x, match_y) = cv2.minMaxLoc(scores)
+            if score < self.MIN_SCORE:
+                self.lost += 1
+                continue
+            target.box = context.clip(FrameContext.to_frame((left + match_x, top + match_y, width, height),
+                                                            self.TRACK_SCALE))
+            target.score = score
+            target.template = window[match_y:match_y + height, match_x:match_x + width].copy()
+            kept.append(target)
+            self.tracked += 1
+
+        if len(kept) < len(self.__targets):
+            # Something got away, look for it on the next frame
+            self.__since = self.DETECT_EVERY
+        self.__targets = kept
+
+    def annotate(self, canvas, result):
+        import cv2
+
+        for track in result:
+            x, y, width, height = track.box
+            color = (0, 255, 0) if track.detected else (255, 255, 0)
+            cv2.rectangle(canvas, (x, y), (x + width, y + height), color, 2)
+            cv2.putText(canvas, str(track.id), (x, max(0, y - 4)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+
+    @property
+    def stats(self):
+        """Detection and tracking counters
+        Return:
+            dict
+        """
+        return {'detections': self.detections, 'tracked': self.tracked, 'lost': self.lost,
+                'targets': len(self.__targets)}
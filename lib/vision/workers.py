@@ -0,0 +1,363 @@
+"""Vision worker processes library
+
+Runs frame processors in a pool of worker processes so heavy vision code
+uses every core and never holds the GIL of the control loop. Frames go to
+the workers through slots of a shared memory block, only a few integers
+are pickled per frame. Results are handed back in the order the frames
+were submitted, and a crashed worker is replaced right away, the frames it
+had in hand failing with WorkerCrashed. Workers whose processor keeps
+failing to start are not respawned forever, the pool gives up and raises
+WorkerCrashed from submit().
+"""
+
+# coding=utf-8
+
+from collections import deque
+from concurrent.futures import Future
+import multiprocessing
+from multiprocessing import connection
+import threading
+import time
+from lib.vision.processor import FrameContext, FrameProcessor
+
+
+class WorkerError(Exception):
+    """Raised by a result whose processor failed in the worker"""
+    pass
+
+
+class WorkerCrashed(WorkerError):
+    """Raised by a result whose worker process died"""
+    pass
+
+
+def _worker(conn, factory, shm_name, slot_bytes):
+    """Worker process main loop, (None, None, error) is sent once the processor is
+    built, error is None when it started
+    Arguments:
+        conn: Connection receiving (seq, slot, shape, dtype) tasks, None to stop
+        factory: picklable callable building the FrameProcessor, or a plain callable taking a frame
+        shm_name: shared memory block holding the frame slots
+        slot_bytes: size of a slot
+    """
+    from multiprocessing import shared_memory
+    import numpy as np
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        processor = factory()
+        if hasattr(processor, 'setup'):
+            processor.setup()
+    except Exception as e:
+        conn.send((None, None, '{type}: {error}'.format(type=type(e).__name__, error=e)))
+        shm.close()
+        raise
+    conn.send((None, None, None))
+    try:
+        while True:
+            task = conn.recv()
+            if task is None:
+                break
+            seq, slot, shape, dtype = task
+            frame = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=slot * slot_bytes)
+            frame.flags.writeable = False
+            try:
+                if hasattr(processor, 'process'):
+                    result = processor.process(frame, FrameContext(frame, seq))
+                else:
+                    result = processor(frame)
+                conn.send((seq, result, None))
+            except Exception as e:
+                conn.send((seq, None, '{type}: {error}'.format(type=type(e).__name__, error=e)))
+            del frame
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        if hasattr(processor, 'teardown'):
+            processor.teardown()
+        shm.close()
+
+
+class _Worker(object):
+    """Parent side of a worker process"""
+    __slots__ = ('process', 'conn', 'in_flight', 'started')
+
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.in_flight = {}  # seq and slot of the frames sent to this worker
+        self.started = False  # Processor built and set up
+
+
+class ProcessWorkerPool(object):
+    # +--------------------------------------------------------------+
+    # DEFAULT OBJECT VARIABLES
+    # +--------------------------------------------------------------+
+    WORKERS = max(1, multiprocessing.cpu_count() - 1)  # Leave a core to the control loop
+    SLOTS_PER_WORKER = 2  # Frames a worker can have queued, more are dropped
+    START_METHOD = 'spawn'  # Forking a process full of threads is not safe
+    RESTART_DELAY = 0.1  # Seconds before a crashed worker is replaced
+    MAX_START_FAILURES = 3  # Workers in a row dying before their processor started, then the pool gives up
+    POLL = 0.1  # Seconds between stop checks
+
+    def __init__(self, factory, workers=None, slots=None, start_method=None):
+        """
+        Arguments:
+            factory: picklable callable returning the FrameProcessor run by every worker, e.g.
+                a class defined at module level
+            workers: number of processes, defaults to WORKERS
+            slots: frames in flight, defaults to SLOTS_PER_WORKER per worker
+            start_method: multiprocessing start method, defaults to START_METHOD
+        """
+        self.factory = factory
+        self.workers = workers or self.WORKERS
+        self.slots = slots or self.workers * self.SLOTS_PER_WORKER
+        self.latest = None  # Newest in-order result
+        self.submitted = 0
+        self.dropped = 0  # Frames refused because every slot was busy
+        self.failed = 0
+        self.crashes = 0
+        self.start_failures = 0  # Workers in a row that died before their processor started
+        self.start_error = None  # Last processor startup error
+        self.__context = multiprocessing.get_context(start_method or self.START_METHOD)
+        self.__shm = None
+        self.__slot_bytes = 0
+        self.__free = deque()
+        self.__workers = []
+        self.__futures = {}  # Pending futures by seq
+        self.__done = {}  # Results received ahead of an older frame
+        self.__next = 0  # Oldest seq not handed out yet
+        self.__seq = 0
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+        self.__collector = None
+        self.__broken = None  # WorkerCrashed once the pool gave up respawning
+
+    # +--------------------------------------------------------------+
+    # Lifecycle
+    # +--------------------------------------------------------------+
+    def start(self, frame_bytes):
+        """Allocate the frame slots and start the workers
+        Arguments:
+            frame_bytes: size of the largest frame
+        """
+        from multiprocessing import shared_memory
+
+        self.__slot_bytes = frame_bytes
+        self.__shm = shared_memory.SharedMemory(create=True, size=frame_bytes * self.slots)
+        self.__free = deque(range(self.slots))
+        self.__workers = [self.__spawn() for _ in range(self.workers)]
+        self.__collector = threading.Thread(target=self.__collect, name='vision-workers', daemon=True)
+        self.__collector.start()
+
+    def __spawn(self):
+        """Start a worker process
+        Return:
+            _Worker
+        """
+        parent, child = self.__context.Pipe()
+        process = self.__context.Process(target=_worker, args=(child, self.factory, self.__shm.name,
+                                                               self.__slot_bytes),
+                                         name='vision-worker', daemon=True)
+        process.start()
+        child.close()
+        return _Worker(process, parent)
+
+    def stop(self, timeout=1.0):
+        """Stop the workers and free the shared memory
+        Arguments:
+            timeout: seconds to wait for every worker
+        """
+        self.__stop.set()
+        if self.__collector is not None:
+            self.__collector.join(timeout)
+        with self.__lock:
+            for worker in self.__workers:
+                try:
+                    worker.conn.send(None)
+                except OSError:
+                    pass
+            for worker in self.__workers:
+                worker.process.join(timeout)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+                worker.conn.close()
+            self.__workers = []
+            for future in self.__futures.values():
+                future.cancel()
+            self.__futures.clear()
+        if self.__shm is not None:
+            self.__shm.close()
+            self.__shm.unlink()
+            self.__shm = None
+
+    # +--------------------------------------------------------------+
+    # Frames
+    # +--------------------------------------------------------------+
+    def submit(self, frame):
+        """Copy a frame into a free slot and hand it to the least busy worker
+        Arguments:
+            frame: numpy array
+        Return:
+            concurrent.futures.Future of the processor result, None if the frame was dropped
+        Raises:
+            WorkerCrashed once workers kept dying before their processor started
+        """
+        import numpy as np
+
+        if self.__broken is not None:
+            raise self.__broken
+
+        if self.__shm is None:
+            self.start(frame.nbytes)
+        if frame.nbytes > self.__slot_bytes:
+            raise ValueError('Frame of {n} bytes is larger than the {m} bytes slots'.format(
+                n=frame.nbytes, m=self.__slot_bytes))
+
+        with self.__lock:
+            if self.__stop.is_set() or not self.__free or not self.__workers:
+                self.dropped += 1
+                return None
+            slot = self.__free.popleft()
+            seq = self.__seq
+            self.__seq += 1
+            view = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self.__shm.buf,
+                              offset=slot * self.__slot_bytes)
+            np.copyto(view, frame)
+            del view
+
+            future = Future()
+            future.set_running_or_notify_cancel()
+            self.__futures[seq] = future
+            worker = min(self.__workers, key=lambda w: len(w.in_flight))
+            worker.in_flight[seq] = slot
+            try:
+                worker.conn.send((seq, slot, frame.shape, frame.dtype.str))
+            except OSError:
+                pass  # Worker died, the collector fails the frame when it replaces it
+            self.submitted += 1
+            return future
+
+    def __collect(self):
+        """Receive results, replace dead workers and resolve futures in order"""
+        while not self.__stop.is_set():
+            with self.__lock:
+                waitables = {}
+                for worker in self.__workers:
+                    waitables[worker.conn] = worker
+                    waitables[worker.process.sentinel] = worker
+            for ready in connection.wait(list(waitables), self.POLL):
+                worker = waitables[ready]
+                if ready is worker.conn:
+                    self.__receive(worker)
+                elif not worker.process.is_alive() and worker in self.__workers:
+                    self.__replace(worker)
+            self.__resolve()
+
+    def __receive(self, worker):
+        """Read a result sent by a worker
+        Arguments:
+            worker: _Worker
+        Return:
+            boolean, False once the worker connection is closed
+        """
+        try:
+            seq, result, error = worker.conn.recv()
+        except (EOFError, OSError):
+            return False  # The sentinel reports the crash
+        if seq is None:
+            # Startup report
+            if error is None:
+                worker.started = True
+                self.start_failures = 0
+            else:
+                self.start_error = error
+            return True
+        with self.__lock:
+            self.__free.append(worker.in_flight.pop(seq))
+            self.__done[seq] = (result, None if error is None else WorkerError(error))
+        return True
+
+    def __replace(self, worker):
+        """Fail the frames of a dead worker and start another one
+        Arguments:
+            worker: _Worker
+        """
+        self.crashes += 1
+        # Keep whatever it managed to send before dying
+        while worker.conn.poll() and self.__receive(worker):
+            pass
+        if not worker.started:
+            self.start_failures += 1
+        if self.start_failures >= self.MAX_START_FAILURES and self.__broken is None:
+            # Respawning a processor that cannot start would crash forever
+            self.__broken = WorkerCrashed('Worker processor failed to start {n} times in a row: {error}'.format(
+                n=self.start_failures, error=self.start_error))
+        else:
+            time.sleep(self.RESTART_DELAY)
+        with self.__lock:
+            crashed = WorkerCrashed('Worker {pid} exited with code {code}'.format(
+                pid=worker.process.pid, code=worker.process.exitcode))
+            for seq, slot in worker.in_flight.items():
+                self.__free.append(slot)
+                self.__done[seq] = (None, crashed)
+            worker.conn.close()
+            index = self.__workers.index(worker)
+            if not self.__stop.is_set() and self.__broken is None:
+                self.__workers[index] = self.__spawn()
+            else:
+                self.__workers.pop(index)
+
+    def __resolve(self):
+        """Hand out every result whose older frames are all done"""
+        while True:
+            with self.__lock:
+                if self.__next not in self.__done:
+                    return
+                result, error = self.__done.pop(self.__next)
+                future = self.__futures.pop(self.__next, None)
+                self.__next += 1
+            if error is None:
+                self.latest = result
+                if future is not None:
+                    future.set_result(result)
+            else:
+                self.failed += 1
+                if future is not None:
+                    future.set_exception(error)
+
+    @property
+    def stats(self):
+        """Frame counters and slot usage
+        Return:
+            dict
+        """
+        return {'workers': self.workers, 'submitted': self.submitted, 'dropped': self.dropped,
+                'failed': self.failed, 'crashes': self.crashes, 'start_failures': self.start_failures,
+                'slots_free': len(self.__free)}
+
+
+class WorkerProcessor(FrameProcessor):
+    """Frame processor running another one in worker processes
+
+    process() only copies the frame into shared memory and returns the newest
+    in-order result, so the drone processing thread never waits on the work.
+    """
+
+    def __init__(self, factory, workers=None, name=None, slots=None):
+        """
+        Arguments:
+            factory: picklable callable returning the FrameProcessor to run in the workers
+            workers: number of processes
+            name: result key, defaults to class name
+            slots: frames in flight
+        """
+        self.pool = ProcessWorkerPool(factory, workers=workers, slots=slots)
+        self.NAME = name or self.NAME
+
+    def teardown(self):
+        self.pool.stop()
+
+    def process(self, frame, context):
+        self.pool.submit(frame)
+        return self.pool.latest
@@ -1,80 +1,55 @@
-from lib.drone.ryze_tello import Drone
-import pygame
-import numpy as np
-import time
-import cv2
-import sys
+from lib.drone import get_backend
+from lib.controller.pipeline import FramePipeline
+import argparse
 
 DRONE_SPEED = 60
+DRONE_BACKEND = 'tello'  # Key of lib.drone.BACKENDS, only that backend is imported
+
+
+def preview_target(value):
+    """ Headless preview destination, host:port sends UDP datagrams, anything else is a file path """
+    host, _, port = value.rpartition(':')
+    return (host, int(port)) if host and port.isdigit() else value
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--headless', action='store_true',
+                    help='fly without a window, RC, telemetry and frame processors keep running')
+parser.add_argument('--preview', type=preview_target,
+                    help='headless preview, a JPEG file rewritten in place or host:port receiving UDP datagrams')
+parser.add_argument('--preview-rate', type=float, help='headless preview frames per second')
+parser.add_argument('--metrics-port', type=int,
+                    help='serve latency histograms on http://127.0.0.1:PORT/metrics and /metrics.json')
+args = parser.parse_args()
 
 
 class DroneController(object):
     # +--------------------------------------------------------------+
-    # Keymaps
+    # Input
     # +--------------------------------------------------------------+
-    KEY_QUIT = pygame.K_q
-    KEY_TAKEOFF = pygame.K_t
-    KEY_LANDING = pygame.K_l
-
-    # Mode 1
-    MODE1_KEY_THROTTLE_UP = pygame.K_UP  # Ascend
-    MODE1_KEY_THROTTLE_DOWN = pygame.K_DOWN  # Descend
-    MODE1_KEY_ROLL_LEFT = pygame.K_LEFT  # Move Left
-    MODE1_KEY_ROLL_RIGHT = pygame.K_RIGHT  # Move Right
-    MODE1_KEY_PITCH_UP = pygame.K_s  # Move backward
-    MODE1_KEY_PITCH_DOWN = pygame.K_w  # Move forward
-    MODE1_KEY_YAW_LEFT = pygame.K_a  # Rotate ccw
-    MODE1_KEY_YAW_RIGHT = pygame.K_d  # Rotate cw
-
-    # Mode 2
-    MODE2_KEY_THROTTLE_UP = pygame.K_w  # Ascend
-    MODE2_KEY_THROTTLE_DOWN = pygame.K_s  # Descend
-    MODE2_KEY_ROLL_LEFT = pygame.K_LEFT  # Move Left
-    MODE2_KEY_ROLL_RIGHT = pygame.K_RIGHT  # Move Right
-    MODE2_KEY_PITCH_UP = pygame.K_UP  # Move backward
-    MODE2_KEY_PITCH_DOWN = pygame.K_DOWN  # Move forward
-    MODE2_KEY_YAW_LEFT = pygame.K_a  # Rotate ccw
-    MODE2_KEY_YAW_RIGHT = pygame.K_d  # Rotate cw
-
-    # Mode 3
-    MODE3_KEY_THROTTLE_UP = pygame.K_UP  # Ascend
-    MODE3_KEY_THROTTLE_DOWN = pygame.K_DOWN  # Descend
-    MODE3_KEY_ROLL_LEFT = pygame.K_a  # Move Left
-    MODE3_KEY_ROLL_RIGHT = pygame.K_d  # Move Right
-    MODE3_KEY_PITCH_UP = pygame.K_w  # Move backward
-    MODE3_KEY_PITCH_DOWN = pygame.K_s  # Move forward
-    MODE3_KEY_YAW_LEFT = pygame.K_LEFT  # Rotate ccw
-    MODE3_KEY_YAW_RIGHT = pygame.K_RIGHT  # Rotate cw
-
-    # Mode 4
-    MODE4_KEY_THROTTLE_UP = pygame.K_w  # Ascend
-    MODE4_KEY_THROTTLE_DOWN = pygame.K_s  # Descend
-    MODE4_KEY_ROLL_LEFT = pygame.K_a  # Move Left
-    MODE4_KEY_ROLL_RIGHT = pygame.K_d  # Move Right
-    MODE4_KEY_PITCH_UP = pygame.K_UP  # Move backward
-    MODE4_KEY_PITCH_DOWN = pygame.K_DOWN  # Move forward
-    MODE4_KEY_YAW_LEFT = pygame.K_LEFT  # Rotate ccw
-    MODE4_KEY_YAW_RIGHT = pygame.K_RIGHT  # Rotate cw
+    # Stick mode 1~4, switch in flight with keys 1~4. Standard default on most drone is mode 2
+    # Mode 1: W/S pitch, A/D yaw, arrows throttle and roll
+    # Mode 2: W/S throttle, A/D yaw, arrows pitch and roll
+    # Mode 3: W/S pitch, A/D roll, arrows throttle and yaw
+    # Mode 4: W/S throttle, A/D roll, arrows pitch and yaw
+    # T takeoff, L landing, G hand gesture control, Q quit, gamepads are picked up when plugged in
+    STICK_MODE = 2
 
     # +--------------------------------------------------------------+
     # PyGame variables
     # +--------------------------------------------------------------+
-    # Frames per second of the pygame window display
-    # A low number also results in input lag, as input information is processed once per frame.
-    DISPLAY_FPS = 120
+    # The loop sleeps until input or a new frame arrives, it only wakes up
+    # on its own this often to check the battery
+    IDLE_TIMEOUT = 0.5
     DISPLAY_MODE = [960, 720]  # Display window size
+    METRICS_PORT = None  # Serve latency histograms on this port, off when None
 
     # +--------------------------------------------------------------+
     # Drone object variables
     # +--------------------------------------------------------------+
     DRONE = None  # Drone object instance
     DRONE_SEND_RC_COMMAND = False
-
-    # Drone velocities between -100~100
-    VELOCITY_FORWARD_BACK = 0
-    VELOCITY_LEFT_RIGHT = 0
-    VELOCITY_UP_DOWN = 0
-    VELOCITY_YAW = 0
+    GESTURE = None  # Gesture engine while hand gesture control is on
 
     def __init__(self):
         pygame.init()
@@ -86,124 +61,130 @@ class DroneController(object):
             self.screen = pygame.display.set_mode(self.DISPLAY_MODE)
 
         # Instantiate drone object
-        self.DRONE = Drone()
-
-        # create update timer
-        pygame.time.set_timer(pygame.USEREVENT + 1, 1000 // self.DISPLAY_FPS)
-
-        # Set keymap, update what suits your need, standard default
-        # on most drone is mode 2
-        self.KEY_UP, self.KEY_DOWN, \
-            self.KEY_LEFT, self.KEY_RIGHT, \
-            self.KEY_BACKWARD, self.KEY_FORWARD, \
-            self.KEY_ROTATE_LEFT, self.KEY_ROTATE_RIGHT = (self.MODE2_KEY_THROTTLE_UP, self.MODE2_KEY_THROTTLE_DOWN,
-                                                           self.MODE2_KEY_ROLL_LEFT, self.MODE2_KEY_ROLL_RIGHT,
-                                                           self.MODE2_KEY_PITCH_DOWN, self.MODE2_KEY_PITCH_UP,
-                                                           self.MODE2_KEY_YAW_LEFT, self.MODE2_KEY_YAW_RIGHT)
+        self.DRONE = get_backend(DRONE_BACKEND)()
+        if self.METRICS_PORT is not None:
+            self.DRONE.serve_metrics(self.METRICS_PORT)
+        self.presenter = FramePresenter(self.screen, metrics=self.DRONE.metrics)
+
+        self.controls = StickInput({'quit': self.quit,
+                                    'takeoff': self.takeoff,
+                                    'land': self.land,
+                                    'gesture': self.toggle_gesture},
+                                   mode=self.STICK_MODE, speed=DRONE_SPEED)
+        self.should_stop = False
 
     def run(self):
 
         # Initiate connection to drone object
         self.DRONE.hello()
+        # RC commands go out at the drone RC_RATE from their own thread,
+        # input only updates the sticks
+        self.DRONE.start_rc()
         # Start video streaming
         self.DRONE.start_video_streaming()
 
-        frame_read = self.DRONE.get_video_frames()
-        should_stop = False
-        while not should_stop:
+        # Capture and processing run on their own threads, this loop only
+        # handles input and renders the newest processed frame when told one is ready
+        pipeline = FramePipeline(self.DRONE.get_video_frames(), process=self.process_frame,
+                                 on_frame=self.controls.notify_frame, metrics=self.DRONE.metrics,
+                                 log=self.DRONE.log)
+        pipeline.start()
+        while not self.should_stop:
 
             if self.DRONE.is_low_battery is True:
                 # Gracefull exit
-                self.DRONE.bye()
-            for event in pygame.event.get():
-                if event.type == pygame.USEREVENT + 1:
-                    self.send_rc_command()
-                elif event.type == pygame.KEYDOWN:
-                    self.keydown(event.key)
-                elif event.type == pygame.KEYUP:
-                    if event.key == self.KEY_QUIT:
-                        self.DRONE.bye()
-                        sys.exit()
-                    else:
-                        self.keyup(event.key)
-
-            if frame_read.stopped:
                 break
 
-            self.screen.fill([0, 0, 0])
-
-            frame = frame_read.frame
+            changed, frame_ready = self.controls.wait(self.IDLE_TIMEOUT)
+            if changed:
+                self.send_rc_command()
 
-            # Add drone stats to display
-            txt_stats = "Bat: {battery}%, Temp: {temp}C, Alt: {alt}cm".format(battery=str(self.DRONE.get_battery()),
-                                                                              temp=str(int(self.DRONE.get_temperature())),
-                                                                              alt=str(self.DRONE.get_altitude()))
-            cv2.putText(frame, txt_stats, (5, 720 - 5), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 1)
+            if pipeline.stopped:
+                break
+            if not frame_ready:
+                continue
 
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            frame = np.rot90(frame)
-            frame = np.flipud(frame)
+            packet = pipeline.get_frame(timeout=0)
+            if packet is None:
+                continue
 
-            frame = pygame.surfarray.make_surface(frame)
-            self.screen.blit(frame, (0, 0))
-            pygame.display.update()
-            time.sleep(1 / self.DISPLAY_FPS)
+            # Add drone stats to display
+            txt_stats = "Bat: {battery}%, Temp: {temp}C, Alt: {alt}cm".format(
+                battery=reading(self.DRONE.get_battery()), temp=reading(self.DRONE.get_temperature()),
+                alt=reading(self.DRONE.get_altitude()))
+            context = pipeline.results
+            self.presenter.present(packet.frame, txt_stats,
+                                   overlay=lambda canvas: self.DRONE.frame_scheduler.annotate(canvas, context))
+            pipeline.rendered(packet)
 
         # Call it always before finishing. To deallocate resources.
+        pipeline.stop()
         self.DRONE.bye()
 
-    def keydown(self, key):
-        """ Set RC channel variables from key down, we use standard 4-channel control
-        Arguments:
-            key: pygame key
-        """
-        if key == self.KEY_FORWARD:
-            self.VELOCITY_FORWARD_BACK = DRONE_SPEED
-        elif key == self.KEY_BACKWARD:
-            self.VELOCITY_FORWARD_BACK = -DRONE_SPEED
-        elif key == self.KEY_LEFT:
-            self.VELOCITY_LEFT_RIGHT = -DRONE_SPEED
-        elif key == self.KEY_RIGHT:
-            self.VELOCITY_LEFT_RIGHT = DRONE_SPEED
-        elif key == self.KEY_UP:
-            self.VELOCITY_UP_DOWN = DRONE_SPEED
-        elif key == self.KEY_DOWN:
-            self.VELOCITY_UP_DOWN = -DRONE_SPEED
-        elif key == self.KEY_ROTATE_LEFT:
-            self.VELOCITY_YAW = -DRONE_SPEED
-        elif key == self.KEY_ROTATE_RIGHT:
-            self.VELOCITY_YAW = DRONE_SPEED
-
-    def keyup(self, key):
-        """ Set RC channel variables from key release, we use standard 4-channel control
+    def process_frame(self, packet):
+        """ Run the drone frame processors, called from the pipeline processing thread
         Arguments:
-            key: pygame key
+            packet: FramePacket
         """
-        if key == self.KEY_TAKEOFF:
-            self.DRONE.takeoff()
-            self.DRONE_SEND_RC_COMMAND = True
-        elif key == self.KEY_LANDING:
-            self.DRONE.land()
-            self.DRONE_SEND_RC_COMMAND = False
+        return self.DRONE.process_frame(packet.frame, packet.seq, packet.captured_at)
+
+    def quit(self):
+        """ Leave the control loop, the drone is released on the way out """
+        self.should_stop = True
+
+    def takeoff(self):
+        self.DRONE.takeoff()
+        self.DRONE_SEND_RC_COMMAND = True
+        # Arm RC right away, its keep-alive stops the aircraft landing on its own
+        self.send_rc_command()
+
+    def land(self):
+        self.DRONE.land()
+        self.DRONE_SEND_RC_COMMAND = False
+        # Release the last sticks
+        self.send_rc_command()
+
+    def toggle_gesture(self):
+        """ Turn hand gesture control on or off, it runs with the other frame processors """
+        if self.GESTURE is None:
+            # Hand tracking is only loaded once someone asks for it
+            from lib.controller.gesture import GestureEngine
+            try:
+                self.GESTURE = GestureEngine(self.DRONE)
+            except ImportError as e:
+                # mediapipe is only needed for gestures, flying goes on without it
+                self.DRONE.log('Hand gesture control unavailable: ' + str(e))
+                return
+            self.DRONE.add_frame_processor(self.GESTURE)
         else:
-            if key == self.KEY_FORWARD or key == self.KEY_BACKWARD:
-                self.VELOCITY_FORWARD_BACK = 0
-            elif key == self.KEY_LEFT or key == self.KEY_RIGHT:
-                self.VELOCITY_LEFT_RIGHT = 0
-            elif key == self.KEY_UP or key == self.KEY_DOWN:
-                self.VELOCITY_UP_DOWN = 0
-            elif key == self.KEY_ROTATE_LEFT or self.KEY_ROTATE_RIGHT:
-                self.VELOCITY_YAW = 0
+            self.DRONE.remove_frame_processor(self.GESTURE)
+            self.GESTURE = None
 
     def send_rc_command(self):
-        """ Send 4-channel rc command """
+        """ Update the 4-channel rc command, the drone RC scheduler sends it """
         if self.DRONE_SEND_RC_COMMAND is True:
-            self.DRONE.rc_command(self.VELOCITY_LEFT_RIGHT,
-                                  self.VELOCITY_FORWARD_BACK,
-                                  self.VELOCITY_UP_DOWN,
-                                  self.VELOCITY_YAW)
-
-
-dc = DroneController()
-dc.DISPLAY_MODE = [300, 300]
-dc.run()
+            self.DRONE.set_rc(*self.controls.sticks)
+        else:
+            self.DRONE.release_rc()
+
+
+def reading(value):
+    """ Telemetry value for the display, '--' while the drone has none """
+    return '--' if value is None else str(int(value))
+
+
+if args.headless:
+    from lib.controller.headless import HeadlessSession
+    drone = get_backend(DRONE_BACKEND)()
+    if args.metrics_port is not None:
+        drone.serve_metrics(args.metrics_port)
+    HeadlessSession(drone, preview=args.preview, preview_rate=args.preview_rate).run()
+else:
+    # pygame, the window and its input are only loaded when there is a window
+    import pygame
+    from lib.controller.presenter import FramePresenter
+    from lib.controller.input import StickInput
+    DroneController.METRICS_PORT = args.metrics_port
+    dc = DroneController()
+    dc.DISPLAY_MODE = [300, 300]
+    dc.run()